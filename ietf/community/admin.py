@@ -2,7 +2,7 @@
 from __future__ import unicode_literals
 from django.contrib import admin
 
-from ietf.community.models import CommunityList, SearchRule, EmailSubscription
+from ietf.community.models import CommunityList, SearchRule, EmailSubscription, QueuedNotification
 
 class CommunityListAdmin(admin.ModelAdmin):
     list_display = [u'id', 'user', 'group']
@@ -19,3 +19,7 @@ class EmailSubscriptionAdmin(admin.ModelAdmin):
     raw_id_fields = ['community_list', 'email']
 admin.site.register(EmailSubscription, EmailSubscriptionAdmin)
 
+class QueuedNotificationAdmin(admin.ModelAdmin):
+    list_display = [u'id', 'event', 'time', 'started']
+    raw_id_fields = ['event', 'sent_to']
+admin.site.register(QueuedNotification, QueuedNotificationAdmin)
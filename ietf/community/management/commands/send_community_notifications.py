@@ -0,0 +1,31 @@
+# Copyright The IETF Trust 2018, All Rights Reserved
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+import debug                            # pyflakes:ignore
+
+from ietf.community.utils import send_queued_notifications
+
+class Command(BaseCommand):
+    help = (u"Send the queued community list notifications, as one digest email per "
+            u"subscription.  Notifications are only queued when "
+            u"COMMUNITY_LIST_NOTIFICATION_QUEUE is set.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=None,
+            help="send at most this many queued events per run")
+        parser.add_argument("--loop", type=int, default=None, metavar="SECONDS",
+            help="keep running, sending the queued notifications every SECONDS seconds")
+
+    def handle(self, *args, **options):
+        while True:
+            count = send_queued_notifications(limit=options["limit"])
+            if options["verbosity"] > 1:
+                self.stdout.write("Sent %s notification emails\n" % count)
+            if not options["loop"]:
+                break
+            time.sleep(options["loop"])
+            close_old_connections()
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.15 on 2018-10-29 10:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0004_queuednotification_started'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='queuednotification',
+            name='sent_to',
+            field=models.ManyToManyField(blank=True, help_text='Subscriptions the event has been sent to', to='community.EmailSubscription'),
+        ),
+    ]
@@ -1,3 +1,6 @@
+import datetime
+
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import models
 from django.db.models import signals
@@ -91,6 +94,17 @@ class EmailSubscription(models.Model):
     def __unicode__(self):
         return u"%s to %s (%s changes)" % (self.email, self.community_list, self.notify_on)
 
+class QueuedNotification(models.Model):
+    """An event still to be sent to the subscribers of the community
+    lists tracking its document, see send_queued_notifications()."""
+    event = ForeignKey(DocEvent)
+    time = models.DateTimeField(default=datetime.datetime.now)
+    started = models.DateTimeField(null=True, blank=True)
+    sent_to = models.ManyToManyField(EmailSubscription, blank=True, help_text="Subscriptions the event has been sent to")
+
+    def __unicode__(self):
+        return u"%s queued at %s" % (self.event, self.time)
+
 
 def notify_events(sender, instance, **kwargs):
     if not isinstance(instance, DocEvent):
@@ -102,8 +116,19 @@ def notify_events(sender, instance, **kwargs):
     if getattr(instance, "skip_community_list_notification", False):
         return
 
+    if settings.COMMUNITY_LIST_NOTIFICATION_QUEUE:
+        QueuedNotification.objects.create(event=instance)
+        return
+
     from ietf.community.utils import notify_event_to_subscribers
     notify_event_to_subscribers(instance)
 
 
 signals.post_save.connect(notify_events)
+
+def search_rule_changed(sender, instance, **kwargs):
+    from ietf.community.utils import search_rules_changed
+    search_rules_changed(sender, instance, **kwargs)
+
+signals.post_save.connect(search_rule_changed, sender=SearchRule)
+signals.post_delete.connect(search_rule_changed, sender=SearchRule)
@@ -6,7 +6,7 @@ from tastypie.cache import SimpleCache
 
 from ietf import api
 
-from ietf.community.models import CommunityList, SearchRule, EmailSubscription
+from ietf.community.models import CommunityList, SearchRule, EmailSubscription, QueuedNotification
 
 
 from ietf.doc.resources import DocumentResource
@@ -59,3 +59,21 @@ class EmailSubscriptionResource(ModelResource):
             "community_list": ALL_WITH_RELATIONS,
         }
 api.community.register(EmailSubscriptionResource())
+
+from ietf.doc.resources import DocEventResource
+class QueuedNotificationResource(ModelResource):
+    event            = ToOneField(DocEventResource, 'event')
+    sent_to          = ToManyField(EmailSubscriptionResource, 'sent_to', null=True)
+    class Meta:
+        cache = SimpleCache()
+        queryset = QueuedNotification.objects.all()
+        serializer = api.Serializer()
+        #resource_name = 'queuednotification'
+        filtering = { 
+            "id": ALL,
+            "time": ALL,
+            "started": ALL,
+            "event": ALL_WITH_RELATIONS,
+            "sent_to": ALL_WITH_RELATIONS,
+        }
+api.community.register(QueuedNotificationResource())
@@ -1,15 +1,22 @@
+import datetime
 import json
 
+from mock import patch
 from pyquery import PyQuery
 
+from django.conf import settings
 from django.urls import reverse as urlreverse
 from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test.utils import override_settings
 
 import debug                            # pyflakes:ignore
 
-from ietf.community.models import CommunityList, SearchRule, EmailSubscription
+from ietf.community.models import CommunityList, SearchRule, EmailSubscription, QueuedNotification
 from ietf.community.utils import docs_matching_community_list_rule, community_list_rules_matching_doc
-from ietf.community.utils import reset_name_contains_index_for_rule
+from ietf.community.utils import reset_name_contains_index_for_rule, community_lists_tracking_doc
+from ietf.community.utils import SearchRuleIndex, update_name_contains_indexes_with_new_doc
+from ietf.community.utils import community_list_ids_tracking_docs, send_queued_notifications
 import ietf.community.views
 from ietf.group.models import Group
 from ietf.group.utils import setup_default_community_list_for_group
@@ -72,6 +79,48 @@ class CommunityListTests(TestCase):
         self.assertTrue(draft in list(docs_matching_community_list_rule(rule_shepherd)))
         self.assertTrue(draft in list(docs_matching_community_list_rule(rule_name_contains)))
 
+    def test_search_rule_index(self):
+        rules = [
+            (1, 10, "state_iesg", 100, None, None, ""),
+            (2, 11, "group", 101, 5, None, ""),
+            (3, 12, "shepherd", 101, None, 7, ""),
+            (4, 13, "name_contains", 101, None, None, "draft-.*-mars"),
+            (5, 14, "name_contains", 101, None, None, "(?i)JUPITER"),
+            (6, 15, "name_contains", 101, None, None, r"-(ab)\1-"),
+            (7, 16, "name_contains", 102, None, None, "mars"),
+            (8, 17, "name_contains", 101, None, None, "broken(regexp"),
+        ]
+        index = SearchRuleIndex("v1", rules)
+
+        def matching(states=[], groups=[], shepherd=None, names=[]):
+            return sorted(rule_id for rule_id, clist_id in index.rules_matching(states, groups, [], None, shepherd, names))
+
+        self.assertEqual(matching(states=[100, 101], groups=[5], shepherd=7), [1, 2, 3])
+        self.assertEqual(matching(states=[101], groups=[6], shepherd=8), [])
+        self.assertEqual(matching(states=[101], names=["draft-ietf-mars-test"]), [4])
+        self.assertEqual(matching(states=[101, 102], names=["draft-ietf-mars-test"]), [4, 7])
+        self.assertEqual(matching(states=[101], names=["draft-ietf-jupiter-test"]), [5])
+        self.assertEqual(matching(states=[101], names=["draft-abab-test"]), [6])
+        self.assertEqual(matching(states=[101], names=["draft-ab-test"]), [])
+        self.assertEqual(sorted(index.name_contains_rules_matching(["draft-ietf-mars-test"])), [4, 7])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_search_rule_index_invalidation(self):
+        plain = PersonFactory(user__username='plain')
+        draft = WgDraftFactory()
+        clist = CommunityList.objects.create(user=plain.user)
+        self.assertFalse(clist in community_lists_tracking_doc(draft))
+
+        # adding a rule must not be hidden by the cached index
+        rule = SearchRule.objects.create(rule_type="name_contains", state=State.objects.get(type="draft", slug="active"), text="-".join(draft.name.split("-")[2:]), community_list=clist)
+        self.assertTrue(clist in community_lists_tracking_doc(draft))
+
+        update_name_contains_indexes_with_new_doc(draft)
+        self.assertTrue(draft in rule.name_contains_index.all())
+
+        rule.delete()
+        self.assertFalse(clist in community_lists_tracking_doc(draft))
+
     def test_view_list(self):
         PersonFactory(user__username='plain')
         draft = WgDraftFactory()
@@ -382,3 +431,88 @@ class CommunityListTests(TestCase):
         self.assertTrue(draft.name in outbox[-1]["Subject"])
         
         
+
+    def test_queued_notification(self):
+        plain = PersonFactory(user__username='plain')
+        other = PersonFactory()
+        draft = WgDraftFactory()
+        other_draft = WgDraftFactory()
+
+        clist = CommunityList.objects.create(user=plain.user)
+        clist.added_docs.add(draft)
+        clist.added_docs.add(other_draft)
+
+        EmailSubscription.objects.create(community_list=clist, email=plain.email(), notify_on="all")
+        EmailSubscription.objects.create(community_list=clist, email=other.email(), notify_on="significant")
+
+        active_state = State.objects.get(type="draft", slug="active")
+        rfc_state = State.objects.get(type="draft", slug="rfc")
+        system = Person.objects.get(name="(System)")
+
+        mailbox_before = len(outbox)
+        with self.settings(COMMUNITY_LIST_NOTIFICATION_QUEUE=True):
+            add_state_change_event(draft, system, None, active_state)
+            add_state_change_event(draft, system, active_state, rfc_state)
+            add_state_change_event(other_draft, system, None, active_state)
+        self.assertEqual(len(outbox), mailbox_before)
+        self.assertEqual(QueuedNotification.objects.count(), 3)
+
+        call_command("send_community_notifications")
+        self.assertEqual(QueuedNotification.objects.count(), 0)
+        self.assertEqual(len(outbox), mailbox_before + 2)
+
+        # everything in one digest for the "all" subscription
+        all_msg = [ m for m in outbox[mailbox_before:] if plain.email_address() in m["To"] ][0]
+        self.assertTrue("Changes to 2 documents" in all_msg["Subject"])
+        body = all_msg.get_payload(decode=True)
+        self.assertTrue(draft.name in body and other_draft.name in body)
+
+        # only the significant change for the other one
+        significant_msg = [ m for m in outbox[mailbox_before:] if other.email_address() in m["To"] ][0]
+        self.assertTrue(draft.name in significant_msg["Subject"])
+
+        # nothing left to send
+        call_command("send_community_notifications")
+        self.assertEqual(len(outbox), mailbox_before + 2)
+
+    def test_queued_notification_failure(self):
+        plain = PersonFactory(user__username='plain')
+        other = PersonFactory()
+        draft = WgDraftFactory(states=[('draft','active')])
+
+        clist = CommunityList.objects.create(user=plain.user)
+        clist.added_docs.add(draft)
+        group_clist = CommunityList.objects.create(group=draft.group)
+        active_state = State.objects.get(type="draft", slug="active")
+        SearchRule.objects.create(rule_type="group", group=draft.group, state=active_state, community_list=group_clist)
+
+        EmailSubscription.objects.create(community_list=clist, email=plain.email(), notify_on="all")
+        EmailSubscription.objects.create(community_list=group_clist, email=other.email(), notify_on="all")
+
+        self.assertEqual(community_list_ids_tracking_docs([draft])[draft.pk], set([clist.pk, group_clist.pk]))
+
+        system = Person.objects.get(name="(System)")
+        with self.settings(COMMUNITY_LIST_NOTIFICATION_QUEUE=True):
+            add_state_change_event(draft, system, None, active_state)
+        self.assertEqual(QueuedNotification.objects.count(), 1)
+
+        # the event is kept until the digests of both subscriptions are sent
+        mailbox_before = len(outbox)
+        with patch("ietf.community.utils.send_mail", side_effect=[None, Exception("connection lost")]):
+            with self.assertRaises(Exception):
+                send_queued_notifications()
+        self.assertEqual(QueuedNotification.objects.count(), 1)
+        queued = QueuedNotification.objects.get()
+        self.assertTrue(queued.started)
+        self.assertEqual(queued.sent_to.count(), 1)
+        unsent = EmailSubscription.objects.exclude(pk__in=queued.sent_to.all()).get()
+
+        # claimed, so it's only sent again once the claim has timed out
+        self.assertEqual(send_queued_notifications(), 0)
+        QueuedNotification.objects.update(started=datetime.datetime.now() - datetime.timedelta(seconds=settings.COMMUNITY_LIST_NOTIFICATION_CLAIM_TIMEOUT + 60))
+
+        # and then only to the subscription it wasn't sent to
+        self.assertEqual(send_queued_notifications(), 1)
+        self.assertEqual(QueuedNotification.objects.count(), 0)
+        self.assertEqual(len(outbox), mailbox_before + 1)
+        self.assertIn(unsent.email.address, outbox[-1]["To"])
@@ -1,19 +1,24 @@
+import datetime
 import re
+import uuid
+from collections import defaultdict, OrderedDict
 
+from django.core.cache import cache
+from django.db import transaction
 from django.db.models import Q
 from django.conf import settings
 
 import debug                            # pyflakes:ignore
 
-from ietf.community.models import CommunityList, EmailSubscription, SearchRule
-from ietf.doc.models import Document, State
+from ietf.community.models import CommunityList, EmailSubscription, SearchRule, QueuedNotification
+from ietf.doc.models import Document, State, DocEvent, StateDocEvent, DocAlias, DocumentAuthor
 from ietf.group.models import Role, Group
-from ietf.person.models import Person
 from ietf.ietfauth.utils import has_role
+from ietf.person.models import Email
 from django.contrib.auth.models import User
 from django.shortcuts import get_object_or_404
 
-from ietf.utils.mail import send_mail
+from ietf.utils.mail import send_mail, reused_smtp_connection
 
 def states_of_significant_change():
     return State.objects.filter(used=True).filter(
@@ -77,13 +82,11 @@ def reset_name_contains_index_for_rule(rule):
     rule.name_contains_index.set(Document.objects.filter(docalias__name__regex=rule.text))
 
 def update_name_contains_indexes_with_new_doc(doc):
-    for r in SearchRule.objects.filter(rule_type="name_contains"):
-        # in theory we could use the database to do this query, but
-        # Django doesn't support a reversed regex operator, and regexp
-        # support needs backend-specific code so custom SQL is a bit
-        # cumbersome too
-        if re.search(r.text, doc.name):
-            r.name_contains_index.add(doc)
+    # Django doesn't support a reversed regex operator, so match the
+    # name against the compiled rules in the search rule index
+    rule_ids = search_rule_index().name_contains_rules_matching([doc.name])
+    for r in SearchRule.objects.filter(pk__in=rule_ids):
+        r.name_contains_index.add(doc)
 
 def docs_matching_community_list_rule(rule):
     docs = Document.objects.all()
@@ -102,54 +105,166 @@ def docs_matching_community_list_rule(rule):
 
     raise NotImplementedError
 
-def community_list_rules_matching_doc(doc):
+class SearchRuleIndex(object):
+    """In-memory index over all search rules for finding the rules,
+    and thus community lists, matching a document without a query per
+    rule type.  Rules are keyed on state and group or person, and the
+    name_contains rules are matched with combined compiled regexps."""
+
+    GROUP_RULE_TYPES = ('group', 'area', 'group_rfc', 'area_rfc')
+    STATE_RULE_TYPES = ('state_iab', 'state_iana', 'state_iesg', 'state_irtf', 'state_ise', 'state_rfceditor', 'state_ietf')
+    PERSON_RULE_TYPES = ('author', 'author_rfc', 'ad', 'shepherd')
+
+    # Python 2 re supports at most 100 groups per pattern
+    MAX_COMBINED_GROUPS = 99
+
+    def __init__(self, version, rules):
+        self.version = version
+
+        # (rule id, community list id) lists keyed on the rule criteria
+        self.by_state_group = defaultdict(list)
+        self.by_state = defaultdict(list)
+        self.by_state_person = defaultdict(list)
+        self.name_rules = defaultdict(list)     # text -> [(state id, rule id, community list id)]
+
+        for rule_id, clist_id, rule_type, state_id, group_id, person_id, text in rules:
+            r = (rule_id, clist_id)
+            if rule_type in self.GROUP_RULE_TYPES:
+                self.by_state_group[(state_id, group_id)].append(r)
+            elif rule_type in self.STATE_RULE_TYPES:
+                self.by_state[state_id].append(r)
+            elif rule_type in self.PERSON_RULE_TYPES:
+                self.by_state_person[(rule_type, state_id, person_id)].append(r)
+            elif rule_type == "name_contains":
+                self.name_rules[text].append((state_id, rule_id, clist_id))
+
+        self.compile_name_rules()
+
+    def compile_name_rules(self):
+        # each chunk is a combined regexp for quickly ruling out all
+        # of its texts plus the individually compiled texts
+        self.name_chunks = []
+        chunk, groups = [], 0
+        for text in sorted(self.name_rules):
+            try:
+                regexp = re.compile(text)
+            except re.error:
+                continue
+            # backreferences, named groups and flags don't survive being
+            # combined with other texts
+            if regexp.groups >= self.MAX_COMBINED_GROUPS or re.search(r"\\[1-9]|\(\?P|\(\?[iLmsux]+\)", text):
+                self.name_chunks.append((regexp, [(text, regexp)]))
+                continue
+            if groups + regexp.groups >= self.MAX_COMBINED_GROUPS:
+                self.add_name_chunk(chunk)
+                chunk, groups = [], 0
+            chunk.append((text, regexp))
+            groups += regexp.groups
+        if chunk:
+            self.add_name_chunk(chunk)
+
+    def add_name_chunk(self, chunk):
+        if len(chunk) == 1:
+            self.name_chunks.append((chunk[0][1], chunk))
+            return
+        try:
+            combined = re.compile("|".join("(?:%s)" % text for text, regexp in chunk))
+        except (re.error, AssertionError):
+            for text, regexp in chunk:
+                self.name_chunks.append((regexp, [(text, regexp)]))
+        else:
+            self.name_chunks.append((combined, chunk))
+
+    def matching_name_texts(self, names):
+        for combined, chunk in self.name_chunks:
+            if any(combined.search(n) for n in names):
+                for text, regexp in chunk:
+                    if any(regexp.search(n) for n in names):
+                        yield text
+
+    def name_contains_rules_matching(self, names):
+        """Return the ids of the name_contains rules matching any of names
+        regardless of state."""
+        return [ rule_id for text in self.matching_name_texts(names) for state_id, rule_id, clist_id in self.name_rules[text] ]
+
+    def rules_matching(self, states, groups, authors, ad, shepherd, names):
+        """Return (rule id, community list id) for the rules matching a
+        document with the given states, group (and parent), author
+        persons, AD person, shepherd person and names."""
+        matches = []
+        for state_id in states:
+            for group_id in groups:
+                matches.extend(self.by_state_group.get((state_id, group_id), []))
+            matches.extend(self.by_state.get(state_id, []))
+            for person_id in authors:
+                matches.extend(self.by_state_person.get(("author", state_id, person_id), []))
+                matches.extend(self.by_state_person.get(("author_rfc", state_id, person_id), []))
+            if ad:
+                matches.extend(self.by_state_person.get(("ad", state_id, ad), []))
+            if shepherd:
+                matches.extend(self.by_state_person.get(("shepherd", state_id, shepherd), []))
+
+        states = set(states)
+        for text in self.matching_name_texts(names):
+            matches.extend((rule_id, clist_id) for state_id, rule_id, clist_id in self.name_rules[text] if state_id in states)
+
+        return matches
+
+SEARCH_RULE_INDEX_VERSION_KEY = "community:search_rule_index:version"
+
+_search_rule_index = None
+
+def invalidate_search_rule_index():
+    version = uuid.uuid4().hex
+    cache.set(SEARCH_RULE_INDEX_VERSION_KEY, version, None)
+    return version
+
+def search_rule_index():
+    """Return the index over all search rules.  The index is shared
+    through the cache and kept in memory in each process until the
+    rules change."""
+    global _search_rule_index
+
+    version = cache.get(SEARCH_RULE_INDEX_VERSION_KEY)
+    if version is None:
+        version = invalidate_search_rule_index()
+
+    if _search_rule_index is None or _search_rule_index.version != version:
+        cache_key = "community:search_rule_index:%s" % version
+        index = cache.get(cache_key)
+        if index is None:
+            rules = SearchRule.objects.values_list("pk", "community_list", "rule_type", "state", "group", "person", "text")
+            index = SearchRuleIndex(version, rules)
+            cache.set(cache_key, index, settings.COMMUNITY_SEARCH_RULE_INDEX_CACHE_TIME)
+        _search_rule_index = index
+
+    return _search_rule_index
+
+def search_rules_changed(sender, instance, **kwargs):
+    invalidate_search_rule_index()
+    # rebuild from the committed rules, not just the ones visible here
+    transaction.on_commit(invalidate_search_rule_index)
+
+def search_rule_matches_for_doc(doc):
+    """Return (rule id, community list id) for the search rules
+    matching doc, with one query for each of the document attributes
+    the rules look at."""
     states = list(doc.states.values_list("pk", flat=True))
 
-    rules = SearchRule.objects.none()
-
+    groups = []
     if doc.group_id:
         groups = [doc.group_id]
         if doc.group.parent_id:
             groups.append(doc.group.parent_id)
-        rules |= SearchRule.objects.filter(
-            rule_type__in=['group', 'area', 'group_rfc', 'area_rfc'],
-            state__in=states,
-            group__in=groups
-        )
-
-    rules |= SearchRule.objects.filter(
-        rule_type__in=['state_iab', 'state_iana', 'state_iesg', 'state_irtf', 'state_ise', 'state_rfceditor', 'state_ietf'],
-        state__in=states,
-    )
 
-    rules |= SearchRule.objects.filter(
-        rule_type__in=["author", "author_rfc"],
-        state__in=states,
-        person__in=list(Person.objects.filter(documentauthor__document=doc)),
-    )
+    authors = list(doc.documentauthor_set.values_list("person", flat=True))
+    shepherd = doc.shepherd.person_id if doc.shepherd_id else None
+    names = [doc.name] + [ n for n in doc.docalias_set.values_list("name", flat=True) if n != doc.name ]
 
-    if doc.ad_id:
-        rules |= SearchRule.objects.filter(
-            rule_type="ad",
-            state__in=states,
-            person=doc.ad_id,
-        )
-
-    if doc.shepherd_id:
-        rules |= SearchRule.objects.filter(
-            rule_type="shepherd",
-            state__in=states,
-            person__email=doc.shepherd_id,
-        )
-
-    rules |= SearchRule.objects.filter(
-        rule_type="name_contains",
-        state__in=states,
-        name_contains_index=doc, # search our materialized index to avoid full scan
-    )
-
-    return rules
+    return search_rule_index().rules_matching(states, groups, authors, doc.ad_id, shepherd, names)
 
+def community_list_rules_matching_doc(doc):
+    return SearchRule.objects.filter(pk__in=[ rule_id for rule_id, clist_id in search_rule_matches_for_doc(doc) ])
 
 def docs_tracked_by_community_list(clist):
     if clist.pk is None:
@@ -165,7 +280,44 @@ def docs_tracked_by_community_list(clist):
     return Document.objects.filter(pk__in=doc_ids)
 
 def community_lists_tracking_doc(doc):
-    return CommunityList.objects.filter(Q(added_docs=doc) | Q(searchrule__in=community_list_rules_matching_doc(doc)))
+    clist_ids = set(clist_id for rule_id, clist_id in search_rule_matches_for_doc(doc))
+    return CommunityList.objects.filter(Q(added_docs=doc) | Q(pk__in=clist_ids)).distinct()
+
+def community_list_ids_tracking_docs(docs):
+    """Return a dict from the pks of docs to the ids of the community
+    lists tracking them, matching the search rules of the lists in
+    memory with one query for each of the document attributes the rules
+    look at, regardless of the number of documents."""
+    doc_ids = [ d.pk for d in docs ]
+
+    states = defaultdict(list)
+    for doc_id, state_id in Document.states.through.objects.filter(document__in=doc_ids).values_list("document", "state"):
+        states[doc_id].append(state_id)
+
+    parents = dict(Group.objects.filter(pk__in=set(d.group_id for d in docs if d.group_id)).values_list("pk", "parent"))
+
+    authors = defaultdict(list)
+    for doc_id, person_id in DocumentAuthor.objects.filter(document__in=doc_ids).values_list("document", "person"):
+        authors[doc_id].append(person_id)
+
+    shepherds = dict(Email.objects.filter(pk__in=set(d.shepherd_id for d in docs if d.shepherd_id)).values_list("pk", "person"))
+
+    names = defaultdict(list)
+    for doc_id, name in DocAlias.objects.filter(document__in=doc_ids).values_list("document", "name"):
+        names[doc_id].append(name)
+
+    tracking = defaultdict(set)
+    for doc_id, clist_id in CommunityList.added_docs.through.objects.filter(document__in=doc_ids).values_list("document", "communitylist"):
+        tracking[doc_id].add(clist_id)
+
+    index = search_rule_index()
+    for d in docs:
+        groups = [ g for g in (d.group_id, parents.get(d.group_id)) if g ]
+        doc_names = [d.name] + [ n for n in names[d.pk] if n != d.name ]
+        matches = index.rules_matching(states[d.pk], groups, authors[d.pk], d.ad_id, shepherds.get(d.shepherd_id), doc_names)
+        tracking[d.pk].update(clist_id for rule_id, clist_id in matches)
+
+    return tracking
 
 
 def notify_event_to_subscribers(event):
@@ -185,3 +337,100 @@ def notify_event_to_subscribers(event):
                       'event': event,
                       'clist': clist,
                   })
+
+def claim_queued_notifications(limit=None):
+    """Mark queued notifications as started, so concurrent runs don't
+    pick them up too.  Notifications started more than
+    COMMUNITY_LIST_NOTIFICATION_CLAIM_TIMEOUT seconds ago are taken to be
+    left over from a run that died, and are claimed again."""
+    now = datetime.datetime.now()
+    stale = now - datetime.timedelta(seconds=settings.COMMUNITY_LIST_NOTIFICATION_CLAIM_TIMEOUT)
+    with transaction.atomic():
+        queued = QueuedNotification.objects.select_for_update().filter(Q(started=None) | Q(started__lt=stale)).order_by("time", "pk")
+        if limit:
+            queued = queued[:limit]
+        pks = list(queued.values_list("pk", flat=True))
+        QueuedNotification.objects.filter(pk__in=pks).update(started=now)
+    return list(QueuedNotification.objects.filter(pk__in=pks).values_list("pk", "event"))
+
+def send_queued_notifications(limit=None):
+    """Send the queued events to the subscribers of the community lists
+    tracking their documents.  The events for each subscription are
+    sent as one digest email, grouped by document, and all emails are
+    sent over one SMTP connection.  Each queued event records the
+    subscriptions it has been sent to, and is deleted once the digests
+    of all its subscriptions have been sent, so a later run only sends
+    the digests that a failed run didn't get to.  Returns the number of
+    emails sent."""
+    queued = claim_queued_notifications(limit)
+    if not queued:
+        return 0
+
+    events = list(DocEvent.objects.filter(pk__in=[ event_id for pk, event_id in queued ]).select_related("doc", "by").order_by("time", "pk"))
+
+    significant_states = set(s.pk for s in states_of_significant_change())
+    changed_states = dict(StateDocEvent.objects.filter(pk__in=[ e.pk for e in events if e.type == "changed_state" ]).values_list("pk", "state"))
+
+    tracking = community_list_ids_tracking_docs(dict((e.doc_id, e.doc) for e in events).values())
+    clist_subscriptions = defaultdict(list)
+    for sub in EmailSubscription.objects.filter(community_list__in=set().union(*tracking.values())).select_related("community_list", "email"):
+        clist_subscriptions[sub.community_list_id].append(sub)
+
+    queued_pks = defaultdict(list)      # event pk -> queued pks
+    for pk, event_id in queued:
+        queued_pks[event_id].append(pk)
+
+    SentTo = QueuedNotification.sent_to.through
+    sent = defaultdict(set)             # queued pk -> subscription pks
+    for pk, sub_pk in SentTo.objects.filter(queuednotification__in=[ pk for pk, event_id in queued ]).values_list("queuednotification", "emailsubscription"):
+        sent[pk].add(sub_pk)
+
+    subscriptions = {}
+    digests = defaultdict(OrderedDict)  # subscription pk -> doc -> [events]
+    digest_queued = defaultdict(set)    # subscription pk -> queued pks
+    pending = dict((pk, set()) for pk, event_id in queued) # queued pk -> subscription pks
+    for e in events:
+        significant = changed_states.get(e.pk) in significant_states
+        for clist_id in tracking[e.doc_id]:
+            for sub in clist_subscriptions[clist_id]:
+                if sub.notify_on != "all" and not significant:
+                    continue
+                unsent = [ pk for pk in queued_pks[e.pk] if sub.pk not in sent[pk] ]
+                if not unsent:
+                    continue
+                subscriptions[sub.pk] = sub
+                digests[sub.pk].setdefault(e.doc, []).append(e)
+                for pk in unsent:
+                    digest_queued[sub.pk].add(pk)
+                    pending[pk].add(sub.pk)
+
+    # nobody (left) to send these to
+    QueuedNotification.objects.filter(pk__in=[ pk for pk, subs in pending.iteritems() if not subs ]).delete()
+
+    with reused_smtp_connection():
+        for sub_pk, doc_events in digests.iteritems():
+            sub = subscriptions[sub_pk]
+            docs = doc_events.items()
+            clist = sub.community_list
+            if len(docs) == 1:
+                subject = '%s notification: Changes to %s' % (clist.long_name(), docs[0][0].name)
+            else:
+                subject = '%s notification: Changes to %s documents' % (clist.long_name(), len(docs))
+
+            send_mail(None, sub.email.address, settings.DEFAULT_FROM_EMAIL, subject, 'community/notification_digest_email.txt',
+                      context = {
+                          'docs': docs,
+                          'clist': clist,
+                      })
+
+            done = []
+            for pk in digest_queued[sub_pk]:
+                pending[pk].discard(sub_pk)
+                if not pending[pk]:
+                    done.append(pk)
+            with transaction.atomic():
+                SentTo.objects.bulk_create([ SentTo(queuednotification_id=pk, emailsubscription_id=sub_pk)
+                                             for pk in digest_queued[sub_pk] if pk not in done ])
+                QueuedNotification.objects.filter(pk__in=done).delete()
+
+    return len(digests)
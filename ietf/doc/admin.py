@@ -5,7 +5,8 @@ from models import (StateType, State, RelatedDocument, DocumentAuthor, Document,
     DocHistoryAuthor, DocHistory, DocAlias, DocReminder, DocEvent, NewRevisionDocEvent,
     StateDocEvent, ConsensusDocEvent, BallotType, BallotDocEvent, WriteupDocEvent, LastCallDocEvent,
     TelechatDocEvent, BallotPositionDocEvent, ReviewRequestDocEvent, InitialReviewDocEvent,
-    AddedMessageEvent, SubmissionDocEvent, DeletedEvent, EditedAuthorsDocEvent, DocumentURL)
+    AddedMessageEvent, SubmissionDocEvent, DeletedEvent, EditedAuthorsDocEvent, DocumentURL,
+    DocumentSearchIndex, DocumentReferenceIndex)
 
 
 class StateTypeAdmin(admin.ModelAdmin):
@@ -163,3 +164,15 @@ class DocumentUrlAdmin(admin.ModelAdmin):
     list_display = ['id', 'doc', 'tag', 'url', 'desc', ]
     raw_id_fields = ['doc', ]
 admin.site.register(DocumentURL, DocumentUrlAdmin)
+
+class DocumentSearchIndexAdmin(admin.ModelAdmin):
+    list_display = ['document', 'draft_state', 'iesg_state', 'group', 'area', 'ad', 'stream', ]
+    search_fields = ['document__name', ]
+    raw_id_fields = ['document', 'iesg_state', 'irtf_state', 'group', 'area', 'ad', ]
+admin.site.register(DocumentSearchIndex, DocumentSearchIndexAdmin)
+
+class DocumentReferenceIndexAdmin(admin.ModelAdmin):
+    list_display = ['relation', 'source_name', 'relationship', 'target_name', 'source_state', 'downref', ]
+    search_fields = ['source_name', 'target_name', ]
+    raw_id_fields = ['relation', 'source', 'target', ]
+admin.site.register(DocumentReferenceIndex, DocumentReferenceIndexAdmin)
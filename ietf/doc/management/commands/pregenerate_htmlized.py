@@ -0,0 +1,38 @@
+# Copyright The IETF Trust 2018, All Rights Reserved
+
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+
+import debug                            # pyflakes:ignore
+
+from ietf.doc.utils_htmlize import pregenerate_htmlized, recent_htmlizable_text_files, all_htmlizable_text_files
+from ietf.utils.log import log
+
+class Command(BaseCommand):
+    help = (u"Generate the htmlized versions of new draft revisions and newly published "
+            u"RFCs, and store them so the htmlized document pages are served without "
+            u"marking up the text on request.  Documents which have already been "
+            u"htmlized are left alone, so this can be run repeatedly, for instance "
+            u"from cron.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=1,
+            help="htmlize documents with revisions or publication within this many days (default: %(default)s)")
+        parser.add_argument("--all", action="store_true", default=False,
+            help="htmlize all RFCs and active drafts")
+        parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count(),
+            help="number of worker processes to htmlize documents in (default: %(default)s)")
+
+    def handle(self, *args, **options):
+        start = time.time()
+        if options["all"]:
+            paths = all_htmlizable_text_files()
+        else:
+            paths = recent_htmlizable_text_files(days=options["days"])
+        count = pregenerate_htmlized(paths, processes=options["processes"])
+        msg = "Htmlized %s of %s documents in %.1fs" % (count, len(paths), time.time() - start)
+        log(msg)
+        if options["verbosity"] > 1:
+            self.stdout.write(msg + "\n")
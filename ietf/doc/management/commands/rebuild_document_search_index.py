@@ -0,0 +1,21 @@
+# Copyright The IETF Trust 2018, All Rights Reserved
+
+from django.core.management.base import BaseCommand
+
+import debug                            # pyflakes:ignore
+
+from ietf.doc.utils_search import rebuild_document_search_index
+
+class Command(BaseCommand):
+    help = (u"Rebuild the denormalized document search index from scratch.  The index is "
+            u"filled in by a migration and kept up to date as documents change, so this is "
+            u"only needed if the index has got out of sync.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000,
+            help="number of documents to index per batch (default: %(default)s)")
+
+    def handle(self, *args, **options):
+        count = rebuild_document_search_index(batch_size=options["batch_size"])
+        if options["verbosity"] > 1:
+            self.stdout.write("Indexed %s documents\n" % count)
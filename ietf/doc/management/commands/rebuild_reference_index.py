@@ -0,0 +1,21 @@
+# Copyright The IETF Trust 2018, All Rights Reserved
+
+from django.core.management.base import BaseCommand
+
+import debug                            # pyflakes:ignore
+
+from ietf.doc.utils_relations import rebuild_reference_index
+
+class Command(BaseCommand):
+    help = (u"Rebuild the denormalized document reference index from scratch.  The index is "
+            u"kept up to date as the references of drafts are rebuilt and documents change, so "
+            u"this is only needed if the index has got out of sync.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000,
+            help="number of references to index per batch (default: %(default)s)")
+
+    def handle(self, *args, **options):
+        count = rebuild_reference_index(batch_size=options["batch_size"])
+        if options["verbosity"] > 1:
+            self.stdout.write("Indexed %s references\n" % count)
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.15 on 2018-10-19 09:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import ietf.utils.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('group', '0003_groupfeatures_data'),
+        ('name', '0004_add_prefix_to_doctypenames'),
+        ('person', '0008_auto_20181014_1448'),
+        ('doc', '0006_ballotpositiondocevent_send_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSearchIndex',
+            fields=[
+                ('document', ietf.utils.models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_index', serialize=False, to='doc.Document')),
+                ('names', models.TextField(help_text=b'Name and aliases of the document, separated by spaces')),
+                ('authors', models.TextField(blank=True, help_text=b'Names and email addresses of the authors, one per line')),
+                ('draft_state', models.CharField(blank=True, db_index=True, max_length=50)),
+                ('tags', models.CharField(blank=True, help_text=b'Tag slugs, separated and surrounded by spaces', max_length=255)),
+                ('ad', ietf.utils.models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='person.Person')),
+                ('area', ietf.utils.models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='group.Group')),
+                ('group', ietf.utils.models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='group.Group')),
+                ('iesg_state', ietf.utils.models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='doc.State')),
+                ('irtf_state', ietf.utils.models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='doc.State')),
+                ('stream', ietf.utils.models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='name.StreamName')),
+            ],
+        ),
+    ]
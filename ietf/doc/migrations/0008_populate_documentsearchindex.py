@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.15 on 2018-10-19 10:37
+from __future__ import unicode_literals
+
+import sys
+
+from django.db import migrations
+
+import debug                            # pyflakes:ignore
+
+# The same rows as ietf.doc.utils_search.document_search_index_entry()
+# writes, built from the historical models
+
+def area(group):
+    if not group:
+        return None
+    if group.type_id == "wg":
+        return group.parent
+    if group.type_id == "area":
+        return group
+    return None
+
+def forward(apps, schema_editor):
+    Document = apps.get_model('doc', 'Document')
+    DocumentSearchIndex = apps.get_model('doc', 'DocumentSearchIndex')
+
+    sys.stdout.write("\n    Building the document search index...\n")
+
+    count = 0
+    names = list(Document.objects.order_by('name').values_list('name', flat=True))
+    for i in range(0, len(names), 1000):
+        docs = Document.objects.filter(name__in=names[i:i+1000]).select_related('group__parent').prefetch_related(
+            'states', 'tags', 'docalias_set', 'documentauthor_set__person__alias_set', 'documentauthor_set__person__email_set')
+        rows = []
+        for doc in docs:
+            states = {}
+            for s in doc.states.all():
+                states[s.type_id] = s
+            aliases = set([doc.name]) | set(a.name for a in doc.docalias_set.all())
+            authors = set()
+            for a in doc.documentauthor_set.all():
+                authors.update(alias.name for alias in a.person.alias_set.all())
+                authors.update(e.address for e in a.person.email_set.all())
+            tags = [ t.slug for t in doc.tags.all() ]
+            rows.append(DocumentSearchIndex(
+                document=doc,
+                names=" ".join(sorted(aliases)),
+                authors="\n".join(sorted(authors)),
+                draft_state=states['draft'].slug if 'draft' in states else "",
+                iesg_state=states.get('draft-iesg'),
+                irtf_state=states.get('draft-stream-irtf'),
+                tags=" %s " % " ".join(sorted(tags)) if tags else "",
+                group=doc.group,
+                area=area(doc.group),
+                ad_id=doc.ad_id,
+                stream_id=doc.stream_id,
+            ))
+        DocumentSearchIndex.objects.bulk_create(rows)
+        count += len(rows)
+
+    sys.stdout.write("    Indexed %d documents\n" % count)
+
+def reverse(apps, schema_editor):
+    DocumentSearchIndex = apps.get_model('doc', 'DocumentSearchIndex')
+    DocumentSearchIndex.objects.all().delete()
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doc', '0007_documentsearchindex'),
+    ]
+
+    operations = [
+        migrations.RunPython(forward, reverse)
+    ]
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.15 on 2018-10-23 10:41
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import ietf.utils.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('name', '0004_add_prefix_to_doctypenames'),
+        ('doc', '0008_populate_documentsearchindex'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentReferenceIndex',
+            fields=[
+                ('relation', ietf.utils.models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='reference_index', serialize=False, to='doc.RelatedDocument')),
+                ('target_name', models.CharField(help_text=b'Name of the alias the reference is to', max_length=255)),
+                ('relationship_order', models.IntegerField(help_text=b'Sort order of the relationship, normative references first')),
+                ('source_name', models.CharField(help_text=b'Canonical name of the referencing document', max_length=255)),
+                ('source_title', models.CharField(max_length=255)),
+                ('source_state', models.CharField(blank=True, help_text=b'Draft state of the referencing document', max_length=50)),
+                ('source_std_level', models.CharField(blank=True, help_text=b'Standard level of an RFC, else intended standard level', max_length=50)),
+                ('downref', models.CharField(blank=True, max_length=50)),
+                ('relationship', ietf.utils.models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='name.DocRelationshipName')),
+                ('source', ietf.utils.models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='doc.Document')),
+                ('target', ietf.utils.models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='doc.Document')),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='documentreferenceindex',
+            index_together=set([('target', 'source_state', 'relationship_order', 'source_name')]),
+        ),
+    ]
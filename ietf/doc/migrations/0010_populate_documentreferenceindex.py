@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.15 on 2018-10-25 09:12
+from __future__ import unicode_literals
+
+import sys
+
+from django.db import migrations
+
+import debug                            # pyflakes:ignore
+
+# Copies of ietf.doc.utils_relations.REFERENCE_RELATIONSHIPS and of the
+# levels compared by RelatedDocument.is_downref(), as they were when the
+# index was introduced
+REFERENCE_RELATIONSHIPS = ('refnorm', 'refinfo', 'refunk', 'refold')
+DOWNREF_RANK = { 'ps':1, 'ds':2, 'std':3, 'bcp':3 }
+
+def downref(relationship, source_type, source_lvl, target_lvl):
+    if source_type != 'draft' or relationship not in ['refnorm','refold','refunk']:
+        return ""
+    if source_lvl not in ['bcp','ps','ds','std']:
+        return ""
+    target_lvl = target_lvl or 'unkn'
+    if ( target_lvl not in DOWNREF_RANK ) or ( DOWNREF_RANK[target_lvl] < DOWNREF_RANK[source_lvl] ):
+        if relationship == 'refnorm' and target_lvl != 'unkn':
+            return "Downref"
+        else:
+            return "Possible Downref"
+    return ""
+
+def forward(apps, schema_editor):
+    Document = apps.get_model('doc', 'Document')
+    DocAlias = apps.get_model('doc', 'DocAlias')
+    RelatedDocument = apps.get_model('doc', 'RelatedDocument')
+    DocumentReferenceIndex = apps.get_model('doc', 'DocumentReferenceIndex')
+    StdLevelName = apps.get_model('name', 'StdLevelName')
+    IntendedStdLevelName = apps.get_model('name', 'IntendedStdLevelName')
+
+    sys.stdout.write("\n    Building the document reference index...\n")
+
+    std_level_names = dict(StdLevelName.objects.values_list('slug', 'name'))
+    intended_std_level_names = dict(IntendedStdLevelName.objects.values_list('slug', 'name'))
+    draft_states = dict(Document.states.through.objects.filter(state__type='draft').values_list('document', 'state__slug'))
+    rfc_names = {}
+    for doc_id, name in DocAlias.objects.filter(name__startswith='rfc').values_list('document', 'name'):
+        rfc_names[doc_id] = max(name, rfc_names.get(doc_id, name))
+
+    def level(doc_id, std_level, intended_std_level):
+        # the slug and name of the standard level of an RFC, else of the
+        # intended standard level
+        if draft_states.get(doc_id) == 'rfc':
+            return std_level, std_level_names.get(std_level, "")
+        return intended_std_level, intended_std_level_names.get(intended_std_level, "")
+
+    rels = RelatedDocument.objects.filter(relationship__in=REFERENCE_RELATIONSHIPS).order_by('pk').values_list(
+        'pk', 'relationship', 'target__name', 'target__document',
+        'target__document__std_level', 'target__document__intended_std_level',
+        'source', 'source__type', 'source__title', 'source__std_level', 'source__intended_std_level')
+
+    rows = []
+    count = 0
+    for (pk, relationship, target_name, target, target_std_level, target_intended_std_level,
+         source, source_type, source_title, source_std_level, source_intended_std_level) in rels.iterator():
+        state = draft_states.get(source)
+        source_lvl, source_lvl_name = level(source, source_std_level, source_intended_std_level)
+        target_lvl = level(target, target_std_level, target_intended_std_level)[0]
+        if source_type == 'draft' and state == 'rfc' and source in rfc_names:
+            source_name = rfc_names[source]
+        else:
+            source_name = source
+        rows.append(DocumentReferenceIndex(
+            relation_id=pk,
+            target_id=target,
+            target_name=target_name,
+            relationship_id=relationship,
+            relationship_order=REFERENCE_RELATIONSHIPS.index(relationship),
+            source_id=source,
+            source_name=source_name,
+            source_title=source_title,
+            source_state=state or "",
+            source_std_level=source_lvl_name,
+            downref=downref(relationship, source_type, source_lvl, target_lvl),
+        ))
+        if len(rows) >= 1000:
+            DocumentReferenceIndex.objects.bulk_create(rows)
+            count += len(rows)
+            rows = []
+    DocumentReferenceIndex.objects.bulk_create(rows)
+    count += len(rows)
+
+    sys.stdout.write("    Indexed %d references\n" % count)
+
+def reverse(apps, schema_editor):
+    DocumentReferenceIndex = apps.get_model('doc', 'DocumentReferenceIndex')
+    DocumentReferenceIndex.objects.all().delete()
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('name', '0004_add_prefix_to_doctypenames'),
+        ('doc', '0009_documentreferenceindex'),
+    ]
+
+    operations = [
+        migrations.RunPython(forward, reverse)
+    ]
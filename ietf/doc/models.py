@@ -3,10 +3,10 @@
 import datetime
 import logging
 import os
-import rfc2html
 import six
 
 from django.db import models
+from django.db.models import signals
 from django.core import checks
 from django.core.cache import caches
 from django.core.exceptions import ValidationError
@@ -22,14 +22,14 @@ from ietf.group.models import Group
 from ietf.name.models import ( DocTypeName, DocTagName, StreamName, IntendedStdLevelName, StdLevelName,
     DocRelationshipName, DocReminderTypeName, BallotPositionName, ReviewRequestStateName, FormalLanguageName,
     DocUrlTagName)
-from ietf.person.models import Email, Person
+from ietf.person.models import Email, Person, Alias
 from ietf.person.utils import get_active_ads
 from ietf.utils import log
 from ietf.utils.admin import admin_link
 from ietf.utils.decorators import memoize
 from ietf.utils.validators import validate_no_control_chars
 from ietf.utils.mail import formataddr
-from ietf.utils.models import ForeignKey
+from ietf.utils.models import ForeignKey, OneToOneField
 
 logger = logging.getLogger('django')
 
@@ -413,14 +413,23 @@ class DocumentInfo(models.Model):
             raise TypeError("Expected method called on Document or DocHistory")
 
     def all_relations_that(self, relationship, related=None):
-        if not related:
-            related = tuple([])
-        rels = self.relations_that(relationship)
-        for r in rels:
-            if not r in related:
-                related += ( r, )
-                related = r.source.all_relations_that(relationship, related)
-        return related
+        """Return the related-document objects that describe a given
+        relationship targeting self, or, recursively, the sources of those.
+        The relations in related are taken as found already, and aren't
+        followed further."""
+        if isinstance(self, Document) and not related:
+            from ietf.doc.utils_relations import relation_graph, related_documents
+            return tuple(related_documents(relation_graph().relations_that(self.name, relationship, recursive=True)))
+        related = list(related or [])
+        seen = set(related)
+        pending = [ self ]
+        while pending:
+            for r in pending.pop().relations_that(relationship):
+                if not r in seen:
+                    seen.add(r)
+                    related.append(r)
+                    pending.append(r.source)
+        return tuple(related)
 
     def relations_that_doc(self, relationship):
         """Return the related-document objects that describe a given relationship from self to other documents."""
@@ -436,26 +445,46 @@ class DocumentInfo(models.Model):
             raise TypeError("Expected method called on Document or DocHistory")
 
     def all_relations_that_doc(self, relationship, related=None):
-        if not related:
-            related = tuple([])
-        rels = self.relations_that_doc(relationship)
-        for r in rels:
-            if not r in related:
-                related += ( r, )
-                related = r.target.document.all_relations_that_doc(relationship, related)
-        return related
+        """Return the related-document objects that describe a given
+        relationship from self to other documents, or, recursively, from
+        those documents.  The relations in related are taken as found
+        already, and aren't followed further."""
+        if isinstance(self, Document) and not related:
+            from ietf.doc.utils_relations import relation_graph, related_documents
+            return tuple(related_documents(relation_graph().relations_that_doc(self.name, relationship, recursive=True)))
+        related = list(related or [])
+        seen = set(related)
+        pending = [ self ]
+        while pending:
+            for r in pending.pop().relations_that_doc(relationship):
+                if not r in seen:
+                    seen.add(r)
+                    related.append(r)
+                    pending.append(r.target.document)
+        return tuple(related)
 
     def related_that(self, relationship):
+        if isinstance(self, Document):
+            from ietf.doc.utils_relations import doc_aliases
+            return doc_aliases(set(self.relations_that(relationship).values_list("source", flat=True)))
         return list(set([x.source.docalias_set.get(name=x.source.name) for x in self.relations_that(relationship)]))
 
     def all_related_that(self, relationship, related=None):
-        return list(set([x.source.docalias_set.get(name=x.source.name) for x in self.all_relations_that(relationship)]))
+        if isinstance(self, Document) and not related:
+            from ietf.doc.utils_relations import relation_graph, doc_aliases
+            graph = relation_graph()
+            return doc_aliases(graph.sources(graph.relations_that(self.name, relationship, recursive=True)))
+        return list(set([x.source.docalias_set.get(name=x.source.name) for x in self.all_relations_that(relationship, related)]))
 
     def related_that_doc(self, relationship):
         return list(set([x.target for x in self.relations_that_doc(relationship)]))
 
     def all_related_that_doc(self, relationship, related=None):
-        return list(set([x.target for x in self.all_relations_that_doc(relationship)]))
+        if isinstance(self, Document) and not related:
+            from ietf.doc.utils_relations import relation_graph, doc_aliases
+            graph = relation_graph()
+            return doc_aliases(graph.targets(graph.relations_that_doc(self.name, relationship, recursive=True)))
+        return list(set([x.target for x in self.all_relations_that_doc(relationship, related)]))
 
     def replaces(self):
         return set([ r.document for r in self.related_that_doc("replaces")])
@@ -485,22 +514,26 @@ class DocumentInfo(models.Model):
         return self.text() or "Error; cannot read '%s'"%self.get_base_name()
 
     def htmlized(self):
+        from ietf.doc.utils_htmlize import read_htmlized, write_htmlized, htmlize_text
         name = self.get_base_name()
-        text = self.text()
         if name.endswith('.html'):
-            return text
+            return self.text()
         if not name.endswith('.txt'):
             return None
+        # normally served from the store filled by the pregenerate_htmlized
+        # command, converted here only if the artifact is missing
+        html = read_htmlized(self.get_file_name())
+        if html is not None:
+            return html
         html = ""
+        text = self.text()
         if text:
             cache = caches['htmlized']
             cache_key = name.split('.')[0]
             html = cache.get(cache_key)
             if not html:
-                # The path here has to match the urlpattern for htmlized
-                # documents in order to produce correct intra-document links
-                html = rfc2html.markup(text, path=settings.HTMLIZER_URL_PREFIX)
-                if html:
+                html = htmlize_text(text)
+                if html and not write_htmlized(self.get_file_name(), html):
                     cache.set(cache_key, html, settings.HTMLIZER_CACHE_TIME)
         return html
 
@@ -666,6 +699,11 @@ class Document(DocumentInfo):
             name = name.upper()
         return name
 
+    def reference_index_fields(self):
+        """Values of the fields copied into DocumentReferenceIndex, leaving
+        out any that aren't loaded rather than querying for them."""
+        return tuple(self.__dict__.get(f) for f in ("title", "std_level_id", "intended_std_level_id"))
+
     def save_with_history(self, events):
         """Save document and put a snapshot in the history models where they
         can be retrieved later. You must pass in at least one event
@@ -830,6 +868,54 @@ class DocumentURL(models.Model):
     desc = models.CharField(max_length=255, default='', blank=True)
     url  = models.URLField(max_length=512)
 
+class DocumentSearchIndex(models.Model):
+    """Denormalized search data for a document, one row per document, so
+    the document search can filter on a single table with indexed
+    lookups instead of joining aliases, authors and states.  Kept up to
+    date by the signal handlers at the end of this file, and rebuilt by
+    the rebuild_document_search_index management command."""
+    document = OneToOneField(Document, primary_key=True, related_name="search_index")
+    names = models.TextField(help_text="Name and aliases of the document, separated by spaces")
+    authors = models.TextField(blank=True, help_text="Names and email addresses of the authors, one per line")
+    draft_state = models.CharField(max_length=50, blank=True, db_index=True)
+    iesg_state = ForeignKey(State, null=True, blank=True, related_name="+")
+    irtf_state = ForeignKey(State, null=True, blank=True, related_name="+")
+    tags = models.CharField(max_length=255, blank=True, help_text="Tag slugs, separated and surrounded by spaces")
+    group = ForeignKey(Group, null=True, blank=True, related_name="+")
+    area = ForeignKey(Group, null=True, blank=True, related_name="+")
+    ad = ForeignKey(Person, null=True, blank=True, related_name="+")
+    stream = ForeignKey(StreamName, null=True, blank=True, related_name="+")
+
+    def __unicode__(self):
+        return u"Search index for %s" % self.document_id
+
+class DocumentReferenceIndex(models.Model):
+    """Denormalized reference data, one row per reference relation, so
+    that the documents referencing a document can be listed, sorted and
+    paged with one indexed query, without looking up the source of each
+    reference.  Rows are written as the references are saved, and
+    updated when the documents change, see ietf.doc.utils_relations; the
+    rebuild_reference_index management command rebuilds the whole index."""
+    relation = OneToOneField(RelatedDocument, primary_key=True, related_name="reference_index")
+    target = ForeignKey(Document, related_name="+")
+    target_name = models.CharField(max_length=255, help_text="Name of the alias the reference is to")
+    relationship = ForeignKey(DocRelationshipName)
+    relationship_order = models.IntegerField(help_text="Sort order of the relationship, normative references first")
+    source = ForeignKey(Document, related_name="+")
+    source_name = models.CharField(max_length=255, help_text="Canonical name of the referencing document")
+    source_title = models.CharField(max_length=255)
+    source_state = models.CharField(max_length=50, blank=True, help_text="Draft state of the referencing document")
+    source_std_level = models.CharField(max_length=50, blank=True, help_text="Standard level of an RFC, else intended standard level")
+    downref = models.CharField(max_length=50, blank=True)
+
+    class Meta:
+        index_together = [
+            ["target", "source_state", "relationship_order", "source_name"],
+        ]
+
+    def __unicode__(self):
+        return u"%s %s %s" % (self.source_name, self.relationship_id, self.target_name)
+
 class RelatedDocHistory(models.Model):
     source = ForeignKey('DocHistory')
     target = ForeignKey('DocAlias', related_name="reversely_related_document_history_set")
@@ -1167,3 +1253,90 @@ class EditedAuthorsDocEvent(DocEvent):
         Example 'basis' values might be from ['manually adjusted','recomputed by parsing document', etc.]
     """
     basis = models.CharField(help_text="What is the source or reasoning for the changes to the author list",max_length=255)
+
+
+# Keep DocumentSearchIndex up to date
+
+def update_search_index_for_names(names):
+    from ietf.doc.utils_search import update_document_search_index
+    update_document_search_index(names)
+
+def document_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    update_search_index_for_names([instance.name])
+
+def document_related_object_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    update_search_index_for_names([instance.document_id])
+
+def document_m2m_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if reverse:
+        update_search_index_for_names(pk_set or [])
+    else:
+        update_search_index_for_names([instance.pk])
+
+def author_person_changed(sender, instance, raw=False, **kwargs):
+    if raw or not instance.person_id:
+        return
+    names = list(Document.objects.filter(documentauthor__person=instance.person_id).values_list("name", flat=True).distinct())
+    if names:
+        update_search_index_for_names(names)
+
+def group_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from ietf.doc.utils_search import search_index_area
+    DocumentSearchIndex.objects.filter(group=instance).update(area=search_index_area(instance))
+
+signals.post_save.connect(document_saved, sender=Document)
+for model in (DocAlias, DocumentAuthor):
+    signals.post_save.connect(document_related_object_changed, sender=model)
+    signals.post_delete.connect(document_related_object_changed, sender=model)
+signals.m2m_changed.connect(document_m2m_changed, sender=Document.states.through)
+signals.m2m_changed.connect(document_m2m_changed, sender=Document.tags.through)
+for model in (Alias, Email):
+    signals.post_save.connect(author_person_changed, sender=model)
+signals.post_save.connect(group_saved, sender=Group)
+
+# Keep the relation graphs of the running processes and the reference index up to date
+
+def related_document_saved(sender, instance, **kwargs):
+    from ietf.doc.utils_relations import related_document_saved
+    related_document_saved(sender, instance, **kwargs)
+
+def related_document_deleted(sender, instance, **kwargs):
+    from ietf.doc.utils_relations import related_document_deleted
+    related_document_deleted(sender, instance, **kwargs)
+
+def docalias_saved(sender, instance, **kwargs):
+    from ietf.doc.utils_relations import docalias_saved
+    docalias_saved(sender, instance, **kwargs)
+
+signals.post_save.connect(related_document_saved, sender=RelatedDocument)
+signals.post_delete.connect(related_document_deleted, sender=RelatedDocument)
+signals.post_save.connect(docalias_saved, sender=DocAlias)
+
+# Keep the titles, standard levels and source states in
+# DocumentReferenceIndex up to date
+
+def reference_index_document_loaded(sender, instance, **kwargs):
+    instance._reference_index_fields = instance.reference_index_fields()
+
+def reference_index_document_saved(sender, instance, **kwargs):
+    from ietf.doc.utils_relations import document_saved
+    document_saved(sender, instance, **kwargs)
+
+signals.post_init.connect(reference_index_document_loaded, sender=Document)
+signals.post_save.connect(reference_index_document_saved, sender=Document)
+
+def reference_index_states_changed(sender, instance, action, reverse, **kwargs):
+    if reverse or not action.startswith("post_"):
+        return
+    state = instance.states.filter(type="draft").values_list("slug", flat=True).first()
+    DocumentReferenceIndex.objects.filter(source=instance).update(source_state=state or "")
+
+signals.m2m_changed.connect(reference_index_states_changed, sender=Document.states.through)
@@ -12,7 +12,8 @@ from ietf.doc.models import (BallotType, DeletedEvent, StateType, State, Documen
     TelechatDocEvent, DocReminder, LastCallDocEvent, NewRevisionDocEvent, WriteupDocEvent,
     InitialReviewDocEvent, DocHistoryAuthor, BallotDocEvent, RelatedDocument,
     RelatedDocHistory, BallotPositionDocEvent, AddedMessageEvent, SubmissionDocEvent,
-    ReviewRequestDocEvent, EditedAuthorsDocEvent, DocumentURL)
+    ReviewRequestDocEvent, EditedAuthorsDocEvent, DocumentURL, DocumentSearchIndex,
+    DocumentReferenceIndex)
 
 from ietf.name.resources import BallotPositionNameResource, DocTypeNameResource
 class BallotTypeResource(ModelResource):
@@ -650,3 +651,60 @@ class DocumentURLResource(ModelResource):
 api.doc.register(DocumentURLResource())
 
 
+from ietf.group.resources import GroupResource
+from ietf.name.resources import StreamNameResource
+from ietf.person.resources import PersonResource
+class DocumentSearchIndexResource(ModelResource):
+    document         = ToOneField(DocumentResource, 'document')
+    iesg_state       = ToOneField(StateResource, 'iesg_state', null=True)
+    irtf_state       = ToOneField(StateResource, 'irtf_state', null=True)
+    group            = ToOneField(GroupResource, 'group', null=True)
+    area             = ToOneField(GroupResource, 'area', null=True)
+    ad               = ToOneField(PersonResource, 'ad', null=True)
+    stream           = ToOneField(StreamNameResource, 'stream', null=True)
+    class Meta:
+        queryset = DocumentSearchIndex.objects.all()
+        serializer = api.Serializer()
+        cache = SimpleCache()
+        #resource_name = 'documentsearchindex'
+        filtering = { 
+            "names": ALL,
+            "authors": ALL,
+            "draft_state": ALL,
+            "tags": ALL,
+            "document": ALL_WITH_RELATIONS,
+            "iesg_state": ALL_WITH_RELATIONS,
+            "irtf_state": ALL_WITH_RELATIONS,
+            "group": ALL_WITH_RELATIONS,
+            "area": ALL_WITH_RELATIONS,
+            "ad": ALL_WITH_RELATIONS,
+            "stream": ALL_WITH_RELATIONS,
+        }
+api.doc.register(DocumentSearchIndexResource())
+
+
+from ietf.name.resources import DocRelationshipNameResource
+class DocumentReferenceIndexResource(ModelResource):
+    relation         = ToOneField(RelatedDocumentResource, 'relation')
+    target           = ToOneField(DocumentResource, 'target')
+    source           = ToOneField(DocumentResource, 'source')
+    relationship     = ToOneField(DocRelationshipNameResource, 'relationship')
+    class Meta:
+        queryset = DocumentReferenceIndex.objects.all()
+        serializer = api.Serializer()
+        cache = SimpleCache()
+        #resource_name = 'documentreferenceindex'
+        filtering = { 
+            "target_name": ALL,
+            "relationship_order": ALL,
+            "source_name": ALL,
+            "source_title": ALL,
+            "source_state": ALL,
+            "source_std_level": ALL,
+            "downref": ALL,
+            "relation": ALL_WITH_RELATIONS,
+            "target": ALL_WITH_RELATIONS,
+            "source": ALL_WITH_RELATIONS,
+            "relationship": ALL_WITH_RELATIONS,
+        }
+api.doc.register(DocumentReferenceIndexResource())
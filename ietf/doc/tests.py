@@ -1,4 +1,5 @@
 import os
+import io
 import shutil
 import datetime
 import json
@@ -12,26 +13,39 @@ else:
 from pyquery import PyQuery
 from tempfile import NamedTemporaryFile
 from Cookie import SimpleCookie
+from mock import patch
 
 from django.urls import reverse as urlreverse
 from django.conf import settings
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
 
 from tastypie.test import ResourceTestCaseMixin
 
 import debug                            # pyflakes:ignore
 
 from ietf.doc.models import ( Document, DocAlias, DocRelationshipName, RelatedDocument, State,
-    DocEvent, BallotPositionDocEvent, LastCallDocEvent, WriteupDocEvent, NewRevisionDocEvent )
+    DocEvent, BallotPositionDocEvent, LastCallDocEvent, WriteupDocEvent, NewRevisionDocEvent,
+    DocumentSearchIndex, DocumentReferenceIndex )
 from ietf.doc.factories import DocumentFactory, DocEventFactory, CharterFactory, ConflictReviewFactory, WgDraftFactory, IndividualDraftFactory, WgRfcFactory, IndividualRfcFactory, StateDocEventFactory
 from ietf.doc.utils import create_ballot_if_not_open
+from ietf.doc.utils_htmlize import ( htmlizable_text_files, pregenerate_htmlized, is_htmlized,
+    read_htmlized, htmlized_store_path )
+from ietf.doc.utils_relations import rebuild_reference_index, update_reference_index, relation_log_position
+from ietf.doc.views_doc import get_doc_email_aliases, check_doc_email_aliases
+from ietf.doc.utils_search import cached_document_table_rows, document_table_row_cache_key
 from ietf.group.models import Group
 from ietf.group.factories import GroupFactory
 from ietf.ipr.factories import HolderIprDisclosureFactory
+from ietf.review.factories import ReviewRequestFactory
 from ietf.meeting.models import Meeting, Session, SessionPresentation
 from ietf.meeting.factories import MeetingFactory, SessionFactory
 from ietf.name.models import SessionStatusName
 from ietf.person.models import Person
 from ietf.person.factories import PersonFactory
+from ietf.utils.aliases import virtual_index_path, write_virtual_index, _read_virtual_file
 from ietf.utils.mail import outbox
 from ietf.utils.test_utils import login_testing_unauthorized, unicontent
 from ietf.utils.test_utils import TestCase
@@ -120,6 +134,94 @@ class SearchTests(TestCase):
         self.assertEqual(r.status_code, 200)
         self.assertTrue(draft.title in unicontent(r))
 
+    def test_search_index(self):
+        draft = WgDraftFactory(name='draft-ietf-mars-test',group=GroupFactory(acronym='mars',parent=Group.objects.get(acronym='farfut')),authors=[PersonFactory()],ad=PersonFactory())
+
+        index = DocumentSearchIndex.objects.get(document=draft)
+        self.assertEqual(index.draft_state, "active")
+        self.assertEqual(index.group, draft.group)
+        self.assertEqual(index.area, draft.group.parent)
+        self.assertEqual(index.ad, draft.ad)
+        author = draft.documentauthor_set.first()
+        self.assertTrue(author.email.address in index.authors)
+
+        # state changes are picked up
+        draft.set_state(State.objects.get(type="draft-iesg", slug="pub-req"))
+        self.assertEqual(DocumentSearchIndex.objects.get(document=draft).iesg_state.slug, "pub-req")
+
+        # and new aliases
+        DocAlias.objects.create(name="rfc9999", document=draft)
+        self.assertTrue("rfc9999" in DocumentSearchIndex.objects.get(document=draft).names)
+
+        # rebuild from scratch
+        DocumentSearchIndex.objects.all().delete()
+        call_command("rebuild_document_search_index")
+        index = DocumentSearchIndex.objects.get(document=draft)
+        self.assertEqual(index.iesg_state.slug, "pub-req")
+        self.assertTrue("rfc9999" in index.names)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_document_table_row_cache(self):
+        cache.clear()
+        drafts = [ WgDraftFactory() for i in range(6) ]
+        pks = [ d.pk for d in drafts ]
+
+        with CaptureQueriesContext(connection) as uncached:
+            docs = cached_document_table_rows(pks[:3])
+        self.assertEqual([ d.pk for d in docs ], pks[:3])
+        self.assertTrue(all(d.canonical_name() == d.name for d in docs))
+
+        # the computed values are cached, not the documents
+        key = document_table_row_cache_key(docs[0].pk, docs[0].time, DocEvent.objects.filter(doc=docs[0]).order_by("-id").values_list("id", flat=True).first())
+        self.assertEqual(cache.get(key)["search_heading"], docs[0].search_heading)
+        self.assertFalse(any(isinstance(v, Document) for v in cache.get(key).values()))
+
+        # with the values in the cache, the number of queries doesn't
+        # depend on the number of documents
+        with CaptureQueriesContext(connection) as cached:
+            docs = cached_document_table_rows(pks[:3])
+        self.assertEqual([ d.pk for d in docs ], pks[:3])
+        self.assertTrue(all(d.canonical_name() == d.name for d in docs))
+        self.assertTrue(len(uncached.captured_queries) > len(cached.captured_queries))
+        cached_document_table_rows(pks)
+        with CaptureQueriesContext(connection) as more_cached:
+            docs = cached_document_table_rows(pks)
+        self.assertEqual([ d.pk for d in docs ], pks)
+        self.assertEqual(len(more_cached.captured_queries), len(cached.captured_queries))
+
+        # the documents themselves are always current
+        drafts[1].title = "A changed title"
+        drafts[1].save()
+        self.assertEqual(cached_document_table_rows(pks)[1].title, "A changed title")
+
+        # a new event invalidates the row for that document only
+        DocEventFactory(doc=drafts[0])
+        with CaptureQueriesContext(connection) as refilled:
+            docs = cached_document_table_rows(pks)
+        self.assertEqual([ d.pk for d in docs ], pks)
+        self.assertTrue(len(refilled.captured_queries) > len(cached.captured_queries))
+
+    def test_document_table_query_count(self):
+        drafts = [ WgDraftFactory() for i in range(200) ]
+        HolderIprDisclosureFactory(docs=[drafts[0]])
+        review_req = ReviewRequestFactory(doc=drafts[0], state_id="accepted")
+
+        def fill_in(pks):
+            with CaptureQueriesContext(connection) as context:
+                docs = cached_document_table_rows(pks)
+            return docs, len(context.captured_queries)
+
+        docs, single_row_queries = fill_in([drafts[0].pk])
+        self.assertEqual(len(docs[0].related_ipr()), 1)
+        self.assertEqual(docs[0].reviewed_by_teams, [review_req.team.acronym])
+
+        # the number of queries doesn't grow with the number of rows
+        docs, queries = fill_in([ d.pk for d in drafts ])
+        self.assertEqual(len(docs), 200)
+        self.assertEqual(queries, single_row_queries)
+        self.assertEqual(len([ d for d in docs if d.related_ipr() ]), 1)
+        self.assertTrue(all(d.expirable for d in docs))
+
     def test_search_for_name(self):
         draft = WgDraftFactory(name='draft-ietf-mars-test',group=GroupFactory(acronym='mars',parent=Group.objects.get(acronym='farfut')),authors=[PersonFactory()],ad=PersonFactory())
         draft.set_state(State.objects.get(used=True, type="draft-iesg", slug="pub-req"))
@@ -486,6 +588,9 @@ Man                    Expires September 22, 2015               [Page 3]
         settings.INTERNET_DRAFT_PATH = self.id_dir
         self.saved_internet_all_drafts_archive_dir = settings.INTERNET_ALL_DRAFTS_ARCHIVE_DIR
         settings.INTERNET_ALL_DRAFTS_ARCHIVE_DIR = self.id_dir
+        self.htmlized_dir = self.tempdir('htmlized')
+        self.saved_htmlized_store_path = settings.HTMLIZED_STORE_PATH
+        settings.HTMLIZED_STORE_PATH = self.htmlized_dir
         f = open(os.path.join(self.id_dir, 'draft-ietf-mars-test-01.txt'), 'w')
         f.write(self.draft_text)
         f.close()
@@ -493,7 +598,32 @@ Man                    Expires September 22, 2015               [Page 3]
     def tearDown(self):
         settings.INTERNET_ALL_DRAFTS_ARCHIVE_DIR = self.saved_internet_all_drafts_archive_dir
         settings.INTERNET_DRAFT_PATH = self.saved_internet_draft_path
+        settings.HTMLIZED_STORE_PATH = self.saved_htmlized_store_path
         shutil.rmtree(self.id_dir)
+        shutil.rmtree(self.htmlized_dir)
+
+    def test_htmlized_store(self):
+        draft = WgDraftFactory(name='draft-ietf-mars-test',rev='01')
+        paths = htmlizable_text_files([draft])
+        self.assertEqual(paths, [draft.get_file_name()])
+        self.assertEqual(pregenerate_htmlized(paths), 1)
+        self.assertTrue(is_htmlized(draft.get_file_name()))
+        self.assertTrue("Deimos street" in read_htmlized(draft.get_file_name()))
+        self.assertEqual(pregenerate_htmlized(paths), 0)
+
+        # the page is served from the store
+        with io.open(htmlized_store_path(draft.get_file_name()), "wb") as f:
+            f.write("<pre>Stored htmlized text</pre>")
+        r = self.client.get(urlreverse("ietf.doc.views_doc.document_html", kwargs=dict(name=draft.name)))
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue("Stored htmlized text" in unicontent(r))
+
+        # a missing artifact is converted on request, and stored
+        shutil.rmtree(self.htmlized_dir)
+        r = self.client.get(urlreverse("ietf.doc.views_doc.document_html", kwargs=dict(name=draft.name)))
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue("Deimos street" in unicontent(r))
+        self.assertTrue(is_htmlized(draft.get_file_name()))
 
     def test_document_draft(self):
         draft = WgDraftFactory(name='draft-ietf-mars-test',rev='01')
@@ -1015,6 +1145,105 @@ class ReferencesTest(TestCase):
         self.assertTrue(doc1.name in unicontent(r))
        
 
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_relation_closures(self):
+        cache.clear()
+        oldest = IndividualDraftFactory()
+        old = IndividualDraftFactory(relations=[('replaces', oldest)])
+        draft = WgDraftFactory(relations=[('replaces', old)])
+
+        self.assertEqual(set(a.name for a in draft.all_related_that_doc('replaces')), set([old.name, oldest.name]))
+        self.assertEqual(set(a.name for a in oldest.all_related_that('replaces')), set([old.name, draft.name]))
+        self.assertEqual(len(draft.all_relations_that_doc('replaces')), 2)
+        self.assertEqual(oldest.replaced_by(), set([old]))
+
+        # relations already found aren't followed further
+        found = draft.relations_that_doc('replaces')
+        self.assertEqual(draft.all_relations_that_doc('replaces', related=found), tuple(found))
+        self.assertEqual(set(a.name for a in draft.all_related_that_doc('replaces', related=found)), set([old.name]))
+
+        # changes are seen right away by this process
+        other = IndividualDraftFactory()
+        rel = RelatedDocument.objects.create(source=oldest, target=other.docalias_set.first(), relationship_id='replaces')
+        self.assertEqual(set(a.name for a in draft.all_related_that_doc(('replaces', 'obs'))), set([old.name, oldest.name, other.name]))
+        rel.delete()
+        RelatedDocument.objects.filter(source=draft).delete()
+        self.assertEqual(draft.all_related_that_doc('replaces'), [])
+        self.assertEqual(set(a.name for a in oldest.all_related_that('replaces')), set([old.name]))
+
+        # and the other processes are told about them once they're committed
+        position = relation_log_position()
+        with patch("ietf.doc.utils_relations.transaction.on_commit") as on_commit:
+            RelatedDocument.objects.create(source=oldest, target=other.docalias_set.first(), relationship_id='replaces')
+        self.assertEqual(relation_log_position(), position)
+        on_commit.call_args[0][0]()
+        self.assertEqual(relation_log_position(), (position[0], position[1] + 1))
+
+        # and the closures don't take a query per document
+        chain = [ draft ]
+        for i in range(5):
+            chain.append(IndividualDraftFactory(relations=[('replaces', chain[-1])]))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(len(draft.all_related_that('replaces')), 5)
+        self.assertTrue(len(queries.captured_queries) <= 5)
+
+    def test_referenced_by_index(self):
+        target = IndividualDraftFactory(intended_std_level_id='inf')
+        draft = WgDraftFactory(intended_std_level_id='ps')
+        rfc = WgRfcFactory()
+        RelatedDocument.objects.create(source=draft, target=target.docalias_set.first(), relationship_id='refnorm')
+        RelatedDocument.objects.create(source=rfc, target=target.docalias_set.first(), relationship_id='refinfo')
+        # the references are indexed as they are saved
+        self.assertEqual(DocumentReferenceIndex.objects.filter(target=target).count(), 2)
+        self.assertEqual(update_reference_index(sources=[draft, rfc]), 2)
+
+        index = DocumentReferenceIndex.objects.get(source=draft)
+        self.assertEqual(index.target, target)
+        self.assertEqual(index.source_state, 'active')
+        self.assertEqual(index.source_std_level, 'Proposed Standard')
+        self.assertEqual(index.downref, 'Downref')
+        index = DocumentReferenceIndex.objects.get(source=rfc)
+        self.assertEqual(index.source_name, rfc.canonical_name())
+        self.assertEqual(index.source_state, 'rfc')
+        self.assertEqual(index.downref, '')
+
+        url = urlreverse('ietf.doc.views_doc.document_referenced_by_json', kwargs=dict(name=target.name))
+        r = self.client.get(url, { 'limit': 1 })
+        self.assertEqual(r.status_code, 200)
+        data = r.json()
+        self.assertEqual(data['total'], 2)
+        self.assertEqual([ ref['name'] for ref in data['references'] ], [ draft.name ])
+        self.assertEqual(data['references'][0]['downref'], 'Downref')
+        r = self.client.get(data['next'])
+        data = r.json()
+        self.assertEqual([ ref['name'] for ref in data['references'] ], [ rfc.canonical_name() ])
+        self.assertEqual(data['next'], None)
+        r = self.client.get(url, { 'offset': 'x' })
+        self.assertEqual(r.status_code, 400)
+
+        # state changes are reflected in the index
+        draft.set_state(State.objects.get(type='draft', slug='expired'))
+        self.assertEqual(DocumentReferenceIndex.objects.get(source=draft).source_state, 'expired')
+        r = self.client.get(url)
+        self.assertEqual([ ref['name'] for ref in r.json()['references'] ], [ rfc.canonical_name() ])
+
+        # and so are changes of the standard levels, on either side
+        draft.intended_std_level_id = 'inf'
+        draft.save()
+        index = DocumentReferenceIndex.objects.get(source=draft)
+        self.assertEqual(index.source_std_level, 'Informational')
+        self.assertEqual(index.downref, '')
+        draft.intended_std_level_id = 'ps'
+        draft.save()
+        target.intended_std_level_id = 'ps'
+        target.save()
+        self.assertEqual(DocumentReferenceIndex.objects.get(source=draft).downref, '')
+
+        DocumentReferenceIndex.objects.all().delete()
+        self.assertEqual(rebuild_reference_index(), 2)
+        self.assertEqual(DocumentReferenceIndex.objects.filter(target=target).count(), 2)
+
+
 class EmailAliasesTests(TestCase):
 
     def setUp(self):
@@ -1048,6 +1277,32 @@ expand-draft-ietf-ames-test.all@virtual.ietf.org  ames-author@example.ames, ames
     def tearDown(self):
         settings.DRAFT_VIRTUAL_PATH = self.saved_draft_virtual_path
         os.unlink(self.doc_alias_file.name)
+        if os.path.exists(virtual_index_path(self.doc_alias_file.name)):
+            os.unlink(virtual_index_path(self.doc_alias_file.name))
+
+    def testAliasIndex(self):
+        self.assertEqual(write_virtual_index(self.doc_alias_file.name), 8)
+        aliases = get_doc_email_aliases('draft-ietf-mars-test')
+        self.assertEqual([ a['alias_type'] for a in aliases ], [ None, '.authors', '.chairs', '.all' ])
+        self.assertEqual(aliases[2]['expansion'], 'mars-chair@example.mars')
+        self.assertEqual(get_doc_email_aliases('draft-ietf-mars'), [])
+        self.assertEqual(len(get_doc_email_aliases('')), 8)
+        self.assertFalse(check_doc_email_aliases())
+
+        # a changed virtual file is indexed again
+        with open(self.doc_alias_file.name, "a") as f:
+            f.write("expand-draft-ietf-mars-test.ad@virtual.ietf.org  mars-ad@example.mars\n")
+        self.assertEqual([ a['alias_type'] for a in get_doc_email_aliases('draft-ietf-mars-test') ],
+            [ None, '.authors', '.chairs', '.all', '.ad' ])
+
+        # an index that can't be written falls back to a single scan of
+        # the virtual file, without parsing it for the index first
+        os.unlink(virtual_index_path(self.doc_alias_file.name))
+        with patch('ietf.utils.aliases.mkstemp', side_effect=OSError(13, "Permission denied")), \
+             patch('ietf.utils.aliases._read_virtual_file', wraps=_read_virtual_file) as read_virtual_file:
+            self.assertEqual(len(get_doc_email_aliases('draft-ietf-mars-test')), 5)
+            self.assertEqual(read_virtual_file.call_count, 1)
+        self.assertFalse(os.path.exists(virtual_index_path(self.doc_alias_file.name)))
 
     def testAliases(self):
         PersonFactory(user__username='plain')
@@ -75,6 +75,7 @@ urlpatterns = [
     url(r'^%(name)s/shepherdwriteup/$' % settings.URL_REGEXPS, views_doc.document_shepherd_writeup),
     url(r'^%(name)s/references/$' % settings.URL_REGEXPS, views_doc.document_references),
     url(r'^%(name)s/referencedby/$' % settings.URL_REGEXPS, views_doc.document_referenced_by),
+    url(r'^%(name)s/referencedby.json$' % settings.URL_REGEXPS, views_doc.document_referenced_by_json),
     url(r'^%(name)s/ballot/$' % settings.URL_REGEXPS, views_doc.document_ballot),
     url(r'^%(name)s/ballot/(?P<ballot_id>[0-9]+)/$' % settings.URL_REGEXPS, views_doc.document_ballot),
     url(r'^%(name)s/ballot/(?P<ballot_id>[0-9]+)/position/$' % settings.URL_REGEXPS, views_ballot.edit_position),
@@ -19,6 +19,7 @@ from ietf.doc.models import Document, DocHistory, State, DocumentAuthor, DocHist
 from ietf.doc.models import DocAlias, RelatedDocument, RelatedDocHistory, BallotType, DocReminder
 from ietf.doc.models import DocEvent, ConsensusDocEvent, BallotDocEvent, NewRevisionDocEvent, StateDocEvent
 from ietf.doc.models import TelechatDocEvent
+from ietf.doc.utils_relations import deferred_reference_indexing
 from ietf.name.models import DocReminderTypeName, DocRelationshipName
 from ietf.group.models import Role
 from ietf.ietfauth.utils import has_role
@@ -529,18 +530,19 @@ def rebuild_reference_relations(doc,filename=None):
     warnings = []
     errors = []
     unfound = set()
-    for ( ref, refType ) in refs.iteritems():
-        refdoc = DocAlias.objects.filter( name=ref )
-        count = refdoc.count()
-        if count == 0:
-            unfound.add( "%s" % ref )
-            continue
-        elif count > 1:
-            errors.append("Too many DocAlias objects found for %s"%ref)
-        else:
-            # Don't add references to ourself
-            if doc != refdoc[0].document:
-                RelatedDocument.objects.get_or_create( source=doc, target=refdoc[ 0 ], relationship=DocRelationshipName.objects.get( slug='ref%s' % refType ) )
+    with deferred_reference_indexing():
+        for ( ref, refType ) in refs.iteritems():
+            refdoc = DocAlias.objects.filter( name=ref )
+            count = refdoc.count()
+            if count == 0:
+                unfound.add( "%s" % ref )
+                continue
+            elif count > 1:
+                errors.append("Too many DocAlias objects found for %s"%ref)
+            else:
+                # Don't add references to ourself
+                if doc != refdoc[0].document:
+                    RelatedDocument.objects.get_or_create( source=doc, target=refdoc[ 0 ], relationship=DocRelationshipName.objects.get( slug='ref%s' % refType ) )
     if unfound:
         warnings.append('There were %d references with no matching DocAlias'%len(unfound))
 
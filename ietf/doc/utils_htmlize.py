@@ -0,0 +1,145 @@
+# Copyright The IETF Trust 2018, All Rights Reserved
+
+import datetime
+import io
+import multiprocessing
+import os
+from tempfile import mkstemp
+
+import rfc2html
+
+from django.conf import settings
+from django.db import connections
+
+import debug                            # pyflakes:ignore
+
+from ietf.doc.models import Document
+from ietf.utils.log import log
+
+# The htmlized versions of draft and RFC text files are kept on disk in
+# HTMLIZED_STORE_PATH, one directory per file name, under a name made
+# from the modification time and size of the text file and the
+# HTMLIZER_VERSION, so a changed file or a new htmlizer is never served
+# a stale artifact.
+
+def htmlized_store_path(path):
+    """Return the path in the store of the htmlized version of the text
+    file at path, or None if there is no such file."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(settings.HTMLIZED_STORE_PATH, name,
+        "%d-%d-v%s.html" % (int(st.st_mtime), st.st_size, settings.HTMLIZER_VERSION))
+
+def is_htmlized(path):
+    store_path = htmlized_store_path(path)
+    return store_path is not None and os.path.exists(store_path)
+
+def read_htmlized(path):
+    """Return the stored htmlized version of the text file at path, or
+    None if it hasn't been generated."""
+    store_path = htmlized_store_path(path)
+    if not store_path:
+        return None
+    try:
+        with io.open(store_path, "rb") as f:
+            return f.read().decode("utf-8")
+    except IOError:
+        return None
+
+def write_htmlized(path, html):
+    """Store html as the htmlized version of the text file at path,
+    replacing older versions.  Returns the path of the artifact, or None
+    if it couldn't be written."""
+    store_path = htmlized_store_path(path)
+    if not store_path:
+        return None
+    dirname = os.path.dirname(store_path)
+    try:
+        if not os.path.exists(dirname):
+            os.makedirs(dirname)
+        # write beside the final file and rename it into place, so a
+        # concurrent request never reads a half-written artifact
+        t, tempname = mkstemp(dir=dirname, prefix=".%s." % os.path.basename(store_path))
+        with os.fdopen(t, "wb") as f:
+            f.write(html.encode("utf-8"))
+        os.chmod(tempname, 0644)
+        os.rename(tempname, store_path)
+        for name in os.listdir(dirname):
+            if name != os.path.basename(store_path) and not name.startswith("."):
+                os.unlink(os.path.join(dirname, name))
+    except (IOError, OSError) as e:
+        log("Could not store htmlized version of %s: %s" % (path, e))
+        return None
+    return store_path
+
+def htmlize_text(text):
+    # The path here has to match the urlpattern for htmlized
+    # documents in order to produce correct intra-document links
+    return rfc2html.markup(text, path=settings.HTMLIZER_URL_PREFIX)
+
+def ensure_htmlized(path):
+    """Generate and store the htmlized version of the text file at path
+    unless that has been done already.  Returns the path of the
+    artifact, or None if there is none."""
+    store_path = htmlized_store_path(path)
+    if not store_path or os.path.exists(store_path):
+        return store_path
+    try:
+        with io.open(path, "rb") as f:
+            raw = f.read()
+    except IOError:
+        return None
+    try:
+        text = raw.decode("utf-8")
+    except UnicodeDecodeError:
+        text = raw.decode("latin-1")
+    html = htmlize_text(text)
+    if not html:
+        return None
+    return write_htmlized(path, html)
+
+def htmlizable_text_files(docs):
+    """Return the paths of the existing text files of the given drafts,
+    the ones document_html() would mark up."""
+    paths = []
+    for doc in docs:
+        if doc.get_base_name().endswith(".txt") and os.path.exists(doc.get_file_name()):
+            paths.append(doc.get_file_name())
+    return paths
+
+def recent_htmlizable_text_files(days=1):
+    """Return the paths of the text files of the drafts with a new
+    revision, and of the RFCs published, within the given number of days."""
+    since = datetime.datetime.now() - datetime.timedelta(days=days)
+    docs = Document.objects.filter(type="draft", docevent__type__in=["new_revision", "published_rfc"],
+        docevent__time__gte=since).distinct().prefetch_related("states")
+    return htmlizable_text_files(docs)
+
+def all_htmlizable_text_files():
+    """Return the paths of the text files of all RFCs and active drafts."""
+    docs = Document.objects.filter(type="draft", states__type="draft", states__slug__in=["rfc", "active"]).prefetch_related("states")
+    return htmlizable_text_files(docs)
+
+def pregenerate_htmlized(paths, processes=1):
+    """Generate the missing htmlized versions of the text files at the
+    given paths, spread over several worker processes.  Returns the
+    number of files htmlized."""
+    missing = [ p for p in paths if not is_htmlized(p) ]
+
+    if processes <= 1:
+        generated = [ ensure_htmlized(p) for p in missing ]
+    else:
+        # the forked workers don't use the database, but mustn't share the
+        # connection inherited from this process either
+        connections.close_all()
+        pool = multiprocessing.Pool(processes)
+        try:
+            generated = pool.map(ensure_htmlized, missing, chunksize=16)
+        finally:
+            pool.close()
+            pool.join()
+
+    return len([ p for p in generated if p ])
@@ -0,0 +1,311 @@
+# Copyright The IETF Trust 2018, All Rights Reserved
+
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import partial
+
+import six
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+import debug                            # pyflakes:ignore
+
+from ietf.doc.models import RelatedDocument, DocAlias, DocumentReferenceIndex
+
+# The relation graph of each process is kept up to date with a log of
+# relation changes in the cache.  The log is numbered from 1 within an
+# epoch; a new epoch is started if the counter is lost from the cache.
+RELATION_LOG_EPOCH_KEY = "doc:relation_graph:epoch"
+RELATION_LOG_COUNT_KEY = "doc:relation_graph:%s:count"
+RELATION_LOG_CHANGE_KEY = "doc:relation_graph:%s:change:%s"
+
+# Beyond this many changes to replay, reload the graph from the database
+MAX_REPLAYED_CHANGES = 1000
+
+# The reference relationships, in the order they are listed in
+REFERENCE_RELATIONSHIPS = ('refnorm', 'refinfo', 'refunk', 'refold')
+
+def relationship_slugs(relationship):
+    if isinstance(relationship, six.string_types):
+        relationship = ( relationship, )
+    if not isinstance(relationship, (tuple, list, set, frozenset)):
+        raise TypeError("Expected a string or tuple, received %s" % type(relationship))
+    return tuple(relationship)
+
+class RelationGraph(object):
+    """In-memory adjacency lists of the RelatedDocument edges, for
+    following chains of relations (replaces, obsoletes, updates,
+    references) without a query per document.  The edges of a
+    relationship are loaded the first time it is asked for."""
+
+    def __init__(self, epoch, count):
+        self.epoch = epoch
+        self.count = count
+        self.built = time.time()
+        self.loaded = set()
+        self.edges = {}                     # pk -> (relationship, source, target alias, target document)
+        self.outgoing = defaultdict(set)    # (relationship, source) -> pks
+        self.incoming = defaultdict(set)    # (relationship, target document) -> pks
+
+    def load(self, relationships):
+        missing = [ r for r in relationships if r not in self.loaded ]
+        if not missing:
+            return
+        rels = RelatedDocument.objects.filter(relationship__in=missing).values_list("pk", "relationship", "source", "target", "target__document")
+        for pk, relationship, source, target, target_doc in rels:
+            self.add(pk, relationship, source, target, target_doc)
+        self.loaded.update(missing)
+
+    def add(self, pk, relationship, source, target, target_doc):
+        self.remove(pk)
+        self.edges[pk] = (relationship, source, target, target_doc)
+        self.outgoing[(relationship, source)].add(pk)
+        self.incoming[(relationship, target_doc)].add(pk)
+
+    def remove(self, pk):
+        edge = self.edges.pop(pk, None)
+        if edge:
+            relationship, source, target, target_doc = edge
+            self.outgoing[(relationship, source)].discard(pk)
+            self.incoming[(relationship, target_doc)].discard(pk)
+
+    def apply(self, change):
+        op, pk = change[:2]
+        self.remove(pk)
+        if op == "add" and change[2] in self.loaded:
+            self.add(pk, *change[2:])
+
+    def relations_that(self, name, relationship, recursive=False):
+        """Return the pks of the relations of the given kinds targeting
+        the document called name, and with recursive, those targeting
+        their sources, and so on."""
+        relationships = relationship_slugs(relationship)
+        self.load(relationships)
+        return self._closure(name, relationships, self.incoming, 1, recursive)
+
+    def relations_that_doc(self, name, relationship, recursive=False):
+        """Return the pks of the relations of the given kinds from the
+        document called name to other documents, and with recursive,
+        those from their targets, and so on."""
+        relationships = relationship_slugs(relationship)
+        self.load(relationships)
+        return self._closure(name, relationships, self.outgoing, 3, recursive)
+
+    def sources(self, pks):
+        return set(self.edges[pk][1] for pk in pks)
+
+    def targets(self, pks):
+        return set(self.edges[pk][2] for pk in pks)
+
+    def _closure(self, name, relationships, adjacency, next_index, recursive):
+        found = set()
+        seen = set([ name ])
+        queue = [ name ]
+        while queue:
+            node = queue.pop()
+            for relationship in relationships:
+                for pk in adjacency.get((relationship, node), ()):
+                    found.add(pk)
+                    next_node = self.edges[pk][next_index]
+                    if recursive and next_node not in seen:
+                        seen.add(next_node)
+                        queue.append(next_node)
+        return found
+
+_relation_graph = None
+
+def relation_log_position():
+    """Return the current epoch and change count of the relation log,
+    starting a new epoch if the log has been lost from the cache."""
+    epoch = cache.get(RELATION_LOG_EPOCH_KEY)
+    count = cache.get(RELATION_LOG_COUNT_KEY % epoch) if epoch else None
+    if count is None:
+        epoch = uuid.uuid4().hex
+        count = 0
+        cache.set(RELATION_LOG_COUNT_KEY % epoch, count, None)
+        cache.set(RELATION_LOG_EPOCH_KEY, epoch, None)
+    return epoch, count
+
+def relation_graph():
+    """Return the relation graph of this process, brought up to date by
+    replaying the changes logged since it was last used, or rebuilt if
+    that isn't possible or it is older than DOC_RELATION_GRAPH_REBUILD_TIME."""
+    global _relation_graph
+
+    epoch, count = relation_log_position()
+    graph = _relation_graph
+    if (graph is None or graph.epoch != epoch or graph.count > count
+        or count - graph.count > MAX_REPLAYED_CHANGES
+        or time.time() - graph.built > settings.DOC_RELATION_GRAPH_REBUILD_TIME):
+        graph = RelationGraph(epoch, count)
+    elif graph.count < count:
+        keys = [ RELATION_LOG_CHANGE_KEY % (epoch, n) for n in range(graph.count + 1, count + 1) ]
+        changes = cache.get_many(keys)
+        if len(changes) == len(keys):
+            for key in keys:
+                graph.apply(changes[key])
+            graph.count = count
+        else:
+            graph = RelationGraph(epoch, count)
+
+    _relation_graph = graph
+    return graph
+
+def log_relation_change(change):
+    epoch, count = relation_log_position()
+    try:
+        n = cache.incr(RELATION_LOG_COUNT_KEY % epoch)
+    except ValueError:
+        # the counter went away, the graphs will be rebuilt anyway
+        return
+    cache.set(RELATION_LOG_CHANGE_KEY % (epoch, n), change, settings.DOC_RELATION_GRAPH_REBUILD_TIME)
+
+def relations_changed(change=None):
+    """Make the relation graphs pick up a change of the relations, or
+    with no change given, be rebuilt.  The other processes only see the
+    change once it's committed, so it's logged then; this process reloads
+    its graph to see it in the transaction too."""
+    global _relation_graph
+    _relation_graph = None
+    if change:
+        transaction.on_commit(partial(log_relation_change, change))
+    else:
+        transaction.on_commit(partial(cache.delete, RELATION_LOG_EPOCH_KEY))
+
+# Within a deferred_reference_indexing() block, the references saved in
+# each thread are indexed together at the end of the block.
+_deferred_index = threading.local()
+
+@contextmanager
+def deferred_reference_indexing():
+    """Index the references saved within the block in one go at the end
+    of it, instead of each one as it is saved, for saving many."""
+    if getattr(_deferred_index, "pks", None) is not None:
+        yield
+        return
+    _deferred_index.pks = set()
+    try:
+        yield
+        pks = _deferred_index.pks
+    finally:
+        _deferred_index.pks = None
+    index_references(pks)
+
+def related_document_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        # the target alias may not be loaded yet, start over instead
+        relations_changed()
+        return
+    relations_changed(("add", instance.pk, instance.relationship_id, instance.source_id, instance.target_id, instance.target.document_id))
+
+    if instance.relationship_id in REFERENCE_RELATIONSHIPS:
+        deferred = getattr(_deferred_index, "pks", None)
+        if deferred is None:
+            index_references([ instance.pk ])
+        else:
+            deferred.add(instance.pk)
+
+def related_document_deleted(sender, instance, **kwargs):
+    relations_changed(("remove", instance.pk))
+
+def docalias_saved(sender, instance, created=False, raw=False, **kwargs):
+    # a new alias has no relations yet, but moving an alias to another
+    # document moves the relations targeting it
+    if not created or raw:
+        relations_changed()
+
+def document_saved(sender, instance, created=False, raw=False, **kwargs):
+    # compare with the values the instance was loaded with, the standard
+    # levels also decide the downrefs to and from instance
+    loaded = instance._reference_index_fields
+    instance._reference_index_fields = instance.reference_index_fields()
+    if not created and not raw and loaded != instance._reference_index_fields:
+        update_reference_index(sources=[instance], targets=[instance])
+
+def in_chunks(items, size=500):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def related_documents(pks):
+    """Return the RelatedDocument objects with the given pks."""
+    rels = []
+    for chunk in in_chunks(pks):
+        rels.extend(RelatedDocument.objects.filter(pk__in=chunk).select_related("source", "target__document", "relationship"))
+    return rels
+
+def doc_aliases(names):
+    """Return the DocAlias objects with the given names."""
+    aliases = []
+    for chunk in in_chunks(names):
+        aliases.extend(DocAlias.objects.filter(name__in=chunk).select_related("document"))
+    return aliases
+
+def reference_index_entry(rel):
+    """Return an unsaved DocumentReferenceIndex row for the reference
+    rel, which should have its source and target document levels
+    selected and their states and the source aliases prefetched."""
+    source = rel.source
+    state = source.get_state_slug("draft")
+    if source.type_id == "draft" and state == "rfc":
+        # canonical_name() without a query per document
+        rfc_names = [ a.name for a in source.docalias_set.all() if a.name.startswith("rfc") ]
+        if rfc_names:
+            source._canonical_name = max(rfc_names)
+    level = source.std_level if state == "rfc" else source.intended_std_level
+
+    return DocumentReferenceIndex(
+        relation=rel,
+        target=rel.target.document,
+        target_name=rel.target.name,
+        relationship=rel.relationship,
+        relationship_order=REFERENCE_RELATIONSHIPS.index(rel.relationship_id),
+        source=source,
+        source_name=source.canonical_name(),
+        source_title=source.title,
+        source_state=state or "",
+        source_std_level=level.name if level else "",
+        downref=rel.is_downref() or "",
+    )
+
+def index_references(pks, batch_size=500):
+    """Recompute the reference index rows of the reference relations
+    with the given pks, batch_size relations at a time.  Returns the
+    number of rows written."""
+    count = 0
+    for chunk in in_chunks(pks, batch_size):
+        rels = RelatedDocument.objects.filter(pk__in=chunk).select_related(
+            "relationship", "source__type", "source__std_level", "source__intended_std_level", "target__document__std_level",
+            "target__document__intended_std_level").prefetch_related(
+            "source__states", "source__docalias_set", "target__document__states")
+        rows = [ reference_index_entry(r) for r in rels ]
+
+        with transaction.atomic():
+            DocumentReferenceIndex.objects.filter(relation__in=chunk).delete()
+            DocumentReferenceIndex.objects.bulk_create(rows)
+        count += len(rows)
+    return count
+
+def update_reference_index(sources=(), targets=()):
+    """Recompute the reference index rows of the references from the
+    given documents and to the given documents, with a fixed number of
+    queries per few hundred references."""
+    sources = [ getattr(d, "pk", d) for d in sources ]
+    targets = [ getattr(d, "pk", d) for d in targets ]
+    if not sources and not targets:
+        return 0
+    pks = RelatedDocument.objects.filter(relationship__in=REFERENCE_RELATIONSHIPS).filter(
+        Q(source__in=sources) | Q(target__document__in=targets)).values_list("pk", flat=True)
+    return index_references(list(pks))
+
+def rebuild_reference_index(batch_size=1000):
+    """Rebuild the reference index for all references, batch_size
+    references at a time.  Returns the number of rows written."""
+    pks = RelatedDocument.objects.filter(relationship__in=REFERENCE_RELATIONSHIPS).order_by("pk").values_list("pk", flat=True)
+    return index_references(list(pks), batch_size)
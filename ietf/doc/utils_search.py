@@ -1,15 +1,99 @@
 # Copyright The IETF Trust 2016, All Rights Reserved
 
 import datetime
+import hashlib
 import debug                            # pyflakes:ignore
 
+from django.conf import settings
+from django.core.cache import cache
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Max, F, prefetch_related_objects
+
 from ietf.community.utils import augment_docs_with_tracking_info
-from ietf.doc.models import Document, DocAlias, RelatedDocument, DocEvent, TelechatDocEvent, BallotDocEvent
-from ietf.doc.expire import expirable_draft
+from ietf.doc.models import ( Document, DocAlias, RelatedDocument, DocEvent, TelechatDocEvent, BallotDocEvent,
+    DocumentSearchIndex )
+from ietf.doc.expire import expirable_drafts
+from ietf.group.models import GroupMilestone
+from ietf.ipr.models import IprDocRel
 from ietf.meeting.models import SessionPresentation, Meeting, Session
+from ietf.review.models import ReviewRequest
+from ietf.submit.models import Submission, SubmissionCheck
+
+class WrappedValue(object):
+    """Stand-in for a method returning a precomputed value.  Unlike a
+    lambda, it can be pickled, so the filled in attribute values can be
+    cached."""
+    def __init__(self, v):
+        self.v = v
+
+    def __call__(self):
+        return self.v
 
 def wrap_value(v):
-    return lambda: v
+    return WrappedValue(v)
+
+
+def search_index_area(group):
+    """Return the area a document in group belongs to for searching by
+    area, i.e. the parent area of a WG or the area itself."""
+    if not group:
+        return None
+    if group.type_id == "wg":
+        return group.parent
+    if group.type_id == "area":
+        return group
+    return None
+
+def document_search_index_entry(doc):
+    """Return an unsaved DocumentSearchIndex row for doc, which should
+    have its states, tags, aliases and authors prefetched."""
+    names = set([doc.name]) | set(a.name for a in doc.docalias_set.all())
+
+    authors = set()
+    for a in doc.documentauthor_set.all():
+        authors.update(alias.name for alias in a.person.alias_set.all())
+        authors.update(e.address for e in a.person.email_set.all())
+
+    tags = [ t.slug for t in doc.tags.all() ]
+
+    return DocumentSearchIndex(
+        document=doc,
+        names=u" ".join(sorted(names)),
+        authors=u"\n".join(sorted(authors)),
+        draft_state=doc.get_state_slug("draft") or "",
+        iesg_state=doc.get_state("draft-iesg"),
+        irtf_state=doc.get_state("draft-stream-irtf"),
+        tags=u" %s " % u" ".join(sorted(tags)) if tags else u"",
+        group=doc.group,
+        area=search_index_area(doc.group),
+        ad_id=doc.ad_id,
+        stream_id=doc.stream_id,
+    )
+
+def update_document_search_index(names):
+    """Recompute the search index rows of the documents with the given
+    names, with a fixed number of queries."""
+    names = list(names)
+    docs = Document.objects.filter(name__in=names).select_related("group").prefetch_related(
+        "states", "tags", "docalias_set", "documentauthor_set__person__alias_set", "documentauthor_set__person__email_set")
+    rows = [ document_search_index_entry(d) for d in docs ]
+
+    with transaction.atomic():
+        DocumentSearchIndex.objects.filter(document__in=names).delete()
+        DocumentSearchIndex.objects.bulk_create(rows)
+
+    return len(rows)
+
+def rebuild_document_search_index(batch_size=1000):
+    """Rebuild the search index for all documents, batch_size documents
+    at a time.  Returns the number of rows written."""
+    count = 0
+    names = list(Document.objects.order_by("name").values_list("name", flat=True))
+    for i in range(0, len(names), batch_size):
+        count += update_document_search_index(names[i:i+batch_size])
+    return count
 
 
 def fill_in_telechat_date(docs, doc_dict=None, doc_ids=None):
@@ -41,13 +125,84 @@ def fill_in_document_sessions(docs, doc_dict, doc_ids):
         if i in doc_ids:
             doc_dict[i].sessions.append(s)
 
+def fill_in_document_milestones(docs, doc_dict, doc_ids):
+    for d in docs:
+        d.milestones = []
+    through = GroupMilestone.docs.through.objects.filter(document__in=doc_ids, groupmilestone__state="active")
+    for rel in through.select_related("groupmilestone__group").order_by("groupmilestone__time"):
+        doc_dict[rel.document_id].milestones.append(rel.groupmilestone)
+
+def fill_in_document_review_teams(docs, doc_dict, doc_ids):
+    teams = defaultdict(set)
+    review_requests = ReviewRequest.objects.filter(doc__in=doc_ids, state__in=["requested","accepted","part-completed","completed"])
+    for doc_id, acronym in review_requests.values_list("doc", "team__acronym").distinct():
+        teams[doc_id].add(acronym)
+    for d in docs:
+        d.reviewed_by_teams = sorted(teams[d.pk])
+
+def fill_in_document_submissions(docs, doc_dict, doc_ids):
+    """Fill in the submission of the current revision of each document,
+    with its latest checks, as returned by Document.submission() and
+    Submission.latest_checks()."""
+    submissions = {}
+    for s in Submission.objects.filter(draft__in=doc_ids, rev=F("draft__rev")).order_by("pk"):
+        if s.draft_id not in submissions:
+            submissions[s.draft_id] = s
+
+    latest_checks = defaultdict(dict)
+    for c in SubmissionCheck.objects.filter(submission__in=submissions.values()).order_by("time", "pk"):
+        latest_checks[c.submission_id][c.checker] = c
+
+    for s in submissions.values():
+        s.latest_checks = wrap_value([ c for (k, c) in sorted(latest_checks[s.pk].items()) ])
+    for d in docs:
+        d.submission = wrap_value(submissions.get(d.pk))
+
+def fill_in_document_related_ipr(docs, doc_dict, doc_ids):
+    """Fill in the IPR disclosures against each document and the
+    documents it directly or indirectly obsoletes or replaces, as
+    returned by Document.related_ipr(), with one query per level of
+    obsoletes/replaces relations rather than per document."""
+    aliases = defaultdict(set)
+    for name, doc_id in DocAlias.objects.filter(document__in=doc_ids).values_list("name", "document"):
+        aliases[doc_id].add(name)
+
+    # documents reached so far, with the rows reaching them
+    frontier = dict((pk, set([pk])) for pk in doc_ids)
+    seen = set()
+    while frontier:
+        reached = defaultdict(set)
+        relations = RelatedDocument.objects.filter(source__in=frontier.keys(), relationship__in=("obs", "replaces"))
+        for rel_id, source_id, target_name, target_doc_id in relations.values_list("pk", "source", "target", "target__document"):
+            for row in frontier[source_id]:
+                if (row, rel_id) not in seen:
+                    seen.add((row, rel_id))
+                    aliases[row].add(target_name)
+                    reached[target_doc_id].add(row)
+        frontier = reached
+
+    disclosures = defaultdict(set)
+    all_aliases = set().union(*aliases.values()) if aliases else set()
+    iprs = IprDocRel.objects.filter(document__in=all_aliases, disclosure__state__in=("posted", "removed"))
+    for name, disclosure_id in iprs.values_list("document", "disclosure").distinct():
+        disclosures[name].add(disclosure_id)
+
+    for d in docs:
+        d.related_ipr = wrap_value(sorted(set().union(*[ disclosures[a] for a in aliases[d.pk] ])))
+
 def fill_in_document_table_attributes(docs, have_telechat_date=False):
     # fill in some attributes for the document table results to save
-    # some hairy template code and avoid repeated SQL queries
+    # some hairy template code and avoid repeated SQL queries; all
+    # queries are for all the documents at once, so the number of
+    # queries doesn't depend on the number of documents
 
     doc_dict = dict((d.pk, d) for d in docs)
     doc_ids = doc_dict.keys()
 
+    # no-ops for what the caller already fetched
+    prefetch_related_objects(docs, "states__type", "tags", "group", "stream", "std_level", "intended_std_level",
+                             "ad__email_set", "shepherd__person")
+
     rfc_aliases = dict(DocAlias.objects.filter(name__startswith="rfc", document__in=doc_ids).values_list("document", "name"))
 
     # latest event cache
@@ -76,6 +231,13 @@ def fill_in_document_table_attributes(docs, have_telechat_date=False):
     # get meetings
     fill_in_document_sessions(docs, doc_dict, doc_ids)
 
+    fill_in_document_milestones(docs, doc_dict, doc_ids)
+    fill_in_document_review_teams(docs, doc_dict, doc_ids)
+    fill_in_document_submissions(docs, doc_dict, doc_ids)
+    fill_in_document_related_ipr(docs, doc_dict, doc_ids)
+
+    expirable_ids = set(expirable_drafts().filter(pk__in=doc_ids).values_list("pk", flat=True))
+
     # misc
     for d in docs:
         # emulate canonical name which is used by a lot of the utils
@@ -98,11 +260,11 @@ def fill_in_document_table_attributes(docs, have_telechat_date=False):
         else:
             d.search_heading = "%s" % (d.type,);
 
-        d.expirable = expirable_draft(d)
+        d.expirable = d.pk in expirable_ids
 
-        if d.get_state_slug() != "rfc":
-            d.milestones = [ m for (t, m) in sorted(((m.time, m) for m in d.groupmilestone_set.all() if m.state_id == "active")) ]
-            d.reviewed_by_teams = sorted(set(r.team.acronym for r in d.reviewrequest_set.filter(state__in=["requested","accepted","part-completed","completed"]).distinct().select_related('team')))
+        if d.get_state_slug() == "rfc":
+            d.milestones = []
+            d.reviewed_by_teams = []
 
         e = d.latest_event_cache.get('started_iesg_process', None)
         d.balloting_started = e.time if e else datetime.datetime.min
@@ -134,6 +296,51 @@ def fill_in_document_table_attributes(docs, have_telechat_date=False):
         l.sort()
 
 
+# The attributes fill_in_document_table_attributes() sets on a document,
+# which are cached for the document table instead of the document itself
+DOCUMENT_TABLE_ROW_ATTRIBUTES = (
+    "latest_event_cache", "ballot", "telechat_date", "sessions", "milestones", "reviewed_by_teams",
+    "submission", "related_ipr", "canonical_name", "latest_revision_date", "search_heading",
+    "expirable", "balloting_started", "has_errata", "obsoleted_by_list", "updated_by_list",
+)
+
+def document_table_row_cache_key(pk, time, latest_event_id):
+    return "doc:document:table:row:" + hashlib.sha1("%s:%s:%s" % (pk, time.isoformat(), latest_event_id)).hexdigest()
+
+def cached_document_table_rows(pks):
+    """Return the documents with the given primary keys with the
+    attributes for the document table filled in.  The documents are
+    loaded with a fixed number of queries; the computed attribute values
+    are cached, keyed by document, document time and latest event, so
+    only the rows of documents which changed since they were last shown
+    are computed again."""
+    docs = Document.objects.filter(pk__in=pks).select_related("ad", "std_level", "intended_std_level", "group", "stream", "shepherd", )
+    docs = list(docs)
+    doc_dict = dict((d.pk, d) for d in docs)
+    latest_event_ids = dict(DocEvent.objects.filter(doc__in=doc_dict.keys()).values("doc").annotate(Max("id")).values_list("doc", "id__max"))
+
+    keys = dict((d.pk, document_table_row_cache_key(d.pk, d.time, latest_event_ids.get(d.pk))) for d in docs)
+    cached = cache.get_many(keys.values())
+
+    missing = []
+    for d in docs:
+        if keys[d.pk] in cached:
+            for attr, value in cached[keys[d.pk]].iteritems():
+                setattr(d, attr, value)
+        else:
+            missing.append(d)
+
+    prefetch_related_objects(docs, "states__type", "tags", "ad__email_set", "shepherd__person")
+
+    if missing:
+        fill_in_document_table_attributes(missing)
+        rows = {}
+        for d in missing:
+            rows[keys[d.pk]] = dict((attr, d.__dict__[attr]) for attr in DOCUMENT_TABLE_ROW_ATTRIBUTES if attr in d.__dict__)
+        cache.set_many(rows, settings.DOC_TABLE_ROW_CACHE_TIME)
+
+    return [ doc_dict[pk] for pk in pks if pk in doc_dict ]
+
 def prepare_document_table(request, docs, query=None, max_results=200):
     """Take a queryset of documents and a QueryDict with sorting info
     and return list of documents with attributes filled in for
@@ -141,17 +348,13 @@ def prepare_document_table(request, docs, query=None, max_results=200):
     dict with information about the columns."""
 
     if not isinstance(docs, list):
-        # evaluate and fill in attribute results immediately to decrease
-        # the number of queries
-        docs = docs.select_related("ad", "std_level", "intended_std_level", "group", "stream", "shepherd", )
-        docs = docs.prefetch_related("states__type", "tags", "groupmilestone_set__group", "reviewrequest_set__team",
-                                     "submission_set__checks", "ad__email_set", "docalias_set__iprdocrel_set")
-
-    if docs.count() > max_results:
+        # the per-document attributes come from the cache where possible,
+        # only the per-user tracking info is computed for each request
+        docs = cached_document_table_rows(list(docs.values_list("pk", flat=True)[:max_results]))
+    else:
         docs = docs[:max_results]
-    docs = list(docs)
+        fill_in_document_table_attributes(docs)
 
-    fill_in_document_table_attributes(docs)
     augment_docs_with_tracking_info(docs, request.user)
 
     meta = {}
@@ -34,7 +34,7 @@
 
 import os, datetime, urllib, json, glob, re
 
-from django.http import HttpResponse, Http404 , HttpResponseForbidden
+from django.http import HttpResponse, Http404 , HttpResponseForbidden, HttpResponseBadRequest
 from django.shortcuts import render, get_object_or_404, redirect
 from django.template.loader import render_to_string
 from django.urls import reverse as urlreverse
@@ -45,7 +45,7 @@ import debug                            # pyflakes:ignore
 
 from ietf.doc.models import ( Document, DocAlias, DocHistory, DocEvent, BallotDocEvent,
     ConsensusDocEvent, NewRevisionDocEvent, TelechatDocEvent, WriteupDocEvent,
-    IESG_BALLOT_ACTIVE_STATES, STATUSCHANGE_RELATIONS )
+    DocumentReferenceIndex, IESG_BALLOT_ACTIVE_STATES, STATUSCHANGE_RELATIONS )
 from ietf.doc.utils import ( add_links_in_new_revision_events, augment_events_with_revision,
     can_adopt_draft, get_chartering_type, get_tags_for_stream_id,
     needed_ballot_positions, nice_consensus, prettify_std_name, update_telechat, has_same_ballot,
@@ -67,6 +67,7 @@ from ietf.review.models import ReviewRequest
 from ietf.review.utils import can_request_review_of_doc, review_requests_to_list_for_docs
 from ietf.review.utils import no_review_from_teams_on_doc
 from ietf.utils import markup_txt
+from ietf.utils.aliases import get_virtual_aliases, virtual_alias_counts
 from ietf.utils.text import maybe_split
 
 
@@ -643,30 +644,13 @@ def document_html(request, name, rev=None):
     return render(request, "doc/document_html.html", {"doc":doc, "top":top, "navbar_mode":"navbar-static-top",  })
 
 def check_doc_email_aliases():
-    pattern = re.compile('^expand-(.*?)(\..*?)?@.*? +(.*)$')
-    good_count = 0
-    tot_count = 0
-    with open(settings.DRAFT_VIRTUAL_PATH,"r") as virtual_file:
-        for line in virtual_file.readlines():
-            m = pattern.match(line)
-            tot_count += 1
-            if m:
-                good_count += 1
-            if good_count > 50 and tot_count < 3*good_count:
-                return True
-    return False
+    good_count, tot_count = virtual_alias_counts(settings.DRAFT_VIRTUAL_PATH)
+    return good_count > 50 and tot_count < 3*good_count
 
 def get_doc_email_aliases(name):
-    if name:
-        pattern = re.compile('^expand-(%s)(\..*?)?@.*? +(.*)$'%name)
-    else:
-        pattern = re.compile('^expand-(.*?)(\..*?)?@.*? +(.*)$')
     aliases = []
-    with open(settings.DRAFT_VIRTUAL_PATH,"r") as virtual_file:
-        for line in virtual_file.readlines():
-            m = pattern.match(line)
-            if m:
-                aliases.append({'doc_name':m.group(1),'alias_type':m.group(2),'expansion':m.group(3)})
+    for doc_name, alias_type, expansion in get_virtual_aliases(settings.DRAFT_VIRTUAL_PATH, name):
+        aliases.append({'doc_name':doc_name,'alias_type':alias_type or None,'expansion':expansion})
     return aliases
 
 def document_email(request,name):
@@ -874,16 +858,20 @@ def document_references(request, name):
     refs = doc.relations_that_doc(('refnorm','refinfo','refunk','refold'))
     return render(request, "doc/document_references.html",dict(doc=doc,refs=sorted(refs,key=lambda x:x.target.name),))
 
+def referenced_by(doc):
+    """Return the reference index rows of the references to doc from RFCs
+    and active drafts, by reference type and then document name."""
+    return DocumentReferenceIndex.objects.filter(target=doc, source_state__in=['rfc','active']).select_related('relationship').order_by('relationship_order', 'source_name')
+
 def document_referenced_by(request, name):
     doc = get_object_or_404(Document,docalias__name=name)
-    refs = doc.relations_that(('refnorm','refinfo','refunk','refold')).filter(source__states__type__slug='draft',source__states__slug__in=['rfc','active'])
+    refs = referenced_by(doc)
     full = ( request.GET.get('full') != None )
     numdocs = refs.count()
     if not full and numdocs>250:
        refs=refs[:250]
     else:
        numdocs=None
-    refs=sorted(refs,key=lambda x:(['refnorm','refinfo','refunk','refold'].index(x.relationship.slug),x.source.canonical_name()))
     return render(request, "doc/document_referenced_by.html",
                dict(alias_name=name,
                     doc=doc,
@@ -1025,6 +1013,37 @@ def document_json(request, name, rev=None):
 
     return HttpResponse(json.dumps(data, indent=2), content_type='application/json')
 
+def document_referenced_by_json(request, name):
+    doc = get_object_or_404(Document, docalias__name=name)
+    try:
+        offset = max(int(request.GET.get('offset', 0)), 0)
+        limit = min(max(int(request.GET.get('limit', 250)), 1), 1000)
+    except ValueError:
+        return HttpResponseBadRequest("offset and limit must be integers")
+
+    refs = referenced_by(doc)
+    total = refs.count()
+    data = {}
+    data["name"] = doc.name
+    data["total"] = total
+    data["offset"] = offset
+    data["limit"] = limit
+    data["references"] = [
+        dict(name=ref.source_name,
+             title=ref.source_title,
+             state=ref.source_state,
+             std_level=ref.source_std_level or None,
+             target=ref.target_name,
+             relationship=ref.relationship.name,
+             downref=ref.downref or None)
+        for ref in refs[offset:offset+limit]
+    ]
+    data["next"] = None
+    if offset + limit < total:
+        data["next"] = "%s?offset=%d&limit=%d" % (request.path, offset + limit, limit)
+
+    return HttpResponse(json.dumps(data, indent=2), content_type='application/json')
+
 class AddCommentForm(forms.Form):
     comment = forms.CharField(required=True, widget=forms.Textarea, strip=False)
 
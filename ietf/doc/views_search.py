@@ -153,10 +153,14 @@ def retrieve_search_results(form, all_types=False):
 
         docs = Document.objects.filter(type__in=types)
 
+    # The name, author, state and area filters below use the denormalized
+    # DocumentSearchIndex, so they don't need joins over aliases, authors,
+    # states and groups with the accompanying .distinct()
+
     # name
     if query["name"]:
-        docs = docs.filter(Q(docalias__name__icontains=query["name"]) |
-                           Q(title__icontains=query["name"])).distinct()
+        docs = docs.filter(Q(search_index__names__icontains=query["name"]) |
+                           Q(title__icontains=query["name"]))
 
     # rfc/active/old check buttons
     allowed_draft_states = []
@@ -167,30 +171,26 @@ def retrieve_search_results(form, all_types=False):
     if query["olddrafts"]:
         allowed_draft_states.extend(['repl', 'expired', 'auth-rm', 'ietf-rm'])
 
-    docs = docs.filter(Q(states__slug__in=allowed_draft_states) |
-                       ~Q(type__slug='draft')).distinct()
+    docs = docs.filter(Q(search_index__draft_state__in=allowed_draft_states) |
+                       ~Q(type__slug='draft'))
 
     # radio choices
     by = query["by"]
     if by == "author":
-        docs = docs.filter(
-            Q(documentauthor__person__alias__name__icontains=query["author"]) |
-            Q(documentauthor__person__email__address__icontains=query["author"])
-        )
+        docs = docs.filter(search_index__authors__icontains=query["author"])
     elif by == "group":
         docs = docs.filter(group__acronym=query["group"])
     elif by == "area":
-        docs = docs.filter(Q(group__type="wg", group__parent=query["area"]) |
-                           Q(group=query["area"])).distinct()
+        docs = docs.filter(search_index__area=query["area"])
     elif by == "ad":
         docs = docs.filter(ad=query["ad"])
     elif by == "state":
         if query["state"]:
-            docs = docs.filter(states=query["state"])
+            docs = docs.filter(search_index__iesg_state=query["state"])
         if query["substate"]:
-            docs = docs.filter(tags=query["substate"])
+            docs = docs.filter(search_index__tags__contains=" %s " % query["substate"])
     elif by == "irtfstate":
-        docs = docs.filter(states=query["irtfstate"])
+        docs = docs.filter(search_index__irtf_state=query["irtfstate"])
     elif by == "stream":
         docs = docs.filter(stream=query["stream"])
 
@@ -47,6 +47,8 @@ class GroupInfo(models.Model):
         return res
 
     def ad_role(self):
+        if hasattr(self, "prefetched_ad_roles"):
+            return self.prefetched_ad_roles[0] if self.prefetched_ad_roles else None
         return self.role_set.filter(name='ad').first()
 
     @property
@@ -32,10 +32,11 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import os
+import sys
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ietf.settings")
 
 import django
 django.setup()
 
-from ietf.idindex.index import all_id2_txt
-print all_id2_txt().encode('utf-8'),
+from ietf.idindex.index import write_indexes
+write_indexes([("all_id2", sys.stdout)], incremental=True)
@@ -32,10 +32,11 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import os
+import sys
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ietf.settings")
 
 import django
 django.setup()
 
-from ietf.idindex.index import id_index_txt
-print id_index_txt().encode('utf-8'),
+from ietf.idindex.index import write_indexes
+write_indexes([("id_index", sys.stdout)], incremental=True)
@@ -1,13 +1,15 @@
 # code to generate plain-text index files that are placed on
 # www.ietf.org in the same directory as the I-Ds
 
-import datetime, os
+import datetime, os, hashlib, itertools, shutil, tempfile
 
 import debug    # pyflakes:ignore
 
 import pytz
+import six
 
 from django.conf import settings
+from django.core.cache import cache
 from django.template.loader import render_to_string
 
 from ietf.doc.templatetags.ietf_filters import clean_whitespace
@@ -17,206 +19,454 @@ from ietf.doc.models import IESG_SUBSTATE_TAGS
 from ietf.group.models import Group
 from ietf.person.models import Person, Email
 
-def all_id_txt():
-    # this returns a lot of data so try to be efficient
+INCREMENTAL_INDEX_KINDS = ("all_id", "all_id2", "id_index", "id_abstracts")
+ACTIVE_DRAFTS_INDEX_KINDS = ("id_index", "id_abstracts")
 
-    # precalculations
-    revision_time = dict(NewRevisionDocEvent.objects.filter(type="new_revision", doc__name__startswith="draft-").order_by('time').values_list("doc_id", "time"))
+# The index files written by write_index_files(): kind, file name in
+# the draft directory, and file name of the copy in the download
+# directory (if any)
+INDEX_FILES = (
+    ("all_id",       "all_id.txt",        "id-all.txt"),
+    ("id_index",     "1id-index.txt",     "id-index.txt"),
+    ("id_abstracts", "1id-abstracts.txt", "id-abstract.txt"),
+    ("all_id2",      "all_id2.txt",       None),
+)
 
-    def formatted_rev_date(name):
-        t = revision_time.get(name)
-        return t.strftime("%Y-%m-%d") if t else ""
+def index_entry_cache_key(kind, name):
+    return "idindex:%s:%s" % (kind, hashlib.sha1(name.encode("utf-8")).hexdigest())
 
-    rfc_aliases = dict(DocAlias.objects.filter(name__startswith="rfc",
-                                               document__states=State.objects.get(type="draft", slug="rfc")).values_list("document_id", "name"))
+def invalidate_index_entries(names):
+    """Drop the cached index entries of the given drafts, so that they
+    are rendered anew the next time an incremental index is built."""
+    cache.delete_many([ index_entry_cache_key(kind, name) for name in names for kind in INCREMENTAL_INDEX_KINDS ])
 
-    replacements = dict(RelatedDocument.objects.filter(target__document__states=State.objects.get(type="draft", slug="repl"),
-                                                       relationship="replaces").values_list("target__document_id", "source"))
+def restrict_to_names(qs, field, names):
+    """Restrict the queryset to the given draft names."""
+    return qs.filter(**{ field + "__in": names })
 
+def active_draft_names():
+    return list(Document.objects.filter(type="draft", states__type="draft", states__slug="active").values_list("name", flat=True))
 
-    # we need a distinct to prevent the queries below from multiplying the result
-    all_ids = Document.objects.filter(type="draft").order_by('name').exclude(name__startswith="rfc").distinct()
+def file_types_for_drafts(basenames=None):
+    """Look in the draft directory and return file types found as dict (name + rev -> [t1, t2, ...]).
+    If basenames is given, only files for those name + rev combinations are returned."""
+    if basenames is not None:
+        basenames = set(basenames)
 
-    res = ["\nInternet-Drafts Status Summary\n"]
+    file_types = {}
+    for filename in os.listdir(settings.INTERNET_DRAFT_PATH):
+        if filename.startswith("draft-"):
+            base, ext = os.path.splitext(filename)
+            if ext and (basenames is None or base in basenames):
+                if base not in file_types:
+                    file_types[base] = [ext]
+                else:
+                    file_types[base].append(ext)
 
-    def add_line(f1, f2, f3, f4):
-        # each line must have exactly 4 tab-separated fields
-        res.append(f1 + "\t" + f2 + "\t" + f3 + "\t" + f4)
+    return file_types
 
+class DraftIndexData(object):
+    """The data needed by the draft index files for the drafts in names,
+    loaded in bulk with a fixed number of queries.  One instance is
+    shared between the generators of the different index files.
 
-    inactive_states = ["pub", "watching", "dead"]
+    To keep memory use flat, the drafts are loaded a chunk at a time;
+    file_types and ads may be passed in to share the draft directory
+    listing and the AD addresses between chunks."""
 
-    excludes = list(State.objects.filter(type="draft", slug__in=["rfc","repl"]))
-    includes = list(State.objects.filter(type="draft-iesg").exclude(slug__in=inactive_states))
-    in_iesg_process = all_ids.exclude(states__in=excludes).filter(states__in=includes).only("name", "rev")
+    def __init__(self, names, file_types=None, ads=None):
+        # this loads a lot of data so try to be efficient
 
-    # handle those actively in the IESG process
-    for d in in_iesg_process:
-        state = d.get_state("draft-iesg").name
-        tags = d.tags.filter(slug__in=IESG_SUBSTATE_TAGS).values_list("name", flat=True)
-        if tags:
-            state += "::" + "::".join(tags)
-        add_line(d.name + "-" + d.rev,
-                 formatted_rev_date(d.name),
-                 "In IESG processing - ID Tracker state <" + state + ">",
-                 "",
-                 )
+        drafts = restrict_to_names(Document.objects.filter(type="draft"), "name", names).exclude(name__startswith="rfc").order_by('name')
+        drafts = drafts.select_related('group', 'group__parent', 'ad', 'intended_std_level', 'shepherd', )
+        drafts = drafts.defer('abstract', 'note', 'internal_comments')
+        drafts = drafts.prefetch_related("states", "tags")
+        self.drafts = list(drafts)
 
+        self.active = set(d.name for d in self.drafts if d.get_state_slug() == "active")
 
-    # handle the rest
+        self.individual = Group.objects.get(acronym='none')
 
-    not_in_process = all_ids.exclude(pk__in=[d.name for d in in_iesg_process])
+        self.rfc_aliases = dict(restrict_to_names(DocAlias.objects.filter(name__startswith="rfc",
+                                                                          document__states=State.objects.get(type="draft", slug="rfc")), "document", names).values_list("document_id", "name"))
 
-    for s in State.objects.filter(type="draft").order_by("order"):
-        for name, rev in not_in_process.filter(states=s).values_list("name", "rev"):
-            state = s.name
-            last_field = ""
+        self.replacements = dict(restrict_to_names(RelatedDocument.objects.filter(target__document__states=State.objects.get(type="draft", slug="repl"),
+                                                                                  relationship="replaces"), "target__document", names).values_list("target__document_id", "source"))
 
-            if s.slug == "rfc":
-                a = rfc_aliases.get(name)
-                if a:
-                    last_field = a[3:]
-            elif s.slug == "repl":
-                state += " replaced by " + replacements.get(name, "0")
+        self.revision_time = {}
+        self.initial_revision_time = {}
+        for doc_id, time in restrict_to_names(DocEvent.objects.filter(type="new_revision", doc__name__startswith="draft-"), "doc", names).order_by('time').values_list("doc_id", "time"):
+            self.revision_time[doc_id] = time
+            self.initial_revision_time.setdefault(doc_id, time)
 
-            add_line(name + "-" + rev,
-                     formatted_rev_date(name),
-                     state,
-                     last_field,
-                    )
+        self.last_call_expires = dict(restrict_to_names(LastCallDocEvent.objects.filter(type="sent_last_call", doc__states__type="draft-iesg", doc__states__slug="lc"), "doc", names).order_by('time', 'id').values_list("doc_id", "expires"))
 
-    return u"\n".join(res) + "\n"
+        self.authors = {}
+        self.ascii_authors = {}
+        for a in restrict_to_names(DocumentAuthor.objects.filter(document__name__startswith="draft-"), "document", names).order_by("order").select_related("email", "person").iterator():
+            if a.email:
+                self.authors.setdefault(a.document_id, []).append(u'%s <%s>' % (a.person.plain_name().replace("@", ""), a.email.address.replace(",", "")))
+            else:
+                self.authors.setdefault(a.document_id, []).append(a.person.plain_name())
+            if a.document_id in self.active:
+                self.ascii_authors.setdefault(a.document_id, []).append(a.person.plain_ascii()) # This should probably change to .plain_name() when non-ascii names are permitted
 
-def file_types_for_drafts():
-    """Look in the draft directory and return file types found as dict (name + rev -> [t1, t2, ...])."""
-    file_types = {}
-    for filename in os.listdir(settings.INTERNET_DRAFT_PATH):
-        if filename.startswith("draft-"):
-            base, ext = os.path.splitext(filename)
-            if ext:
-                if base not in file_types:
-                    file_types[base] = [ext]
-                else:
-                    file_types[base].append(ext)
+        self.shepherds = dict((e.pk, e.formatted_ascii_email().replace('"', ''))
+                              for e in restrict_to_names(Email.objects.filter(shepherd_document_set__type="draft"), "shepherd_document_set__name", names).select_related("person").distinct())
+        self.ads = ads if ads is not None else {}
+        ad_ids = set(d.ad_id for d in self.drafts if d.ad_id and d.ad_id not in self.ads)
+        if ad_ids:
+            self.ads.update((p.pk, p.formatted_ascii_email().replace('"', ''))
+                            for p in Person.objects.filter(pk__in=ad_ids))
 
-    return file_types
+        self.abstracts = dict(Document.objects.filter(name__in=self.active).values_list("name", "abstract")) if self.active else {}
 
-def all_id2_txt():
-    # this returns a lot of data so try to be efficient
+        if file_types is None:
+            file_types = file_types_for_drafts([ d.name + "-" + d.rev for d in self.drafts ])
+        self.file_types = file_types
+
+    def formatted_rev_date(self, name):
+        t = self.revision_time.get(name)
+        return t.strftime("%Y-%m-%d") if t else ""
+
+    def iesg_state_with_substate(self, d):
+        state = d.get_state("draft-iesg").name
+        tags = [ t.name for t in d.tags.all() if t.slug in IESG_SUBSTATE_TAGS ]
+        if tags:
+            state += "::" + "::".join(tags)
+        return state
+
+def all_id_txt_entry(data, d):
+    """Return a (sort key, line) entry for the draft for all_id.txt.  The
+    line is None for drafts that aren't listed."""
+    state = d.get_state("draft")
+    iesg_state = d.get_state("draft-iesg")
+
+    def entry(sort_key, f1, f2, f3, f4):
+        # each line must have exactly 4 tab-separated fields
+        return (sort_key, f1 + "\t" + f2 + "\t" + f3 + "\t" + f4)
+
+    inactive_states = ["pub", "watching", "dead"]
+
+    # handle those actively in the IESG process
+    if (not state or state.slug not in ["rfc", "repl"]) and iesg_state and iesg_state.slug not in inactive_states:
+        return entry((0, 0, "", d.name),
+                     d.name + "-" + d.rev,
+                     data.formatted_rev_date(d.name),
+                     "In IESG processing - ID Tracker state <" + data.iesg_state_with_substate(d) + ">",
+                     "",
+                     )
 
-    drafts = Document.objects.filter(type="draft").exclude(name__startswith="rfc").order_by('name')
-    drafts = drafts.select_related('group', 'group__parent', 'ad', 'intended_std_level', 'shepherd', )
-    drafts = drafts.prefetch_related("states")
+    # handle the rest
+    if not state:
+        return (None, None)
+
+    state_name = state.name
+    last_field = ""
+
+    if state.slug == "rfc":
+        a = data.rfc_aliases.get(d.name)
+        if a:
+            last_field = a[3:]
+    elif state.slug == "repl":
+        state_name += " replaced by " + data.replacements.get(d.name, "0")
+
+    return entry((1, state.order, state.slug, d.name),
+                 d.name + "-" + d.rev,
+                 data.formatted_rev_date(d.name),
+                 state_name,
+                 last_field,
+                 )
 
-    rfc_aliases = dict(DocAlias.objects.filter(name__startswith="rfc",
-                                               document__states=State.objects.get(type="draft", slug="rfc")).values_list("document_id", "name"))
+def all_id2_txt_entry(data, d):
+    """Return a (sort key, line) entry for the draft for all_id2.txt."""
+    state = d.get_state_slug()
+    iesg_state = d.get_state("draft-iesg")
+
+    fields = []
+    # 0
+    fields.append(d.name + "-" + d.rev)
+    # 1
+    fields.append("-1") # used to be internal numeric identifier, we don't have that anymore
+    # 2
+    fields.append(d.get_state().name if state else "")
+    # 3
+    if state == "active":
+        s = "I-D Exists"
+        if iesg_state:
+            s = data.iesg_state_with_substate(d)
+        fields.append(s)
+    else:
+        fields.append("")
+    # 4
+    rfc_number = ""
+    if state == "rfc":
+        a = data.rfc_aliases.get(d.name)
+        if a:
+            rfc_number = a[3:]
+    fields.append(rfc_number)
+    # 5
+    repl = ""
+    if state == "repl":
+        repl = data.replacements.get(d.name, "")
+    fields.append(repl)
+    # 6
+    fields.append(data.formatted_rev_date(d.name))
+    # 7
+    group_acronym = ""
+    if d.group and d.group.type_id != "area" and d.group.acronym != "none":
+        group_acronym = d.group.acronym
+    fields.append(group_acronym)
+    # 8
+    area = ""
+    if d.group:
+        if d.group.type_id == "area":
+            area = d.group.acronym
+        elif d.group.type_id == "wg" and d.group.parent and d.group.parent.type_id == "area":
+            area = d.group.parent.acronym
+    fields.append(area)
+    # 9 responsible AD name
+    fields.append(unicode(d.ad) if d.ad else "")
+    # 10
+    fields.append(d.intended_std_level.name if d.intended_std_level else "")
+    # 11
+    lc_expires = ""
+    if iesg_state and iesg_state.slug == "lc":
+        expires = data.last_call_expires.get(d.name)
+        if expires:
+            lc_expires = expires.strftime("%Y-%m-%d")
+    fields.append(lc_expires)
+    # 12
+    doc_file_types = data.file_types.get(d.name + "-" + d.rev, [])
+    doc_file_types.sort()           # make the order consistent (and the result testable)
+    fields.append(",".join(doc_file_types) if state == "active" else "")
+    # 13
+    fields.append(clean_whitespace(d.title)) # FIXME: we should make sure this is okay in the database and in submit
+    # 14
+    fields.append(u", ".join(data.authors.get(d.name, [])))
+    # 15
+    fields.append(data.shepherds.get(d.shepherd_id, ""))
+    # 16 Responsible AD name and email
+    fields.append(data.ads.get(d.ad_id, ""))
+
+    return (d.name, u"\t".join(fields))
+
+def id_index_entry(data, d, with_abstracts=False):
+    """Return a dict with the values for the draft in the draft index,
+    for active drafts."""
+    entry = {
+        "name": d.name,
+        "rev": d.rev,
+        "title": d.title,
+        "group_id": d.group_id,
+    }
 
-    replacements = dict(RelatedDocument.objects.filter(target__document__states=State.objects.get(type="draft", slug="repl"),
-                                                       relationship="replaces").values_list("target__document_id", "source"))
+    # Special case for drafts with group set, but in state wg_cand:
+    if d.get_state_slug("draft-stream-ietf") in ["wg-cand", "c-adopt"]:
+        entry["group_id"] = data.individual.id
 
-    revision_time = dict(DocEvent.objects.filter(type="new_revision", doc__name__startswith="draft-").order_by('time').values_list("doc_id", "time"))
+    # add initial and latest revision time
+    if d.name in data.revision_time:
+        entry["rev_time"] = data.revision_time[d.name]
+        entry["initial_rev_time"] = data.initial_revision_time[d.name]
+
+    if d.name in data.ascii_authors:
+        entry["authors"] = data.ascii_authors[d.name]
+
+    # we need to output a multiple extension thing
+    types = data.file_types.get(d.name + "-" + d.rev, "")
+    exts = ".txt"
+    if ".ps" in types:
+        exts += ",.ps"
+    if ".pdf" in types:
+        exts += ",.pdf"
+    entry["exts"] = exts
 
+    if with_abstracts:
+        entry["abstract"] = data.abstracts.get(d.name, "")
+
+    return entry
+
+def compute_index_entries(kind, data):
+    """Return dict with the index entry of each draft in data for the
+    given kind of index file."""
+    if kind == "all_id":
+        return dict((d.name, all_id_txt_entry(data, d)) for d in data.drafts)
+    elif kind == "all_id2":
+        return dict((d.name, all_id2_txt_entry(data, d)) for d in data.drafts)
+    elif kind in ("id_index", "id_abstracts"):
+        return dict((d.name, id_index_entry(data, d, with_abstracts=(kind == "id_abstracts")))
+                    for d in data.drafts if d.name in data.active)
+    else:
+        raise ValueError("Unknown index kind: %s" % kind)
+
+def chunked(iterable, size):
+    it = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+def iter_index_entries(kinds, incremental=False):
+    """Yield (name, { kind: entry }) with the entries of the given kinds
+    of index files for each draft, in name order.
+
+    The draft data is loaded in chunks of settings.IDINDEX_CHUNK_SIZE
+    drafts, once for all kinds, so memory use doesn't grow with the
+    number of drafts.  If incremental is True, entries are taken from
+    the cache where possible and only the drafts that changed since the
+    last run are loaded and rendered; the fresh entries are stored for
+    the next run."""
+    names = Document.objects.filter(type="draft").exclude(name__startswith="rfc").order_by("name").values_list("name", flat=True)
+    active = set(active_draft_names()) if set(kinds) & set(ACTIVE_DRAFTS_INDEX_KINDS) else set()
+
+    # shared between the chunks
     file_types = file_types_for_drafts()
+    ads = {}
+
+    for chunk in chunked(names.iterator(), settings.IDINDEX_CHUNK_SIZE):
+        entries = {}
+        missing = {}
+        for kind in kinds:
+            entries[kind] = {}
+            missing[kind] = [ name for name in chunk if name in active ] if kind in ACTIVE_DRAFTS_INDEX_KINDS else chunk
+
+            if incremental:
+                keys = dict((name, index_entry_cache_key(kind, name)) for name in missing[kind])
+                cached = cache.get_many(keys.values())
+                entries[kind] = dict((name, cached[key]) for name, key in keys.iteritems() if key in cached)
+                missing[kind] = [ name for name in missing[kind] if name not in entries[kind] ]
+
+        missing_names = set(name for names in missing.itervalues() for name in names)
+        if missing_names:
+            data = DraftIndexData(list(missing_names), file_types=file_types, ads=ads)
+
+            for kind in kinds:
+                computed = compute_index_entries(kind, data)
+                fresh = dict((name, computed[name]) for name in missing[kind] if name in computed)
+                if incremental:
+                    cache.set_many(dict((index_entry_cache_key(kind, name), e) for name, e in fresh.iteritems()), settings.IDINDEX_ENTRY_CACHE_TIME)
+                entries[kind].update(fresh)
+
+        for name in chunk:
+            yield name, dict((kind, entries[kind][name]) for kind in kinds if name in entries[kind])
+
+class AllIdTxtWriter(object):
+    """Write all_id.txt to f as entries are added.  The lines are
+    sorted into sections by state, so they are spooled to a temporary
+    file per section and copied to f at the end."""
+
+    def __init__(self, f):
+        self.f = f
+        self.sections = {}
+
+    def add(self, entry):
+        sort_key, line = entry
+        if line is None:
+            return
+        section = sort_key[:-1]
+        if section not in self.sections:
+            self.sections[section] = tempfile.TemporaryFile()
+        self.sections[section].write(line.encode("utf-8") + "\n")
+
+    def finish(self):
+        self.f.write("\nInternet-Drafts Status Summary\n\n")
+        for section in sorted(self.sections):
+            spool = self.sections[section]
+            spool.seek(0)
+            shutil.copyfileobj(spool, self.f)
+            spool.close()
+
+class AllId2TxtWriter(object):
+    """Write all_id2.txt to f as entries are added, in name order."""
+
+    data_marker = u"@@ALL_ID2_DATA@@"
+
+    def __init__(self, f):
+        self.f = f
+        self.head, self.tail = render_to_string("idindex/all_id2.txt", { 'data': self.data_marker }).split(self.data_marker)
+        self.f.write(self.head.encode("utf-8"))
+        self.first = True
+
+    def add(self, entry):
+        sort_key, line = entry
+        if not self.first:
+            self.f.write("\n")
+        self.f.write(line.encode("utf-8"))
+        self.first = False
+
+    def finish(self):
+        self.f.write(self.tail.encode("utf-8"))
+
+class IdIndexTxtWriter(object):
+    """Write 1id-index.txt or 1id-abstracts.txt to f.  The entries are
+    grouped by group, so they are collected and rendered at the end;
+    only active drafts are listed, so this doesn't grow with the size
+    of the draft archive."""
+
+    def __init__(self, f, with_abstracts=False):
+        self.f = f
+        self.with_abstracts = with_abstracts
+        self.entries = []
+
+    def add(self, entry):
+        self.entries.append(entry)
+
+    def finish(self):
+        self.f.write(render_id_index_txt(self.entries, self.with_abstracts).encode("utf-8"))
+
+def index_writer(kind, f):
+    if kind == "all_id":
+        return AllIdTxtWriter(f)
+    elif kind == "all_id2":
+        return AllId2TxtWriter(f)
+    elif kind in ("id_index", "id_abstracts"):
+        return IdIndexTxtWriter(f, with_abstracts=(kind == "id_abstracts"))
+    else:
+        raise ValueError("Unknown index kind: %s" % kind)
+
+def write_indexes(outputs, incremental=False):
+    """Stream the index files to the given (kind, file) outputs in a
+    single pass over the drafts.  Content is written UTF-8 encoded."""
+    writers = [ (kind, index_writer(kind, f)) for kind, f in outputs ]
+    kinds = list(set(kind for kind, f in outputs))
+
+    for name, entries in iter_index_entries(kinds, incremental):
+        for kind, writer in writers:
+            if kind in entries:
+                writer.add(entries[kind])
+
+    for kind, writer in writers:
+        writer.finish()
+
+def index_txt(kind, incremental=False):
+    f = six.BytesIO()
+    write_indexes([(kind, f)], incremental)
+    return f.getvalue().decode("utf-8")
+
+def render_id_index_txt(entries, with_abstracts=False):
+    groups = group_active_drafts(entries)
 
-    authors = {}
-    for a in DocumentAuthor.objects.filter(document__name__startswith="draft-").order_by("order").select_related("email", "person").iterator():
-        if a.document_id not in authors:
-            l = authors[a.document_id] = []
-        else:
-            l = authors[a.document_id]
-        if a.email:
-            l.append(u'%s <%s>' % (a.person.plain_name().replace("@", ""), a.email.address.replace(",", "")))
-        else:
-            l.append(a.person.plain_name())
-
-    shepherds = dict((e.pk, e.formatted_ascii_email().replace('"', ''))
-                     for e in Email.objects.filter(shepherd_document_set__type="draft").select_related("person").distinct())
-    ads = dict((p.pk, p.formatted_ascii_email().replace('"', ''))
-               for p in Person.objects.filter(ad_document_set__type="draft").distinct())
-
-    res = []
-    for d in drafts:
-        state = d.get_state_slug()
-        iesg_state = d.get_state("draft-iesg")
-
-        fields = []
-        # 0
-        fields.append(d.name + "-" + d.rev)
-        # 1
-        fields.append("-1") # used to be internal numeric identifier, we don't have that anymore
-        # 2
-        fields.append(d.get_state().name if state else "")
-        # 3
-        if state == "active":
-            s = "I-D Exists"
-            if iesg_state:
-                s = iesg_state.name
-                tags = d.tags.filter(slug__in=IESG_SUBSTATE_TAGS).values_list("name", flat=True)
-                if tags:
-                    s += "::" + "::".join(tags)
-            fields.append(s)
-        else:
-            fields.append("")
-        # 4
-        rfc_number = ""
-        if state == "rfc":
-            a = rfc_aliases.get(d.name)
-            if a:
-                rfc_number = a[3:]
-        fields.append(rfc_number)
-        # 5
-        repl = ""
-        if state == "repl":
-            repl = replacements.get(d.name, "")
-        fields.append(repl)
-        # 6
-        t = revision_time.get(d.name)
-        fields.append(t.strftime("%Y-%m-%d") if t else "")
-        # 7
-        group_acronym = ""
-        if d.group and d.group.type_id != "area" and d.group.acronym != "none":
-            group_acronym = d.group.acronym
-        fields.append(group_acronym)
-        # 8
-        area = ""
-        if d.group:
-            if d.group.type_id == "area":
-                area = d.group.acronym
-            elif d.group.type_id == "wg" and d.group.parent and d.group.parent.type_id == "area":
-                area = d.group.parent.acronym
-        fields.append(area)
-        # 9 responsible AD name
-        fields.append(unicode(d.ad) if d.ad else "")
-        # 10
-        fields.append(d.intended_std_level.name if d.intended_std_level else "")
-        # 11
-        lc_expires = ""
-        if iesg_state and iesg_state.slug == "lc":
-            e = d.latest_event(LastCallDocEvent, type="sent_last_call")
-            if e:
-                lc_expires = e.expires.strftime("%Y-%m-%d")
-        fields.append(lc_expires)
-        # 12
-        doc_file_types = file_types.get(d.name + "-" + d.rev, [])
-        doc_file_types.sort()           # make the order consistent (and the result testable)
-        fields.append(",".join(doc_file_types) if state == "active" else "")
-        # 13
-        fields.append(clean_whitespace(d.title)) # FIXME: we should make sure this is okay in the database and in submit
-        # 14
-        fields.append(u", ".join(authors.get(d.name, [])))
-        # 15
-        fields.append(shepherds.get(d.shepherd_id, ""))
-        # 16 Responsible AD name and email
-        fields.append(ads.get(d.ad_id, ""))
-
-        #
-        res.append(u"\t".join(fields))
-
-    return render_to_string("idindex/all_id2.txt", {'data': u"\n".join(res) })
+    return render_to_string("idindex/id_index.txt", {
+            'groups': groups,
+            'time': datetime.datetime.now(pytz.UTC).strftime("%Y-%m-%d %H:%M:%S %Z"),
+            'with_abstracts': with_abstracts,
+            })
 
-def active_drafts_index_by_group(extra_values=()):
-    """Return active drafts grouped into their corresponding
-    associated group, for spitting out draft index."""
+def all_id_txt(incremental=False):
+    """Return the content of all_id.txt.  If incremental is True, only
+    the lines of drafts that changed since the last run are rendered,
+    the rest are taken from the cache."""
+    return index_txt("all_id", incremental)
+
+def all_id2_txt(incremental=False):
+    """Return the content of all_id2.txt, see all_id_txt() for incremental."""
+    return index_txt("all_id2", incremental)
+
+def active_drafts_index_entries(extra_values=()):
+    """Return dict with the values needed for the draft index for each
+    active draft."""
 
     # this returns a lot of data so try to be efficient
 
@@ -225,8 +475,6 @@ def active_drafts_index_by_group(extra_values=()):
     wg_adopt = State.objects.get(type="draft-stream-ietf", slug="c-adopt")
     individual = Group.objects.get(acronym='none')
 
-    groups_dict = dict((g.id, g) for g in Group.objects.all())
-
     extracted_values = ("name", "rev", "title", "group_id") + extra_values
 
     docs_dict = dict((d["name"], d)
@@ -252,8 +500,15 @@ def active_drafts_index_by_group(extra_values=()):
                 d["authors"] = []
             d["authors"].append(a.person.plain_ascii()) # This should probably change to .plain_name() when non-ascii names are permitted
 
+    return docs_dict
+
+def group_active_drafts(docs):
+    """Return groups with the given index entries of active drafts in
+    group.active_drafts."""
+    groups_dict = dict((g.id, g) for g in Group.objects.all())
+
     # put docs into groups
-    for d in docs_dict.itervalues():
+    for d in docs:
         group = groups_dict.get(d["group_id"])
         if not group:
             continue
@@ -271,27 +526,62 @@ def active_drafts_index_by_group(extra_values=()):
         g.active_drafts.sort(key=lambda d: d.get("initial_rev_time", fallback_time))
 
     return groups
-    
-def id_index_txt(with_abstracts=False):
-    extra_values = ()
-    if with_abstracts:
-        extra_values = ("abstract",)
-    groups = active_drafts_index_by_group(extra_values)
-
-    file_types = file_types_for_drafts()
-    for g in groups:
-        for d in g.active_drafts:
-            # we need to output a multiple extension thing
-            types = file_types.get(d["name"] + "-" + d["rev"], "")
-            exts = ".txt"
-            if ".ps" in types:
-                exts += ",.ps"
-            if ".pdf" in types:
-                exts += ",.pdf"
-            d["exts"] = exts
 
-    return render_to_string("idindex/id_index.txt", {
-            'groups': groups,
-            'time': datetime.datetime.now(pytz.UTC).strftime("%Y-%m-%d %H:%M:%S %Z"),
-            'with_abstracts': with_abstracts,
-            })
+def active_drafts_index_by_group(extra_values=()):
+    """Return active drafts grouped into their corresponding
+    associated group, for spitting out draft index."""
+    return group_active_drafts(active_drafts_index_entries(extra_values).itervalues())
+
+def id_index_txt(with_abstracts=False, incremental=False):
+    """Return the content of 1id-index.txt or 1id-abstracts.txt, see
+    all_id_txt() for incremental."""
+    return index_txt("id_abstracts" if with_abstracts else "id_index", incremental)
+
+def mkstemp_beside(path):
+    """Create a temporary file in the directory of path, for writing
+    path atomically by renaming the temporary file into place."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".%s." % os.path.basename(path))
+    return os.fdopen(fd, "wb"), tmp_path
+
+def write_index_files(id_dir, download_dir=None, incremental=False):
+    """Generate all the draft index files in a single streaming pass
+    over the drafts, writing them to id_dir and the copies to
+    download_dir.  Each file is written to a temporary file in the
+    same directory and renamed into place, so readers never see a
+    partially written file.  Returns the list of paths written."""
+    targets = []                        # (kind, path, temporary file path)
+    outputs = []
+    try:
+        for kind, filename, download_filename in INDEX_FILES:
+            path = os.path.join(id_dir, filename)
+            f, tmp_path = mkstemp_beside(path)
+            targets.append((kind, path, tmp_path))
+            outputs.append((kind, f))
+
+        write_indexes(outputs, incremental)
+
+        for kind, f in outputs:
+            f.close()
+
+        tmp_paths = dict((k, t) for k, _, t in targets)
+        for kind, filename, download_filename in INDEX_FILES:
+            if download_dir and download_filename:
+                src = tmp_paths[kind]
+                path = os.path.join(download_dir, download_filename)
+                f, tmp_path = mkstemp_beside(path)
+                targets.append((kind, path, tmp_path))
+                with open(src, "rb") as s:
+                    shutil.copyfileobj(s, f)
+                f.close()
+
+        for kind, path, tmp_path in targets:
+            os.chmod(tmp_path, 0644)
+            os.rename(tmp_path, path)
+
+        return [ path for kind, path, tmp_path in targets ]
+    finally:
+        for kind, f in outputs:
+            f.close()
+        for kind, path, tmp_path in targets:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
@@ -0,0 +1,26 @@
+# Copyright The IETF Trust 2018, All Rights Reserved
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+import debug                            # pyflakes:ignore
+
+from ietf.idindex.index import write_index_files
+
+class Command(BaseCommand):
+    help = (u"Generate all_id.txt, all_id2.txt, 1id-index.txt, 1id-abstracts.txt and "
+            u"their download copies in one go, from a single load of the draft data.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--id-dir", default=settings.INTERNET_DRAFT_PATH,
+            help="directory to write the index files to (default: %(default)s)")
+        parser.add_argument("--download-dir", default=settings.INTERNET_DRAFT_INDEX_DOWNLOAD_PATH,
+            help="directory to write the download copies to (default: %(default)s)")
+        parser.add_argument("--full", action="store_true", default=False,
+            help="render the entries of all drafts, not only of those that changed since the last run")
+
+    def handle(self, *args, **options):
+        paths = write_index_files(options["id_dir"], options["download_dir"], incremental=not options["full"])
+        if options["verbosity"] > 1:
+            for path in paths:
+                self.stdout.write("Wrote %s\n" % path)
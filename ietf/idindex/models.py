@@ -0,0 +1,50 @@
+# There are no models for the draft index files, but the signal handlers
+# which keep the per-draft index entries up to date are hooked up here,
+# where they'll be loaded at startup.
+
+from django.db.models import signals
+
+import debug    # pyflakes:ignore
+
+from ietf.doc.models import Document, DocAlias, DocEvent, DocumentAuthor, RelatedDocument
+
+
+def invalidate_draft_index_entries(names):
+    names = [ n for n in names if n and n.startswith("draft-") ]
+    if names:
+        from ietf.idindex.index import invalidate_index_entries
+        invalidate_index_entries(names)
+
+def doc_event_saved(sender, instance, **kwargs):
+    if not isinstance(instance, DocEvent):
+        return
+
+    invalidate_draft_index_entries([instance.doc_id])
+
+def document_saved(sender, instance, **kwargs):
+    invalidate_draft_index_entries([instance.name])
+
+def doc_related_object_changed(sender, instance, **kwargs):
+    if isinstance(instance, RelatedDocument):
+        # draft aliases are named after the draft itself
+        invalidate_draft_index_entries([instance.target_id])
+    else:
+        invalidate_draft_index_entries([instance.document_id])
+
+def document_m2m_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+
+    if reverse:
+        invalidate_draft_index_entries(pk_set or [])
+    else:
+        invalidate_draft_index_entries([instance.pk])
+
+
+signals.post_save.connect(doc_event_saved)
+signals.post_save.connect(document_saved, sender=Document)
+for model in (DocAlias, DocumentAuthor, RelatedDocument):
+    signals.post_save.connect(doc_related_object_changed, sender=model)
+    signals.post_delete.connect(doc_related_object_changed, sender=model)
+signals.m2m_changed.connect(document_m2m_changed, sender=Document.states.through)
+signals.m2m_changed.connect(document_m2m_changed, sender=Document.tags.through)
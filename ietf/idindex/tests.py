@@ -7,12 +7,13 @@ import shutil
 import debug    # pyflakes:ignore
 
 from django.conf import settings
+from django.test.utils import override_settings
 
 from ietf.doc.factories import WgDraftFactory
 from ietf.doc.models import Document, DocAlias, RelatedDocument, State, LastCallDocEvent, NewRevisionDocEvent
 from ietf.group.factories import GroupFactory
 from ietf.name.models import DocRelationshipName
-from ietf.idindex.index import all_id_txt, all_id2_txt, id_index_txt
+from ietf.idindex.index import all_id_txt, all_id2_txt, id_index_txt, write_index_files
 from ietf.person.factories import PersonFactory, EmailFactory
 from ietf.utils.test_utils import TestCase
 
@@ -133,6 +134,44 @@ class IndexTests(TestCase):
         self.assertEqual(t[11], e.expires.strftime("%Y-%m-%d"))
 
 
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_incremental_index(self):
+        draft = WgDraftFactory(states=[('draft','active'),('draft-iesg','lc')],authors=[PersonFactory()])
+
+        self.assertEqual(all_id_txt(incremental=True), all_id_txt())
+        self.assertEqual(all_id2_txt(incremental=True), all_id2_txt())
+
+        # changing the state invalidates the cached lines
+        draft.set_state(State.objects.get(type="draft-iesg", slug="iesg-eva"))
+
+        txt = all_id_txt(incremental=True)
+        self.assertTrue(draft.get_state("draft-iesg").name in txt)
+        self.assertEqual(txt, all_id_txt())
+        self.assertEqual(all_id2_txt(incremental=True), all_id2_txt())
+
+        # so does a new revision
+        draft.rev = "%02d" % (int(draft.rev) + 1)
+        draft.save_with_history([NewRevisionDocEvent.objects.create(doc=draft, rev=draft.rev, type="new_revision", by=PersonFactory())])
+
+        self.assertTrue(draft.name + "-" + draft.rev in all_id_txt(incremental=True))
+        self.assertTrue(draft.name + "-" + draft.rev in id_index_txt(incremental=True))
+
+    @override_settings(IDINDEX_CHUNK_SIZE=1)
+    def test_all_id_txt_chunked(self):
+        drafts = [ WgDraftFactory(states=[('draft','active')]) for i in range(3) ]
+        drafts[1].set_state(State.objects.get(type="draft-iesg", slug="lc"))
+
+        txt = all_id_txt()
+        lines = [ l.split("\t")[0] for l in txt.splitlines() if l.startswith("draft-") ]
+        self.assertEqual(lines[0], drafts[1].name + "-" + drafts[1].rev)
+        self.assertEqual(sorted(lines[1:]), lines[1:])
+        self.assertEqual(len(lines), 3)
+
+        txt = all_id2_txt()
+        lines = [ l.split("\t")[0] for l in txt.splitlines() if l.startswith("draft-") ]
+        self.assertEqual(sorted(lines), lines)
+        self.assertEqual(len(lines), 3)
+
     def test_id_index_txt(self):
         draft = WgDraftFactory(states=[('draft','active')],abstract='a'*20,authors=[PersonFactory()])
 
@@ -146,3 +185,25 @@ class IndexTests(TestCase):
         txt = id_index_txt(with_abstracts=True)
 
         self.assertTrue(draft.abstract[:20] in txt)
+
+    def test_write_index_files(self):
+        draft = WgDraftFactory(states=[('draft','active'),('draft-iesg','lc')],abstract='a'*20,authors=[PersonFactory()])
+        download_dir = self.tempdir('download')
+
+        try:
+            paths = write_index_files(self.id_dir, download_dir)
+
+            self.assertEqual(len(paths), 7)
+            for path in paths:
+                self.assertTrue(os.path.exists(path))
+
+            with open(os.path.join(self.id_dir, "all_id.txt")) as f:
+                self.assertEqual(f.read().decode("utf-8"), all_id_txt())
+            with open(os.path.join(download_dir, "id-all.txt")) as f:
+                self.assertEqual(f.read().decode("utf-8"), all_id_txt())
+            with open(os.path.join(self.id_dir, "1id-abstracts.txt")) as f:
+                self.assertTrue(draft.abstract[:20] in f.read())
+            with open(os.path.join(self.id_dir, "all_id2.txt")) as f:
+                self.assertTrue(draft.name + "-" + draft.rev in f.read())
+        finally:
+            shutil.rmtree(download_dir)
@@ -1,3 +1,7 @@
+from collections import defaultdict
+
+from ietf.doc.models import DocAlias
+
 def get_genitive(name):
     """Return the genitive form of name"""
     return name + "'" if name.endswith('s') else name + "'s"
@@ -39,13 +43,15 @@ def related_docs(alias, relationship=('replaces', 'obs')):
     
     rels = alias.document.all_relations_that_doc(relationship)
 
+    rel_aliases = defaultdict(list)
+    for x in DocAlias.objects.filter(document__in=set(rel.target.document_id for rel in rels)):
+        rel_aliases[x.document_id].append(x)
+
     for rel in rels:
-        rel_aliases = list(rel.target.document.docalias_set.all())
-        
-        for x in rel_aliases:
+        for x in rel_aliases[rel.target.document_id]:
             x.related = rel
             x.relation = rel.relationship.revname
-        results += rel_aliases
+            results.append(x)
     return list(set(results))
 
     
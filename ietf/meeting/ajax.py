@@ -1,18 +1,72 @@
 import json
+from collections import defaultdict
 
+from django.db.models import Prefetch
 from django.shortcuts import get_object_or_404, redirect
 from django.http import HttpResponse
 from django.http import QueryDict
 from django.http import Http404
 from django.views.decorators.http import require_POST
 
+from ietf.group.models import Role
 from ietf.ietfauth.utils import role_required, has_role
 from ietf.meeting.helpers import get_meeting, get_schedule, agenda_permissions, get_person_by_email, get_schedule_by_name
-from ietf.meeting.models import TimeSlot, Session, Schedule, Room, Constraint, SchedTimeSessAssignment, ResourceAssociation
+from ietf.meeting.models import TimeSlot, Session, Schedule, Room, SchedTimeSessAssignment, ResourceAssociation
+from ietf.meeting.placement import score_move, update_schedule_badness
 from ietf.meeting.views   import edit_timeslots, edit_agenda
 
 import debug                            # pyflakes:ignore
 
+def json_list_response(dicts, status=200):
+    """Respond with a JSON list, encoding one item at a time rather than
+    the whole list in one go."""
+    def chunks():
+        yield "[\n"
+        for i, d in enumerate(dicts):
+            if i > 0:
+                yield ",\n"
+            yield json.dumps(d, sort_keys=True, indent=2)
+        yield "\n]"
+    return HttpResponse(chunks(), status=status, content_type="application/json")
+
+# The bulk serializations below fetch everything the json_dict() methods
+# follow up front, with a fixed number of queries whatever the size of the
+# meeting.
+
+def sessions_json_dicts(sessions, host_scheme):
+    sessions = sessions.select_related(
+        "group__state", "group__type", "group__parent", "status", "requested_by",
+    ).prefetch_related(
+        "resources__name",
+        Prefetch("group__role_set",
+                 queryset=Role.objects.filter(name="ad").select_related("person").order_by("pk"),
+                 to_attr="prefetched_ad_roles"),
+    )
+    for session in sessions:
+        yield session.json_dict(host_scheme)
+
+def assignments_json_dicts(schedule, assignments, host_scheme):
+    assignments = list(assignments)
+
+    # sessions extended over several timeslots point at the previous one
+    by_session = defaultdict(list)
+    for a in schedule.assignments.filter(session__in=set(a.session_id for a in assignments if a.session_id)).select_related("timeslot").order_by("timeslot__time"):
+        by_session[a.session_id].append(a)
+    previous = {}
+    for l in by_session.values():
+        for prev, a in zip([None] + l, l):
+            previous[a.pk] = prev
+
+    base_url = schedule.base_url()
+    for a in assignments:
+        a._cached_json_url = "%s/session/%u.json" % (base_url, a.pk)
+        a.previous_assignment_of_session = previous.get(a.pk)
+        yield a.json_dict(host_scheme)
+
+def constraints_json_dicts(constraints, host_scheme):
+    for constraint in constraints.select_related("name", "person", "source", "target", "meeting"):
+        yield constraint.json_dict(host_scheme)
+
 def is_truthy_enough(value):
     return not (value == "0" or value == 0 or value=="false")
 
@@ -432,9 +486,7 @@ def sessions_json(request, num):
 
     sessions = meeting.sessions_that_can_meet.all()
 
-    sess1_dict = [ x.json_dict(request.build_absolute_uri('/')) for x in sessions ]
-    return HttpResponse(json.dumps(sess1_dict, sort_keys=True, indent=2),
-                        content_type="application/json")
+    return json_list_response(sessions_json_dicts(sessions, request.build_absolute_uri('/')))
 
 #############################################################################
 ## Scheduledsesion
@@ -475,6 +527,7 @@ def assignments_post(request, meeting, schedule):
                                 status = 406,
                                 content_type="application/json")
     ss1.save()
+    update_schedule_badness(schedule)
     ss1_dict = ss1.json_dict(request.build_absolute_uri('/'))
     response = HttpResponse(json.dumps(ss1_dict),
                         status = 201,
@@ -486,10 +539,7 @@ def assignments_post(request, meeting, schedule):
 def assignments_get(request, num, schedule):
     assignments = schedule.assignments.all()
 
-    absolute_url = request.build_absolute_uri('/')
-    sess1_dict = [ x.json_dict(absolute_url) for x in assignments ]
-    return HttpResponse(json.dumps(sess1_dict, sort_keys=True, indent=2),
-                        content_type="application/json")
+    return json_list_response(assignments_json_dicts(schedule, assignments, request.build_absolute_uri('/')))
 
 # this returns the list of scheduled sessions for the given named agenda
 def assignments_json(request, num, owner, name):
@@ -526,6 +576,7 @@ def assignment_update(request, meeting, schedule, ss):
         ss.pinned = is_truthy_enough(put_vars.get("pinned"))
 
     ss.save()
+    update_schedule_badness(schedule)
     return HttpResponse(json.dumps({'message':'valid'}),
                         content_type="application/json")
 
@@ -546,6 +597,7 @@ def assignment_delete(request, meeting, schedule, ss):
     for ss in assignments:
         ss.delete()
         count += 1
+    update_schedule_badness(schedule)
 
     return HttpResponse(json.dumps({'result':"%u objects deleted"%(count)}),
                         status = 200,
@@ -581,6 +633,37 @@ def assignment_json(request, num, owner, name, assignment_id):
     elif request.method == 'DELETE':
         return assignment_delete(request, meeting, schedule, ss)
 
+# the change in badness of moving a session to a timeslot, for the agenda editor
+def assignment_score(request, num, owner, name):
+    info = get_meeting_schedule(num, owner, name)
+    if isinstance(info, HttpResponse):
+        return info
+    meeting, person, schedule = info
+
+    cansee,canedit,secretariat = agenda_permissions(meeting, schedule, request.user)
+    if not cansee:
+        return HttpResponse(json.dumps({'error':'no permission to see this agenda'}),
+                            status = 403,
+                            content_type="application/json")
+
+    try:
+        session_id = int(request.GET["session_id"])
+        timeslot_id = int(request.GET["timeslot_id"])
+    except (KeyError, ValueError):
+        return HttpResponse(json.dumps({'error':'missing values, timeslot_id and session_id required'}),
+                            status = 406,
+                            content_type="application/json")
+
+    score = score_move(schedule, session_id, timeslot_id)
+    if score is None:
+        return HttpResponse(json.dumps({'error':'session or timeslot not available for placement'}),
+                            status = 404,
+                            content_type="application/json")
+
+    badness, delta = score
+    return HttpResponse(json.dumps({'badness': badness, 'delta': delta, 'new_badness': badness + delta}),
+                        content_type="application/json")
+
 #############################################################################
 ## Constraints API
 #############################################################################
@@ -591,14 +674,13 @@ def assignment_json(request, num, owner, name, assignment_id):
 def constraint_json(request, num, constraintid):
     meeting = get_meeting(num)
 
-    try:
-        constraint = meeting.constraint_set.get(pk=int(constraintid))
-    except Constraint.DoesNotExist:
+    constraints = meeting.constraint_set.filter(pk=int(constraintid))
+    json1 = next(constraints_json_dicts(constraints, request.build_absolute_uri('/')), None)
+    if json1 is None:
         return HttpResponse(json.dumps({'error':"no such constraint %s" % constraintid}),
                             status = 404,
                             content_type="application/json")
 
-    json1 = constraint.json_dict(request.build_absolute_uri('/'))
     return HttpResponse(json.dumps(json1, sort_keys=True, indent=2),
                         content_type="application/json")
 
@@ -616,13 +698,11 @@ def session_constraints(request, num, sessionid):
     except Session.DoesNotExist:
         return json.dumps({"error":"no such session"})
 
-    constraint_list = session.constraints_dict(request.build_absolute_uri('/'))
-
-    json_str = json.dumps(constraint_list,
-                          sort_keys=True, indent=2),
-    #print "  gives: %s" % (json_str)
+    host_scheme = request.build_absolute_uri('/')
+    constraint_list = list(constraints_json_dicts(session.constraints(), host_scheme))
+    constraint_list += list(constraints_json_dicts(session.reverse_constraints(), host_scheme))
 
-    return HttpResponse(json_str, content_type="application/json")
+    return json_list_response(constraint_list)
 
 
 
@@ -1,11 +1,18 @@
 # Copyright The IETF Trust 2007, All Rights Reserved
 
 import datetime
+import hashlib
+import multiprocessing
 import os
 import re
+import tarfile
+import time
+import uuid
+from StringIO import StringIO
 from tempfile import mkstemp
 
 from django.http import HttpRequest, Http404
+from django.db import connections
 from django.db.models import Max, Q, Prefetch, F
 from django.conf import settings
 from django.core.cache import cache
@@ -16,17 +23,19 @@ from django.template.loader import render_to_string
 
 import debug                            # pyflakes:ignore
 
-from ietf.doc.models import Document
+from ietf.doc.models import Document, NewRevisionDocEvent, State
 from ietf.group.models import Group
 from ietf.ietfauth.utils import has_role, user_is_person
 from ietf.liaisons.utils import get_person_for_user
 from ietf.mailtrigger.utils import gather_address_lists
 from ietf.person.models  import Person
 from ietf.meeting.models import Meeting, Schedule, TimeSlot, SchedTimeSessAssignment, ImportantDate
+from ietf.meeting.models import Session, SessionPresentation
 from ietf.name.models import ImportantDateName
 from ietf.utils.history import find_history_active_at, find_history_replacements_active_at
 from ietf.utils.mail import send_mail
-from ietf.utils.pipe import pipe
+from ietf.utils.pdf import pdf_pages
+from ietf.utils.pipe import run
 
 def find_ads_for_meeting(meeting):
     ads = []
@@ -218,9 +227,20 @@ def read_session_file(type, num, doc):
 def read_agenda_file(num, doc):
     return read_session_file('agenda', num, doc)
 
+# Line patterns for convert_draft_to_pdf(), compiled once rather than for
+# every line of every draft
+DRAFT_TRAILING_WHITESPACE_RE = re.compile("[ \t]+$")
+DRAFT_PAGE_END_RE = re.compile("\[?[Pp]age [0-9ivx]+\]?[ \t]*$")
+DRAFT_FORMFEED_RE = re.compile("^[ \t]*\f")
+DRAFT_PAGE_HEADER_RE = re.compile("^ *INTERNET.DRAFT.+[0-9]+ *$|^ *Internet.Draft.+[0-9]+ *$|^draft-[-a-z0-9_.]+.*[0-9][0-9][0-9][0-9]$|^RFC.+[0-9]+$")
+DRAFT_BLANK_LINE_RE = re.compile("^[ \t]*$")
+
+def draft_pdf_path(doc_name):
+    return os.path.join(settings.INTERNET_DRAFT_PDF_PATH, doc_name + ".pdf")
+
 def convert_draft_to_pdf(doc_name):
     inpath = os.path.join(settings.IDSUBMIT_REPOSITORY_PATH, doc_name + ".txt")
-    outpath = os.path.join(settings.INTERNET_DRAFT_PDF_PATH, doc_name + ".pdf")
+    outpath = draft_pdf_path(doc_name)
 
     try:
         infile = open(inpath, "r")
@@ -235,19 +255,19 @@ def convert_draft_to_pdf(doc_name):
     newpage = 0;
     formfeed = 0;
     for line in infile:
-        line = re.sub("\r","",line)
-        line = re.sub("[ \t]+$","",line)
-        if re.search("\[?[Pp]age [0-9ivx]+\]?[ \t]*$",line):
+        line = line.replace("\r", "")
+        line = DRAFT_TRAILING_WHITESPACE_RE.sub("",line)
+        if DRAFT_PAGE_END_RE.search(line):
             pageend=1
             tempfile.write(line)
             continue
-        if re.search("^[ \t]*\f",line):
+        if DRAFT_FORMFEED_RE.search(line):
             formfeed=1
             tempfile.write(line)
             continue
-        if re.search("^ *INTERNET.DRAFT.+[0-9]+ *$",line) or re.search("^ *Internet.Draft.+[0-9]+ *$",line) or re.search("^draft-[-a-z0-9_.]+.*[0-9][0-9][0-9][0-9]$",line) or re.search("^RFC.+[0-9]+$",line):
+        if DRAFT_PAGE_HEADER_RE.search(line):
             newpage=1
-        if re.search("^[ \t]*$",line) and pageend and not newpage:
+        if pageend and not newpage and DRAFT_BLANK_LINE_RE.search(line):
             continue
         if pageend and newpage and not formfeed:
             tempfile.write("\f")
@@ -260,10 +280,188 @@ def convert_draft_to_pdf(doc_name):
     tempfile.close()
     t,psname = mkstemp()
     os.close(t)
-    pipe("enscript --margins 76::76: -B -q -p "+psname + " " +tempname)
+    run(["enscript", "--margins", "76::76:", "-B", "-q", "-p", psname, tempname], timeout=settings.MEETING_DRAFT_PDF_COMMAND_TIMEOUT)
     os.unlink(tempname)
-    pipe("ps2pdf "+psname+" "+outpath)
+    # convert to a temporary file beside the final one and rename it into
+    # place, so a concurrent request never picks up a half-written PDF
+    t,pdfname = mkstemp(dir=os.path.dirname(outpath), prefix=".%s." % os.path.basename(outpath))
+    os.close(t)
+    run(["ps2pdf", psname, pdfname], timeout=settings.MEETING_DRAFT_PDF_COMMAND_TIMEOUT)
     os.unlink(psname)
+    if os.path.getsize(pdfname):
+        os.chmod(pdfname, 0644)
+        os.rename(pdfname, outpath)
+    else:
+        os.unlink(pdfname)
+
+def ensure_draft_pdf(doc_name):
+    """Convert the draft to PDF unless that has been done already.  Returns
+    the path of the PDF, or None if the draft couldn't be converted."""
+    path = draft_pdf_path(doc_name)
+    if not os.path.exists(path):
+        convert_draft_to_pdf(doc_name)
+    return path if os.path.exists(path) else None
+
+def session_draft_list(num, acronym):
+    try:
+        agendas = Document.objects.filter(type="agenda",
+                                         session__meeting__number=num,
+                                         session__group__acronym=acronym,
+                                         states=State.objects.get(type="agenda", slug="active")).distinct()
+    except Document.DoesNotExist:
+        raise Http404
+
+    drafts = set()
+    for agenda in agendas:
+        content, _ = read_agenda_file(num, agenda)
+        if content:
+            drafts.update(re.findall('(draft-[-a-z0-9]*)', content))
+
+    result = []
+    for draft in drafts:
+        try:
+            if re.search('-[0-9]{2}$', draft):
+                doc_name = draft
+            else:
+                doc = Document.objects.get(name=draft)
+                doc_name = draft + "-" + doc.rev
+
+            if doc_name not in result:
+                result.append(doc_name)
+        except Document.DoesNotExist:
+            pass
+
+    for sp in SessionPresentation.objects.filter(session__meeting__number=num, session__group__acronym=acronym, document__type='draft').select_related("document"):
+        doc_name = sp.document.name + "-" + sp.document.rev
+        if doc_name not in result:
+            result.append(doc_name)
+
+    return sorted(result)
+
+def session_draft_bundle_path(num, acronym, drafts, kind):
+    """Path of the combined PDF or tarball ("pdf" or "tgz") of the drafts of
+    a session.  The name includes a digest of the draft names with their
+    revisions and of which of them have been converted, so a changed
+    draft list or a new revision gives a new bundle."""
+    found = [ d for d in drafts if os.path.exists(draft_pdf_path(d)) ]
+    digest = hashlib.sha1("\n".join(drafts) + "\n\n" + "\n".join(found)).hexdigest()[:16]
+    return os.path.join(settings.MEETING_SESSION_DRAFT_BUNDLE_PATH, "%s-%s-%s.%s" % (num, acronym, digest, kind))
+
+def write_session_draft_pdf(drafts, outpath):
+    curr_page = 1
+    pmh, pmn = mkstemp()
+    os.close(pmh)
+    pdfmarks = open(pmn, "w")
+    pdf_list = []
+
+    for draft in drafts:
+        pdf_path = draft_pdf_path(draft)
+        if os.path.exists(pdf_path):
+            pages = pdf_pages(pdf_path)
+            pdfmarks.write("[/Page "+str(curr_page)+" /View [/XYZ 0 792 1.0] /Title (" + draft + ") /OUT pdfmark\n")
+            pdf_list.append(pdf_path)
+            curr_page = curr_page + pages
+
+    pdfmarks.close()
+    run(["gs", "-dBATCH", "-dNOPAUSE", "-q", "-sDEVICE=pdfwrite", "-sOutputFile=" + outpath] + pdf_list + [pmn],
+        timeout=settings.MEETING_DRAFT_PDF_COMMAND_TIMEOUT)
+    os.unlink(pmn)
+
+def write_session_draft_tarfile(drafts, outpath):
+    manifest = []
+    with tarfile.open(outpath, 'w:gz') as tarstream:
+        for doc_name in drafts:
+            pdf_path = draft_pdf_path(doc_name)
+            if os.path.exists(pdf_path):
+                try:
+                    tarstream.add(pdf_path, str(doc_name + ".pdf"))
+                    manifest.append("Included:  "+pdf_path+"\n")
+                except Exception, e:
+                    manifest.append(("Failed (%s): "%e)+pdf_path+"\n")
+            else:
+                manifest.append("Not found: "+pdf_path+"\n")
+
+        manifest = "".join(manifest)
+        info = tarfile.TarInfo(name="manifest.txt")
+        info.size = len(manifest)
+        info.mtime = time.time()
+        tarstream.addfile(info, StringIO(manifest))
+
+def build_session_draft_bundle(num, acronym, drafts, kind):
+    """Build the combined PDF or tarball of the given session drafts, unless
+    an up-to-date one exists already, and remove outdated ones.  Returns
+    the path of the bundle."""
+    path = session_draft_bundle_path(num, acronym, drafts, kind)
+    if os.path.exists(path):
+        return path
+
+    dirname = os.path.dirname(path)
+    if not os.path.exists(dirname):
+        try:
+            os.makedirs(dirname)
+        except OSError:
+            pass                        # created by a concurrent request
+
+    t, tmp_path = mkstemp(dir=dirname, prefix=".%s." % os.path.basename(path))
+    os.close(t)
+    try:
+        if kind == "pdf":
+            write_session_draft_pdf(drafts, tmp_path)
+        else:
+            write_session_draft_tarfile(drafts, tmp_path)
+        os.chmod(tmp_path, 0644)
+        os.rename(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+    outdated = re.compile(r"^%s-%s-[0-9a-f]{16}\.%s$" % (re.escape(num), re.escape(acronym), kind))
+    for filename in os.listdir(dirname):
+        if outdated.match(filename) and filename != os.path.basename(path):
+            try:
+                os.unlink(os.path.join(dirname, filename))
+            except OSError:
+                pass
+    return path
+
+def session_draft_bundle(num, acronym, kind):
+    """Return the path of the combined PDF or tarball of the drafts of the
+    sessions of a group at a meeting, converting drafts and building the
+    bundle if it hasn't been pregenerated."""
+    drafts = session_draft_list(num, acronym)
+    for doc_name in drafts:
+        ensure_draft_pdf(doc_name)
+    return build_session_draft_bundle(num, acronym, drafts, kind)
+
+def _build_session_draft_bundle(spec):
+    return build_session_draft_bundle(*spec)
+
+def pregenerate_session_draft_bundles(meeting, processes=1):
+    """Convert all drafts referenced by the session agendas and materials
+    of the meeting to PDF, and build the combined PDF and tarball for
+    each group, spread over several worker processes.  Returns the
+    number of drafts converted and the list of bundle paths."""
+    acronyms = sorted(set(Session.objects.filter(meeting=meeting, group__isnull=False).values_list("group__acronym", flat=True)))
+    draft_lists = [ (acronym, session_draft_list(meeting.number, acronym)) for acronym in acronyms ]
+    missing = sorted(set(d for acronym, drafts in draft_lists for d in drafts if not os.path.exists(draft_pdf_path(d))))
+    specs = [ (meeting.number, acronym, drafts, kind) for acronym, drafts in draft_lists if drafts for kind in ("pdf", "tgz") ]
+
+    if processes <= 1:
+        converted = [ ensure_draft_pdf(d) for d in missing ]
+        paths = [ _build_session_draft_bundle(spec) for spec in specs ]
+    else:
+        # the forked workers don't use the database, but mustn't share the
+        # connection inherited from this process either
+        connections.close_all()
+        pool = multiprocessing.Pool(processes)
+        try:
+            converted = pool.map(ensure_draft_pdf, missing)
+            paths = pool.map(_build_session_draft_bundle, specs)
+        finally:
+            pool.close()
+            pool.join()
+
+    return len([ p for p in converted if p ]), paths
 
 def agenda_permissions(meeting, schedule, user):
     # do this in positive logic.
@@ -296,6 +494,52 @@ def session_constraint_expire(request,session):
     if key is not None and cache.has_key(key):
         cache.delete(key)
 
+def json_agenda_cache_key(num):
+    return "meeting:agenda_json:%s" % num
+
+def agenda_version_cache_key(num, kind="agenda"):
+    return "meeting:%s_version:%s" % (kind, num)
+
+def get_agenda_version(num, kind="agenda"):
+    """Opaque token which is replaced whenever the agenda data of the
+    meeting changes, see invalidate_agenda_caches().  The "placement"
+    kind only changes with the sessions, timeslots, rooms and
+    constraints, not with the assignments and materials."""
+    key = agenda_version_cache_key(num, kind)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(key, version, None)
+    return version
+
+def invalidate_agenda_caches(numbers, placement_data=False):
+    """Throw away the cached agenda.json snapshots and agenda renderings of
+    the given meetings, and of the current meeting, which is served
+    without a number."""
+    numbers = set(numbers) | set([None])
+    keys = [ json_agenda_cache_key(num) for num in numbers ]
+    keys += [ agenda_version_cache_key(num) for num in numbers if num is not None ]
+    if placement_data:
+        keys += [ agenda_version_cache_key(num, "placement") for num in numbers if num is not None ]
+    cache.delete_many(keys)
+
+def agenda_render_cache_key(schedule, *args):
+    """Cache key for a rendering of a schedule, further distinguished by
+    args (format, utc flag and the like).  It changes when the
+    assignments, sessions, timeslots or session materials are modified,
+    and when the caches are invalidated on changes the modification
+    times don't show, like deleted assignments."""
+    meeting = schedule.meeting
+    modified = [
+        schedule.assignments.aggregate(Max('modified'))["modified__max"],
+        meeting.session_set.aggregate(Max('modified'))["modified__max"],
+        meeting.timeslot_set.aggregate(Max('modified'))["modified__max"],
+        NewRevisionDocEvent.objects.filter(type="new_revision", doc__sessionpresentation__session__meeting=meeting).aggregate(Max('time'))["time__max"],
+    ]
+    modified = max([ t for t in modified if t ] or [None])
+    key = u":".join([ unicode(v) for v in (schedule.pk, get_agenda_version(meeting.number), modified) + args ])
+    return "meeting:agenda_render:%s" % hashlib.sha1(key.encode("utf-8")).hexdigest()
+
 # -------------------------------------------------
 # Interim Meeting Helpers
 # -------------------------------------------------
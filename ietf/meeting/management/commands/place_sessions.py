@@ -0,0 +1,65 @@
+# Copyright The IETF Trust 2018, All Rights Reserved
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand, CommandError
+
+import debug                            # pyflakes:ignore
+
+from ietf.meeting.models import Meeting, Schedule
+from ietf.meeting.placement import ScheduleData, Placement, anneal, save_placement
+from ietf.person.models import Person
+
+class Command(BaseCommand):
+
+    help = ("Places the sessions of a meeting in its timeslots automatically, "
+            "keeping the pinned assignments of the base schedule, and saves "
+            "each candidate as a new schedule with its badness filled in.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('meeting', help="Meeting number")
+        parser.add_argument('--base', help="Name of the schedule to start from, default the official agenda")
+        parser.add_argument('--name', default="auto", help="Prefix for the names of the new schedules (default %(default)s)")
+        parser.add_argument('--owner', help="Email address of the owner of the new schedules, default (System)")
+        parser.add_argument('--count', type=int, default=1, help="Number of candidate schedules to generate (default %(default)s)")
+        parser.add_argument('--time', type=float, default=60, help="Time budget in seconds for each candidate (default %(default)s)")
+        parser.add_argument('--seed', type=int, help="Random seed, for reproducible runs")
+
+    def handle(self, *args, **options):
+        if len(options["name"]) > 10:
+            raise CommandError("The name prefix must be at most 10 characters, to leave room for the number")
+
+        meeting = Meeting.objects.filter(number=options["meeting"]).first()
+        if not meeting:
+            raise CommandError("Meeting not found: %s" % options["meeting"])
+
+        if options["owner"]:
+            owner = Person.objects.filter(email__address=options["owner"]).first()
+            if not owner:
+                raise CommandError("No person with email address %s" % options["owner"])
+        else:
+            owner = Person.objects.get(name="(System)")
+
+        if options["base"]:
+            base = Schedule.objects.filter(meeting=meeting, name=options["base"]).first()
+            if not base:
+                raise CommandError("Schedule not found: %s" % options["base"])
+        else:
+            base = meeting.agenda
+
+        data = ScheduleData(meeting)
+        seed = options["seed"]
+        taken = set(Schedule.objects.filter(meeting=meeting, owner=owner).values_list("name", flat=True))
+        n = 0
+        for i in range(options["count"]):
+            placement = Placement.from_schedule(data, base)
+            placement.place_unplaced()
+            badness = anneal(placement, time_budget=options["time"], seed=seed + i if seed is not None else None)
+
+            n += 1
+            while "%s-%s" % (options["name"], n) in taken:
+                n += 1
+            name = "%s-%s" % (options["name"], n)
+            taken.add(name)
+
+            schedule = save_placement(placement, name, owner, base_schedule=base)
+            self.stdout.write("%s: badness %s\n" % (schedule.name, badness))
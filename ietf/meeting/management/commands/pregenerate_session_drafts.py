@@ -0,0 +1,41 @@
+# Copyright The IETF Trust 2018, All Rights Reserved
+
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import Http404
+
+import debug                            # pyflakes:ignore
+
+from ietf.meeting.helpers import get_meeting, pregenerate_session_draft_bundles
+from ietf.utils.log import log
+
+class Command(BaseCommand):
+    help = (u"Convert the drafts referenced by the session agendas and materials of a "
+            u"meeting to PDF, and build the combined PDF and tarball of drafts for each "
+            u"session, so the session draft downloads are served without delay during "
+            u"the meeting.  Bundles which are up to date are left alone, so this can be "
+            u"run repeatedly, for instance from cron in the weeks before the meeting.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("meeting", nargs="?",
+            help="meeting number, default the upcoming or ongoing IETF meeting")
+        parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count(),
+            help="number of worker processes to convert drafts in (default: %(default)s)")
+
+    def handle(self, *args, **options):
+        try:
+            meeting = get_meeting(options["meeting"])
+        except Http404 as e:
+            if options["meeting"]:
+                raise CommandError(unicode(e))
+            return                      # no upcoming meeting, nothing to do
+
+        start = time.time()
+        converted, paths = pregenerate_session_draft_bundles(meeting, processes=options["processes"])
+        msg = "Converted %s drafts and prepared %s session draft bundles for IETF %s in %.1fs" % (
+            converted, len(paths), meeting.number, time.time() - start)
+        log(msg)
+        if options["verbosity"] > 1:
+            self.stdout.write(msg + "\n")
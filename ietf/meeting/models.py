@@ -11,6 +11,7 @@ import debug                            # pyflakes:ignore
 
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import signals
 from django.db.models import Max
 from django.conf import settings
 # mostly used by json_dict()
@@ -19,7 +20,7 @@ from django.template.defaultfilters import date as date_format
 from django.utils.text import slugify
 
 from ietf.dbtemplate.models import DBTemplate
-from ietf.doc.models import Document
+from ietf.doc.models import Document, DocEvent, NewRevisionDocEvent
 from ietf.group.models import Group
 from ietf.group.utils import can_manage_materials
 from ietf.name.models import MeetingTypeName, TimeSlotTypeName, SessionStatusName, ConstraintName, RoomResourceName, ImportantDateName
@@ -744,10 +745,7 @@ class SchedTimeSessAssignment(models.Model):
 
     def json_url(self):
         if not hasattr(self, '_cached_json_url'):
-            self._cached_json_url =  "/meeting/%s/agenda/%s/%s/session/%u.json" % (
-                                        self.schedule.meeting.number,
-                                        self.schedule.owner_email(),
-                                        self.schedule.name, self.id )
+            self._cached_json_url =  "%s/session/%u.json" % (self.schedule.base_url(), self.id)
         return self._cached_json_url
 
     def json_dict(self, host_scheme):
@@ -755,23 +753,28 @@ class SchedTimeSessAssignment(models.Model):
             ss = dict()
             ss['assignment_id'] = self.id
             ss['href']          = urljoin(host_scheme, self.json_url())
-            ss['timeslot_id'] = self.timeslot.id
-
-            efset = self.session.timeslotassignments.filter(schedule=self.schedule).order_by("timeslot__time")
-            if efset.count() > 1:
-                # now we know that there is some work to do finding the extendedfrom_id.
-                # loop through the list of items
-                previous = None
-                for efss in efset:
-                    if efss.pk == self.pk:
-                        extendedfrom = previous
-                        break
-                    previous = efss
-                if extendedfrom is not None:
-                    ss['extendedfrom_id']  = extendedfrom.id
-
-            if self.session:
-                ss['session_id']  = self.session.id
+            ss['timeslot_id'] = self.timeslot_id
+
+            if hasattr(self, "previous_assignment_of_session"):
+                # filled in for a whole schedule by the bulk serialization in ajax.py
+                if self.previous_assignment_of_session is not None:
+                    ss['extendedfrom_id'] = self.previous_assignment_of_session.id
+            else:
+                efset = self.session.timeslotassignments.filter(schedule=self.schedule).order_by("timeslot__time")
+                if efset.count() > 1:
+                    # now we know that there is some work to do finding the extendedfrom_id.
+                    # loop through the list of items
+                    previous = None
+                    for efss in efset:
+                        if efss.pk == self.pk:
+                            extendedfrom = previous
+                            break
+                        previous = efss
+                    if extendedfrom is not None:
+                        ss['extendedfrom_id']  = extendedfrom.id
+
+            if self.session_id:
+                ss['session_id']  = self.session_id
             ss["pinned"]   = self.pinned
             self._cached_json_dict = ss
         return self._cached_json_dict
@@ -1146,3 +1149,53 @@ class ImportantDate(models.Model):
 
     def __unicode__(self):
         return u'%s : %s : %s' % ( self.meeting, self.name, self.date )
+
+
+def agenda_data_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if isinstance(instance, Meeting):
+        numbers = [instance.number]
+    else:
+        if isinstance(instance, SchedTimeSessAssignment):
+            meeting_ids = Schedule.objects.filter(pk=instance.schedule_id).values_list("meeting", flat=True)
+        elif isinstance(instance, SessionPresentation):
+            meeting_ids = Session.objects.filter(pk=instance.session_id).values_list("meeting", flat=True)
+        else:
+            meeting_ids = [instance.meeting_id]
+        numbers = Meeting.objects.filter(pk__in=meeting_ids).values_list("number", flat=True)
+
+    # the placement data doesn't depend on the assignments and materials
+    placement_data = not isinstance(instance, (Schedule, SchedTimeSessAssignment, SessionPresentation, FloorPlan))
+
+    from ietf.meeting.helpers import invalidate_agenda_caches
+    invalidate_agenda_caches(numbers, placement_data=placement_data)
+
+material_types = ("agenda", "minutes", "slides", "bluesheets", "recording")
+
+def material_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if sender is Document:
+        doc = instance
+        if doc.type_id not in material_types:
+            return
+    else:
+        # new revisions of drafts, and any change to the other materials
+        doc = instance.doc
+        if doc.type_id not in material_types and not (doc.type_id == "draft" and instance.type == "new_revision"):
+            return
+
+    numbers = Session.objects.filter(materials=doc).values_list("meeting__number", flat=True).distinct()
+    if numbers:
+        from ietf.meeting.helpers import invalidate_agenda_caches
+        invalidate_agenda_caches(numbers)
+
+for model in (Meeting, Schedule, Session, SchedTimeSessAssignment, TimeSlot, Room, FloorPlan, SessionPresentation, Constraint):
+    signals.post_save.connect(agenda_data_changed, sender=model)
+    signals.post_delete.connect(agenda_data_changed, sender=model)
+# DocEvent subclasses send post_save with their own class as sender, the
+# material events are DocEvents and NewRevisionDocEvents.  Changes to the
+# SessionPresentations are handled by agenda_data_changed() above.
+for model in (Document, DocEvent, NewRevisionDocEvent):
+    signals.post_save.connect(material_changed, sender=model)
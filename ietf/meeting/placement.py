@@ -0,0 +1,440 @@
+# Copyright The IETF Trust 2018, All Rights Reserved
+"""Automatic placement of the sessions of a meeting in its timeslots.
+
+The sessions, timeslots and constraints of a meeting are loaded into
+plain lists indexed by position (ScheduleData).  A Placement holds the
+slot of each session and can tell what moving a session would do to the
+badness of the schedule by looking only at the sessions it is tied to,
+which is what makes it cheap enough to run many thousands of moves a
+second in anneal().
+"""
+
+import math
+import random
+import threading
+import time
+from collections import defaultdict, OrderedDict
+
+import debug                            # pyflakes:ignore
+
+from ietf.meeting.helpers import get_agenda_version
+from ietf.meeting.models import Constraint, Schedule, SchedTimeSessAssignment
+
+# Penalties for things that aren't expressed as constraints; the
+# constraint penalties come from ConstraintName.penalty
+UNPLACED_PENALTY = 1000000              # session not in any timeslot
+SAME_GROUP_PENALTY = 100000             # two sessions of a group at the same time
+DURATION_PENALTY = 50000                # timeslot shorter than the requested duration
+RESOURCE_PENALTY = 5000                 # per requested resource the room doesn't have
+CAPACITY_PENALTY = 10                   # per attendee more than the room holds
+
+# number of schedules kept in memory for scoring moves in the editor
+MAX_CACHED_PLACEMENTS = 20
+
+
+class ScheduleData(object):
+    """The sessions that can meet, the session timeslots, and what the
+    constraints make each of them cost, for one meeting."""
+
+    def __init__(self, meeting):
+        self.meeting = meeting
+
+        sessions = list(meeting.sessions_that_can_meet.select_related("group").prefetch_related("resources").order_by("pk"))
+        self.session_ids = [ s.pk for s in sessions ]
+        self.session_index = dict((pk, i) for i, pk in enumerate(self.session_ids))
+        self.session_attendees = [ s.attendees or 0 for s in sessions ]
+        self.session_duration = [ int(s.requested_duration.total_seconds()) for s in sessions ]
+        self.session_resources = [ frozenset(r.pk for r in s.resources.all()) for s in sessions ]
+
+        timeslots = list(meeting.timeslot_set.filter(type="session").select_related("location").prefetch_related("location__resources").order_by("time", "pk"))
+        self.timeslot_ids = [ t.pk for t in timeslots ]
+        self.timeslot_index = dict((pk, i) for i, pk in enumerate(self.timeslot_ids))
+        self.slot_start = [ t.time for t in timeslots ]
+        self.slot_end = [ t.end_time() for t in timeslots ]
+        self.slot_day = [ t.time.date() for t in timeslots ]
+        self.slot_duration = [ int(t.duration.total_seconds()) for t in timeslots ]
+        self.slot_capacity = [ t.location.capacity if t.location and t.location.capacity else None for t in timeslots ]
+        self.slot_resources = [ frozenset(r.pk for r in t.location.resources.all()) if t.location else frozenset() for t in timeslots ]
+
+        # the slots overlapping each slot in time, the slot itself included;
+        # the slots are ordered by start time, so only the following slots
+        # starting before a slot ends need to be looked at
+        overlaps = [ set([i]) for i in range(len(timeslots)) ]
+        for i in range(len(timeslots)):
+            j = i + 1
+            while j < len(timeslots) and self.slot_start[j] < self.slot_end[i]:
+                if self.slot_start[i] < self.slot_end[j]:
+                    overlaps[i].add(j)
+                    overlaps[j].add(i)
+                j += 1
+        self.overlaps = [ frozenset(o) for o in overlaps ]
+
+        # penalties for pairs of sessions meeting at the same time, kept on
+        # both sessions so the cost of a session can be found locally
+        self.neighbours = [ {} for s in sessions ]
+        # penalties for meeting on particular days
+        self.avoid_days = [ {} for s in sessions ]
+
+        group_sessions = defaultdict(list)
+        for s in sessions:
+            group_sessions[s.group_id].append(self.session_index[s.pk])
+
+        for l in group_sessions.values():
+            for i, a in enumerate(l):
+                for b in l[i+1:]:
+                    self.add_pair_penalty(a, b, SAME_GROUP_PENALTY)
+
+        people_groups = defaultdict(list)
+        for c in Constraint.objects.filter(meeting=meeting).select_related("name"):
+            if c.name_id.startswith("conflic"):
+                for a in group_sessions.get(c.source_id, []):
+                    for b in group_sessions.get(c.target_id, []):
+                        self.add_pair_penalty(a, b, c.name.penalty)
+            elif c.name_id == "bethere" and c.person_id:
+                people_groups[c.person_id].append((c.source_id, c.name.penalty))
+            elif c.name_id == "avoidday" and c.day:
+                for a in group_sessions.get(c.source_id, []):
+                    day = c.day.date()
+                    self.avoid_days[a][day] = self.avoid_days[a].get(day, 0) + c.name.penalty
+
+        # a person who must be present at several groups can't be at two
+        # of them at once
+        for groups in people_groups.values():
+            for i, (g1, penalty) in enumerate(groups):
+                for g2, _ in groups[i+1:]:
+                    if g1 == g2:
+                        continue
+                    for a in group_sessions.get(g1, []):
+                        for b in group_sessions.get(g2, []):
+                            self.add_pair_penalty(a, b, penalty)
+
+    def add_pair_penalty(self, a, b, penalty):
+        if a == b or not penalty:
+            return
+        self.neighbours[a][b] = self.neighbours[a].get(b, 0) + penalty
+        self.neighbours[b][a] = self.neighbours[b].get(a, 0) + penalty
+
+    def slot_penalty(self, s, t):
+        """What it costs for session s to be in slot t, regardless of
+        where the other sessions are."""
+        penalty = 0
+        if self.slot_duration[t] < self.session_duration[s]:
+            penalty += DURATION_PENALTY
+        capacity = self.slot_capacity[t]
+        if capacity is not None and self.session_attendees[s] > capacity:
+            penalty += CAPACITY_PENALTY * (self.session_attendees[s] - capacity)
+        penalty += RESOURCE_PENALTY * len(self.session_resources[s] - self.slot_resources[t])
+        penalty += self.avoid_days[s].get(self.slot_day[t], 0)
+        return penalty
+
+
+class Placement(object):
+    """Sessions placed in slots, by position in the ScheduleData."""
+
+    def __init__(self, data):
+        self.data = data
+        self.slot_of = [ None for s in data.session_ids ]
+        self.session_in = [ None for t in data.timeslot_ids ]
+        self.pinned = [ False for s in data.session_ids ]
+        # slots taken by something the placement doesn't handle, like
+        # extensions of a session into a following slot
+        self.blocked = set()
+
+    @classmethod
+    def from_schedule(cls, data, schedule):
+        placement = cls(data)
+        if schedule is None:
+            return placement
+
+        assignments = schedule.assignments.filter(session__isnull=False).values_list("session", "timeslot", "pinned", "extendedfrom")
+        for session_id, timeslot_id, pinned, extendedfrom_id in assignments:
+            s = data.session_index.get(session_id)
+            t = data.timeslot_index.get(timeslot_id)
+            if t is None:
+                continue
+            if extendedfrom_id is not None or s is None or placement.slot_of[s] is not None or placement.session_in[t] is not None:
+                placement.blocked.add(t)
+                if s is not None:
+                    # don't separate a session from its extension
+                    placement.pinned[s] = True
+                continue
+            placement.place(s, t)
+            placement.pinned[s] = pinned
+
+        return placement
+
+    def place(self, s, t):
+        old = self.slot_of[s]
+        if old is not None:
+            self.session_in[old] = None
+        self.slot_of[s] = t
+        if t is not None:
+            self.session_in[t] = s
+
+    def session_badness(self, s):
+        """The cost of session s where it is, including the full penalty
+        of each pair it's part of."""
+        t = self.slot_of[s]
+        if t is None:
+            return UNPLACED_PENALTY
+        data = self.data
+        badness = data.slot_penalty(s, t)
+        overlaps = data.overlaps[t]
+        slot_of = self.slot_of
+        for n, penalty in data.neighbours[s].iteritems():
+            if slot_of[n] is not None and slot_of[n] in overlaps:
+                badness += penalty
+        return badness
+
+    def pair_badness(self, a, b):
+        t1, t2 = self.slot_of[a], self.slot_of[b]
+        if t1 is None or t2 is None or t2 not in self.data.overlaps[t1]:
+            return 0
+        return self.data.neighbours[a].get(b, 0)
+
+    def badness(self):
+        # pair penalties show up in the badness of both sessions
+        badness = 0
+        pairs = 0
+        for s, t in enumerate(self.slot_of):
+            session_badness = self.session_badness(s)
+            if t is not None:
+                pairs += session_badness - self.data.slot_penalty(s, t)
+            badness += session_badness
+        return badness - pairs // 2
+
+    def _cost(self, sessions):
+        cost = sum(self.session_badness(s) for s in sessions)
+        if len(sessions) == 2:
+            cost -= self.pair_badness(*sessions)
+        return cost
+
+    def can_move(self, s, t):
+        if self.pinned[s] or t in self.blocked or self.slot_of[s] == t:
+            return False
+        other = self.session_in[t]
+        return other is None or not self.pinned[other]
+
+    def move(self, s, t):
+        """Put session s in slot t, moving the session there, if any, to
+        the old slot of s."""
+        old = self.slot_of[s]
+        other = self.session_in[t]
+        if old is not None:
+            self.session_in[old] = other
+        if other is not None:
+            self.slot_of[other] = old
+        self.slot_of[s] = t
+        self.session_in[t] = s
+
+    def move_delta(self, s, t):
+        """The change in badness if session s was moved to slot t."""
+        old = self.slot_of[s]
+        other = self.session_in[t]
+        sessions = (s, other) if other is not None else (s,)
+
+        before = self._cost(sessions)
+        self.move(s, t)
+        after = self._cost(sessions)
+
+        # and back again
+        self.slot_of[s] = old
+        self.session_in[t] = other
+        if old is not None:
+            self.session_in[old] = s
+        if other is not None:
+            self.slot_of[other] = t
+
+        return after - before
+
+    def place_unplaced(self):
+        """Put each unplaced session in the free slot where it costs the
+        least, the most constrained sessions first."""
+        data = self.data
+        free = [ t for t in range(len(data.timeslot_ids)) if self.session_in[t] is None and t not in self.blocked ]
+        unplaced = [ s for s in range(len(data.session_ids)) if self.slot_of[s] is None and not self.pinned[s] ]
+        unplaced.sort(key=lambda s: -sum(data.neighbours[s].values()))
+        for s in unplaced:
+            if not free:
+                break
+            best = None
+            for t in free:
+                self.place(s, t)
+                badness = self.session_badness(s)
+                if best is None or badness < best[0]:
+                    best = (badness, t)
+            self.place(s, best[1])
+            free.remove(best[1])
+
+
+def anneal(placement, time_budget=None, iterations=None, seed=None, initial_temperature=10000.0, final_temperature=1.0):
+    """Improve the placement with simulated annealing, moving and swapping
+    sessions that aren't pinned, until the time budget (in seconds) or
+    the number of iterations is used up.  The placement is left at the
+    best state seen, and its badness returned."""
+    assert time_budget or iterations
+
+    rng = random.Random(seed)
+    data = placement.data
+    movable = [ s for s in range(len(data.session_ids)) if not placement.pinned[s] ]
+    slots = [ t for t in range(len(data.timeslot_ids)) if t not in placement.blocked ]
+
+    current = placement.badness()
+    best = current
+    best_slots = list(placement.slot_of)
+    if not movable or not slots:
+        return best
+
+    start = time.time()
+    temperature = initial_temperature
+    i = 0
+    while True:
+        if i % 100 == 0:
+            if time_budget:
+                progress = (time.time() - start) / time_budget
+            else:
+                progress = float(i) / iterations
+            if progress >= 1 or (iterations and i >= iterations):
+                break
+            temperature = initial_temperature * (final_temperature / initial_temperature) ** progress
+        i += 1
+
+        s = rng.choice(movable)
+        t = rng.choice(slots)
+        if not placement.can_move(s, t):
+            continue
+
+        delta = placement.move_delta(s, t)
+        if delta <= 0 or rng.random() < math.exp(-delta / temperature):
+            placement.move(s, t)
+            current += delta
+            if current < best:
+                best = current
+                best_slots = list(placement.slot_of)
+
+    placement.slot_of = [ None ] * len(data.session_ids)
+    placement.session_in = [ None ] * len(data.timeslot_ids)
+    for s, t in enumerate(best_slots):
+        if t is not None:
+            placement.place(s, t)
+
+    return best
+
+
+def save_placement(placement, name, owner, base_schedule=None):
+    """Write the placement to a new schedule, with the badness of each
+    assignment and of the schedule filled in.  Assignments in the base
+    schedule that the placement doesn't handle, like extensions and
+    assignments outside the session slots, are copied as they are."""
+    data = placement.data
+    schedule = Schedule.objects.create(meeting=data.meeting, name=name, owner=owner,
+                                       visible=False, public=False, badness=placement.badness())
+
+    assignments = []
+    for s, t in enumerate(placement.slot_of):
+        if t is not None:
+            assignments.append(SchedTimeSessAssignment(
+                schedule=schedule,
+                session_id=data.session_ids[s],
+                timeslot_id=data.timeslot_ids[t],
+                pinned=placement.pinned[s],
+                badness=placement.session_badness(s),
+            ))
+
+    if base_schedule:
+        blocked = set(data.timeslot_ids[t] for t in placement.blocked)
+        for a in base_schedule.assignments.filter(extendedfrom=None):
+            if a.session_id in data.session_index and a.timeslot_id in data.timeslot_index and a.timeslot_id not in blocked:
+                continue        # handled by the placement
+            assignments.append(SchedTimeSessAssignment(
+                schedule=schedule,
+                session_id=a.session_id,
+                timeslot_id=a.timeslot_id,
+                pinned=a.pinned,
+                notes=a.notes,
+                badness=a.badness,
+            ))
+
+    SchedTimeSessAssignment.objects.bulk_create(assignments)
+
+    if base_schedule:
+        # extensions point at the assignment they extend, which now has a new id
+        new_ids = dict(schedule.assignments.values_list("session", "id"))
+        for a in base_schedule.assignments.exclude(extendedfrom=None).select_related("extendedfrom"):
+            SchedTimeSessAssignment.objects.create(
+                schedule=schedule,
+                session_id=a.session_id,
+                timeslot_id=a.timeslot_id,
+                extendedfrom_id=new_ids.get(a.extendedfrom.session_id),
+                pinned=a.pinned,
+                notes=a.notes,
+                badness=a.badness,
+            )
+
+    return schedule
+
+
+_cached_schedule_data = OrderedDict()   # meeting id -> (version, ScheduleData)
+_cached_placements = OrderedDict()      # schedule id -> (version, Placement)
+schedule_placement_lock = threading.Lock()
+
+def _cached(cache, key, version, build):
+    entry = cache.pop(key, None)
+    if entry is None or entry[0] != version:
+        entry = (version, build())
+    cache[key] = entry
+    while len(cache) > MAX_CACHED_PLACEMENTS:
+        cache.popitem(last=False)
+    return entry[1]
+
+def schedule_placement(schedule):
+    """The placement of the assignments of a schedule.  It's kept in
+    memory between requests, the constraint data until the sessions,
+    timeslots, rooms or constraints of the meeting change, and the
+    placement itself until the assignments change.  Callers should hold
+    schedule_placement_lock while using it."""
+    meeting = schedule.meeting
+    data_version = get_agenda_version(meeting.number, "placement")
+    data = _cached(_cached_schedule_data, meeting.pk, data_version, lambda: ScheduleData(meeting))
+    version = (data_version, get_agenda_version(meeting.number))
+    return _cached(_cached_placements, schedule.pk, version, lambda: Placement.from_schedule(data, schedule))
+
+def score_move(schedule, session_id, timeslot_id):
+    """The badness of the schedule, and the change in badness if the
+    session was moved to the timeslot (swapping places with the session
+    there, if any).  Returns None if the session or timeslot isn't one
+    the placement deals with."""
+    with schedule_placement_lock:
+        placement = schedule_placement(schedule)
+        data = placement.data
+        s = data.session_index.get(session_id)
+        t = data.timeslot_index.get(timeslot_id)
+        if s is None or t is None:
+            return None
+        badness = placement.badness()
+        if placement.slot_of[s] == t:
+            return badness, 0
+        return badness, placement.move_delta(s, t)
+
+def update_schedule_badness(schedule):
+    """Store the badness of the schedule and of each of its assignments."""
+    with schedule_placement_lock:
+        placement = schedule_placement(schedule)
+        data = placement.data
+        session_badness = dict((data.session_ids[s], placement.session_badness(s)) for s, t in enumerate(placement.slot_of) if t is not None)
+        badness = placement.badness()
+
+    changed = defaultdict(list)
+    for pk, session_id, old_badness in schedule.assignments.filter(extendedfrom=None).values_list("pk", "session", "badness"):
+        new_badness = session_badness.get(session_id)
+        if new_badness is not None and new_badness != old_badness:
+            changed[new_badness].append(pk)
+    # update() rather than save(), so the cached placement stays valid
+    for new_badness, pks in changed.iteritems():
+        SchedTimeSessAssignment.objects.filter(pk__in=pks).update(badness=new_badness)
+
+    if schedule.badness != badness:
+        Schedule.objects.filter(pk=schedule.pk).update(badness=badness)
+        schedule.badness = badness
+
+    return badness
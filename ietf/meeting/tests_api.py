@@ -2,13 +2,19 @@ import datetime
 import json
 from urlparse import urlsplit
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse as urlreverse
 
 import debug                            # pyflakes:ignore
 
+from ietf.group.factories import GroupFactory, RoleFactory
 from ietf.group.models import Group
-from ietf.meeting.models import Schedule, TimeSlot, Session, SchedTimeSessAssignment, Meeting, Constraint
+from ietf.meeting.factories import SessionFactory, TimeSlotFactory
+from ietf.meeting.models import Schedule, TimeSlot, Session, SchedTimeSessAssignment, Meeting, Constraint, ResourceAssociation
 from ietf.meeting.test_data import make_meeting_test_data
+from ietf.name.models import ConstraintName
+from ietf.person.factories import PersonFactory
 from ietf.person.models import Person
 from ietf.utils.test_utils import TestCase
 from ietf.utils.mail import outbox
@@ -216,6 +222,55 @@ class ApiTests(TestCase):
         info = json.loads(r.content)
         self.assertEqual(len(info),schedule.assignments.count())
 
+    def test_editor_json_query_count(self):
+        meeting = make_meeting_test_data()
+        schedule = meeting.agenda
+        resource = ResourceAssociation.objects.first()
+        mars_session = Session.objects.filter(meeting=meeting, group__acronym="mars").first()
+        mars_session.resources.add(resource)
+        constraint = Constraint.objects.create(meeting=meeting, source=mars_session.group, target=Group.objects.get(acronym="ames"), name_id="conflict")
+        Constraint.objects.create(meeting=meeting, source=mars_session.group, person=Person.objects.get(user__username="ad"), name_id="bethere")
+        urls = [
+            urlreverse("ietf.meeting.ajax.sessions_json", kwargs=dict(num=meeting.number)),
+            urlreverse("ietf.meeting.ajax.assignments_json", kwargs=dict(num=meeting.number, owner=schedule.owner_email(), name=schedule.name)),
+            urlreverse("ietf.meeting.ajax.constraint_json", kwargs=dict(num=meeting.number, constraintid=constraint.pk)),
+            urlreverse("ietf.meeting.ajax.session_constraints", kwargs=dict(num=meeting.number, sessionid=mars_session.pk)),
+        ]
+
+        def query_counts():
+            counts = []
+            for url in urls:
+                with CaptureQueriesContext(connection) as queries:
+                    r = self.client.get(url)
+                self.assertEqual(r.status_code, 200)
+                json.loads(r.content)
+                counts.append(len(queries))
+            return counts
+
+        small = query_counts()
+
+        # a bigger meeting, with groups that have areas and ADs, sessions
+        # with resources, and a session extended into a second timeslot
+        area = Group.objects.get(acronym="farfut")
+        for i in range(10):
+            group = GroupFactory(parent=area)
+            RoleFactory(group=group, name_id="ad")
+            TimeSlotFactory(meeting=meeting)
+            session = SessionFactory(meeting=meeting, group=group, status_id="schedw")
+            session.resources.add(resource)
+            Constraint.objects.create(meeting=meeting, source=mars_session.group, target=group, name_id="conflict")
+            Constraint.objects.create(meeting=meeting, source=mars_session.group, person=PersonFactory(), name_id="bethere")
+        extended = SchedTimeSessAssignment.objects.filter(schedule=schedule, session=session).first()
+        SchedTimeSessAssignment.objects.create(schedule=schedule, session=session, extendedfrom=extended,
+                                               timeslot=TimeSlotFactory(meeting=meeting, time=extended.timeslot.end_time()))
+
+        self.assertEqual(query_counts(), small)
+
+        r = self.client.get(urls[1])
+        info = json.loads(r.content)
+        self.assertEqual(len(info), schedule.assignments.count())
+        self.assertEqual([ d["extendedfrom_id"] for d in info if "extendedfrom_id" in d ], [extended.pk])
+
 
     def test_slot_json(self):
         meeting = make_meeting_test_data()
@@ -455,6 +510,37 @@ class ApiTests(TestCase):
                          (url, r.status_code, r.content))
         self.assertTrue(SchedTimeSessAssignment.objects.get(pk=scheduled.pk).pinned)
 
+    def test_assignment_score(self):
+        meeting = make_meeting_test_data()
+        mars_scheduled = meeting.agenda.assignments.get(session__group__acronym="mars")
+        ames_scheduled = meeting.agenda.assignments.get(session__group__acronym="ames")
+        parallel_slot = TimeSlot.objects.create(meeting=meeting, type_id="session", location=mars_scheduled.timeslot.location,
+                                                duration=mars_scheduled.timeslot.duration, time=mars_scheduled.timeslot.time)
+        Constraint.objects.create(meeting=meeting, source=mars_scheduled.session.group, target=ames_scheduled.session.group, name_id="conflict")
+        penalty = ConstraintName.objects.get(slug="conflict").penalty
+
+        url = urlreverse("ietf.meeting.ajax.assignment_score",
+                         kwargs=dict(num=meeting.number, owner=meeting.agenda.owner_email(), name=meeting.agenda.name))
+        r = self.client.get(url, { "session_id": ames_scheduled.session_id, "timeslot_id": parallel_slot.pk })
+        self.assertEqual(r.status_code, 200)
+        info = json.loads(r.content)
+        self.assertEqual(info["badness"], 0)
+        self.assertEqual(info["delta"], penalty)
+
+        r = self.client.get(url, { "session_id": ames_scheduled.session_id })
+        self.assertEqual(r.status_code, 406)
+
+        # the badness is stored when the agenda is edited
+        ames_scheduled.timeslot = parallel_slot
+        ames_scheduled.save()
+        self.client.login(username="plain", password="plain+password")
+        r = self.client.put('/meeting/%s/agenda/%s/%s/session/%u.json' % (meeting.number, meeting.agenda.owner_email(), meeting.agenda.name, mars_scheduled.pk),
+                            { "pinned": True })
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(Schedule.objects.get(pk=meeting.agenda.pk).badness, penalty)
+        self.assertEqual(SchedTimeSessAssignment.objects.get(pk=mars_scheduled.pk).badness, penalty)
+        self.assertEqual(SchedTimeSessAssignment.objects.get(pk=ames_scheduled.pk).badness, penalty)
+
 class TimeSlotEditingApiTests(TestCase):
 
     def test_manipulate_timeslot(self):
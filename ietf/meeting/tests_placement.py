@@ -0,0 +1,79 @@
+# Copyright The IETF Trust 2018, All Rights Reserved
+from StringIO import StringIO
+
+from django.core.management import call_command
+
+import debug                            # pyflakes:ignore
+
+from ietf.group.models import Group
+from ietf.meeting.models import Schedule, TimeSlot, Session, SchedTimeSessAssignment, Room, Constraint
+from ietf.meeting.placement import ScheduleData, Placement, anneal, save_placement
+from ietf.meeting.test_data import make_meeting_test_data
+from ietf.person.models import Person
+from ietf.utils.test_utils import TestCase
+
+
+class PlacementTests(TestCase):
+    def make_conflicting_schedule(self):
+        meeting = make_meeting_test_data()
+        mars_session = Session.objects.filter(meeting=meeting, group__acronym="mars").first()
+        ames_session = Session.objects.filter(meeting=meeting, group__acronym="ames").first()
+        mars_slot = meeting.agenda.assignments.get(session=mars_session).timeslot
+
+        # a room in parallel with the one mars is in
+        room = Room.objects.create(meeting=meeting, name="Parallel Room", capacity=50)
+        room.session_types.add("session")
+        parallel_slot = TimeSlot.objects.create(meeting=meeting, type_id="session", location=room,
+                                                duration=mars_slot.duration, time=mars_slot.time)
+
+        schedule = Schedule.objects.create(meeting=meeting, owner=Person.objects.get(name="(System)"), name="conflicting")
+        SchedTimeSessAssignment.objects.create(schedule=schedule, session=mars_session, timeslot=mars_slot, pinned=True)
+        SchedTimeSessAssignment.objects.create(schedule=schedule, session=ames_session, timeslot=parallel_slot)
+        Constraint.objects.create(meeting=meeting, source=mars_session.group, target=Group.objects.get(acronym="ames"), name_id="conflict")
+
+        return meeting, schedule, mars_session, ames_session
+
+    def test_placement(self):
+        meeting, schedule, mars_session, ames_session = self.make_conflicting_schedule()
+
+        data = ScheduleData(meeting)
+        placement = Placement.from_schedule(data, schedule)
+        mars, ames = data.session_index[mars_session.pk], data.session_index[ames_session.pk]
+        self.assertTrue(placement.pinned[mars])
+        self.assertTrue(placement.pair_badness(mars, ames) > 0)
+
+        # the scoring of a single move agrees with scoring everything
+        before = placement.badness()
+        for t in range(len(data.timeslot_ids)):
+            if placement.can_move(ames, t):
+                delta = placement.move_delta(ames, t)
+                self.assertEqual(placement.badness(), before)
+                placement.move(ames, t)
+                self.assertEqual(placement.badness(), before + delta)
+                placement = Placement.from_schedule(data, schedule)
+
+        badness = anneal(placement, iterations=1000, seed=1)
+        self.assertTrue(badness < before)
+        self.assertEqual(placement.slot_of[mars], data.timeslot_index[schedule.assignments.get(session=mars_session).timeslot_id])
+        self.assertEqual(placement.pair_badness(mars, ames), 0)
+
+        new_schedule = save_placement(placement, "placed", schedule.owner, base_schedule=schedule)
+        self.assertEqual(new_schedule.badness, badness)
+        self.assertTrue(new_schedule.assignments.get(session=mars_session).pinned)
+        ames_slot = new_schedule.assignments.get(session=ames_session).timeslot
+        mars_slot = new_schedule.assignments.get(session=mars_session).timeslot
+        self.assertFalse(ames_slot.time < mars_slot.end_time() and mars_slot.time < ames_slot.end_time())
+
+    def test_place_sessions_command(self):
+        meeting, schedule, mars_session, ames_session = self.make_conflicting_schedule()
+
+        out = StringIO()
+        call_command("place_sessions", meeting.number, base=schedule.name, count=2, time=0.1, seed=1, stdout=out)
+        self.assertIn("auto-1: badness", out.getvalue())
+        self.assertIn("auto-2: badness", out.getvalue())
+        for name in ("auto-1", "auto-2"):
+            new_schedule = Schedule.objects.get(meeting=meeting, name=name)
+            self.assertTrue(new_schedule.badness is not None)
+            self.assertEqual(new_schedule.assignments.get(session=mars_session).timeslot_id,
+                             schedule.assignments.get(session=mars_session).timeslot_id)
+        self.assertEqual(Schedule.objects.get(pk=schedule.pk).assignments.count(), 2)
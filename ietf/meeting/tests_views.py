@@ -11,6 +11,10 @@ import debug           # pyflakes:ignore
 
 from django.urls import reverse as urlreverse
 from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
 from django.contrib.auth.models import User
 
 from mock import patch
@@ -18,7 +22,7 @@ from pyquery import PyQuery
 from StringIO import StringIO
 from bs4 import BeautifulSoup
 
-from ietf.doc.models import Document
+from ietf.doc.models import Document, DocEvent, NewRevisionDocEvent
 from ietf.group.models import Group, Role
 from ietf.meeting.helpers import can_approve_interim_request, can_view_interim_request
 from ietf.meeting.helpers import send_interim_approval_request
@@ -36,7 +40,7 @@ from ietf.person.factories import PersonFactory
 from ietf.group.factories import GroupFactory, GroupEventFactory
 from ietf.meeting.factories import ( SessionFactory, SessionPresentationFactory, ScheduleFactory,
     MeetingFactory, FloorPlanFactory, TimeSlotFactory )
-from ietf.doc.factories import DocumentFactory
+from ietf.doc.factories import DocumentFactory, CharterFactory
 from ietf.submit.tests import submission_file
 
 
@@ -45,10 +49,19 @@ class MeetingTests(TestCase):
         self.materials_dir = self.tempdir('materials')
         self.saved_agenda_path = settings.AGENDA_PATH
         settings.AGENDA_PATH = self.materials_dir
+        self.pdf_dir = self.tempdir('pdf')
+        self.saved_internet_draft_pdf_path = settings.INTERNET_DRAFT_PDF_PATH
+        settings.INTERNET_DRAFT_PDF_PATH = self.pdf_dir
+        self.bundle_dir = os.path.join(self.pdf_dir, 'sessions')
+        self.saved_meeting_session_draft_bundle_path = settings.MEETING_SESSION_DRAFT_BUNDLE_PATH
+        settings.MEETING_SESSION_DRAFT_BUNDLE_PATH = self.bundle_dir
 
     def tearDown(self):
         settings.AGENDA_PATH = self.saved_agenda_path
         shutil.rmtree(self.materials_dir)
+        settings.INTERNET_DRAFT_PDF_PATH = self.saved_internet_draft_pdf_path
+        settings.MEETING_SESSION_DRAFT_BUNDLE_PATH = self.saved_meeting_session_draft_bundle_path
+        shutil.rmtree(self.pdf_dir)
 
     def write_materials_file(self, meeting, doc, content):
         path = os.path.join(self.materials_dir, "%s/%s/%s" % (meeting.number, doc.type_id, doc.external_url))
@@ -253,6 +266,29 @@ class MeetingTests(TestCase):
         self.assertEqual(r.status_code,200)
         self.assertTrue(all([x in unicontent(r) for x in ['var all_items', 'maximize', 'draw_calendar', ]]))
 
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_agenda_render_cache(self):
+        cache.clear()
+        meeting = make_meeting_test_data()
+        url = urlreverse("ietf.meeting.views.agenda", kwargs=dict(num=meeting.number, ext=".txt"))
+        with CaptureQueriesContext(connection) as uncached:
+            r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        self.assertIn("mars", unicontent(r))
+
+        with CaptureQueriesContext(connection) as cached:
+            r2 = self.client.get(url)
+        self.assertEqual(r2.status_code, 200)
+        self.assertEqual(r2.content, r.content)
+        self.assertLess(len(cached), len(uncached))
+
+        # unscheduling a session doesn't show in the modification times,
+        # but invalidates the cached renderings
+        meeting.agenda.assignments.filter(session__group__acronym="mars").delete()
+        r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        self.assertNotEqual(r.content, r2.content)
+
     def test_materials(self):
         meeting = make_meeting_test_data()
         session = Session.objects.filter(meeting=meeting, group__acronym="mars").first()
@@ -500,6 +536,46 @@ class MeetingTests(TestCase):
         self.assertEqual(response.get('Content-Type'), 'application/pdf')
         os.unlink(filename)
 
+    def test_session_draft_bundles(self):
+        session = SessionFactory(group__type_id='wg',meeting__type_id='ietf')
+        doc = DocumentFactory(type_id='draft')
+        session.sessionpresentation_set.create(document=doc)
+        url = urlreverse('ietf.meeting.views.session_draft_tarfile', kwargs={'num':session.meeting.number,'acronym':session.group.acronym})
+
+        def bundles():
+            return sorted(f for f in os.listdir(self.bundle_dir) if f.endswith(".tgz"))
+
+        # the bundle is built on the first request and reused after that
+        r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        first = bundles()
+        self.assertEqual(len(first), 1)
+        with open(os.path.join(self.bundle_dir, first[0]), "w") as f:
+            f.write("cached")
+        r = self.client.get(url)
+        self.assertEqual(r.content, "cached")
+
+        # a changed draft list gives a new bundle, replacing the old one
+        session.sessionpresentation_set.create(document=DocumentFactory(type_id='draft'))
+        r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        self.assertNotEqual(r.content, "cached")
+        self.assertEqual(len(bundles()), 1)
+        self.assertNotEqual(bundles(), first)
+
+        # so does a new revision
+        second = bundles()
+        doc.rev = "01"
+        doc.save()
+        r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        self.assertNotEqual(bundles(), second)
+
+        # pregeneration prepares both bundles for the groups with drafts
+        shutil.rmtree(self.bundle_dir)
+        call_command("pregenerate_session_drafts", session.meeting.number, processes=1)
+        self.assertEqual(len([ name for name in os.listdir(self.bundle_dir) if session.group.acronym in name ]), 2)
+
     def test_current_materials(self):
         url = urlreverse('ietf.meeting.views.current_materials')
         response = self.client.get(url)
@@ -1668,6 +1744,47 @@ class IphoneAppJsonTests(TestCase):
         r = self.client.get(url)
         self.assertEqual(r.status_code,200)
 
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_iphone_app_json_conditional_get(self):
+        cache.clear()
+        make_meeting_test_data()
+        meeting = Meeting.objects.filter(type_id='ietf').order_by('id').last()
+        url = urlreverse('ietf.meeting.views.json_agenda',kwargs={'num':meeting.number})
+        r = self.client.get(url)
+        self.assertEqual(r.status_code,200)
+        etag = r['ETag']
+        last_modified = r['Last-Modified']
+
+        # polling clients are answered from the snapshot
+        with CaptureQueriesContext(connection) as queries:
+            r = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code,304)
+        self.assertEqual(len(queries), 0)
+        r = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(r.status_code,304)
+
+        # changing a session throws the snapshot away
+        session = meeting.agenda.assignments.filter(session__group__acronym='mars').first().session
+        session.name = "Changed session name"
+        session.save()
+        r = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code,200)
+        self.assertNotEqual(r['ETag'], etag)
+        self.assertIn("Changed session name", unicontent(r))
+
+        # events on documents which aren't materials leave it alone
+        etag = r['ETag']
+        charter = CharterFactory()
+        DocEvent.objects.create(doc=charter, rev=charter.rev, type="added_comment", by=PersonFactory(), desc="A comment")
+        r = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code,304)
+
+        # but a new revision of the slides of a session doesn't
+        slides = session.materials.filter(type='slides').first()
+        NewRevisionDocEvent.objects.create(doc=slides, rev=slides.rev, type="new_revision", by=PersonFactory(), desc="New revision available")
+        r = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code,200)
+
 class FinalizeProceedingsTests(TestCase):
     @patch('urllib2.urlopen')
     def test_finalize_proceedings(self, mock_urlopen):
@@ -3,16 +3,15 @@
 import csv
 import datetime
 import glob
+import hashlib
 import json
 import os
 import pytz
 import re
-import tarfile
 import urllib
 
 from calendar import timegm
-from collections import OrderedDict, Counter, deque
-from tempfile import mkstemp
+from collections import OrderedDict, Counter, deque, defaultdict
 from wsgiref.handlers import format_date_time
 
 import debug                            # pyflakes:ignore
@@ -23,6 +22,7 @@ from django.http import HttpResponse, HttpResponseRedirect, HttpResponseForbidde
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.validators import URLValidator
 from django.urls import reverse,reverse_lazy
@@ -30,7 +30,8 @@ from django.db.models import Min, Max, Q
 from django.forms.models import modelform_factory, inlineformset_factory
 from django.template import TemplateDoesNotExist
 from django.template.loader import render_to_string
-from django.utils.functional import curry
+from django.utils.cache import get_conditional_response
+from django.utils.functional import curry, SimpleLazyObject
 from django.views.decorators.cache import cache_page
 from django.utils.text import slugify
 from django.views.decorators.csrf import ensure_csrf_cookie, csrf_exempt
@@ -49,8 +50,9 @@ from ietf.meeting.helpers import get_all_assignments_from_schedule
 from ietf.meeting.helpers import get_modified_from_assignments
 from ietf.meeting.helpers import get_wg_list, find_ads_for_meeting
 from ietf.meeting.helpers import get_meeting, get_schedule, agenda_permissions, get_ietf_meeting
-from ietf.meeting.helpers import preprocess_assignments_for_agenda, read_agenda_file
-from ietf.meeting.helpers import convert_draft_to_pdf, get_earliest_session_date
+from ietf.meeting.helpers import json_agenda_cache_key, agenda_render_cache_key
+from ietf.meeting.helpers import preprocess_assignments_for_agenda
+from ietf.meeting.helpers import session_draft_bundle, get_earliest_session_date
 from ietf.meeting.helpers import can_view_interim_request, can_approve_interim_request
 from ietf.meeting.helpers import can_edit_interim_request
 from ietf.meeting.helpers import can_request_interim_meeting, get_announcement_initial
@@ -64,8 +66,6 @@ from ietf.secr.proceedings.proc_utils import (get_progress_stats, post_process,
     create_recording)
 from ietf.utils.decorators import require_api_key
 from ietf.utils.mail import send_mail_message, send_mail_text
-from ietf.utils.pipe import pipe
-from ietf.utils.pdf import pdf_pages
 from ietf.utils.text import xslugify
 from ietf.utils.validators import get_mime_type
 
@@ -474,12 +474,42 @@ def agenda(request, num=None, name=None, base=None, ext=None, owner=None, utc=""
         return render(request, "meeting/no-"+base+ext, {'meeting':meeting }, content_type=mimetype[ext])
 
     updated = meeting.updated()
-    filtered_assignments = schedule.assignments.exclude(timeslot__type__in=['lead','offagenda'])
-    filtered_assignments = preprocess_assignments_for_agenda(filtered_assignments, meeting)
+    render_cache_key = agenda_render_cache_key(schedule, base, ext, bool(utc))
+
+    def get_filtered_assignments():
+        filtered_assignments = schedule.assignments.exclude(timeslot__type__in=['lead','offagenda'])
+        return preprocess_assignments_for_agenda(filtered_assignments, meeting)
 
-    if ext == ".csv":
-        return agenda_csv(schedule, filtered_assignments)
+    if ext in (".txt", ".csv"):
+        content = cache.get(render_cache_key)
+        if content is None:
+            if ext == ".csv":
+                content = agenda_csv(schedule, get_filtered_assignments()).content
+            else:
+                content = render_to_string("meeting/"+base+ext, {
+                    "schedule": schedule,
+                    "filtered_assignments": get_filtered_assignments(),
+                    "updated": updated,
+                }, request=request)
+            cache.set(render_cache_key, content, settings.MEETING_AGENDA_RENDER_CACHE_TIME)
+        return HttpResponse(content, content_type=mimetype[ext])
+
+    # the agenda itself is a cached fragment of the page, so only work out
+    # the assignments and groups if it has to be rendered
+    filtered_assignments = SimpleLazyObject(get_filtered_assignments)
+    group_parents = SimpleLazyObject(lambda: agenda_group_parents(filtered_assignments))
+
+    return render(request, "meeting/"+base+ext, {
+        "schedule": schedule,
+        "filtered_assignments": filtered_assignments,
+        "updated": updated,
+        "group_parents": group_parents,
+        "render_cache_key": render_cache_key,
+        "render_cache_time": settings.MEETING_AGENDA_RENDER_CACHE_TIME,
+        "now": datetime.datetime.now(),
+    }, content_type=mimetype[ext])
 
+def agenda_group_parents(filtered_assignments):
     # extract groups hierarchy, it's a little bit complicated because
     # we can be dealing with historic groups
     seen = set()
@@ -504,13 +534,7 @@ def agenda(request, num=None, name=None, base=None, ext=None, owner=None, utc=""
 
         p.group_list.sort(key=lambda g: g.acronym)
 
-    return render(request, "meeting/"+base+ext, {
-        "schedule": schedule,
-        "filtered_assignments": filtered_assignments,
-        "updated": updated,
-        "group_parents": group_parents,
-        "now": datetime.datetime.now(),
-    }, content_type=mimetype[ext])
+    return group_parents
 
 def agenda_csv(schedule, filtered_assignments):
     response = HttpResponse(content_type="text/csv; charset=%s"%settings.DEFAULT_CHARSET)
@@ -621,7 +645,10 @@ def agenda_by_type(request, num=None, type=None, name=None, owner=None):
     assignments = schedule.assignments.order_by('session__type__slug','timeslot__time','session__group__acronym')
     if type:
         assignments = assignments.filter(session__type__slug=type)
-    return render(request,"meeting/agenda_by_type.html",{"meeting":meeting,"schedule":schedule,"assignments":assignments})
+    render_cache_key = agenda_render_cache_key(schedule, "by-type", type)
+    return render(request,"meeting/agenda_by_type.html",{"meeting":meeting,"schedule":schedule,"assignments":assignments,
+                                                         "render_cache_key":render_cache_key,
+                                                         "render_cache_time":settings.MEETING_AGENDA_RENDER_CACHE_TIME})
 
 @role_required('Area Director','Secretariat','IAB')
 def agenda_by_type_ics(request,num=None,type=None):
@@ -633,104 +660,17 @@ def agenda_by_type_ics(request,num=None,type=None):
     updated = meeting.updated()
     return render(request,"meeting/agenda.ics",{"schedule":schedule,"updated":updated,"assignments":assignments},content_type="text/calendar")
 
-def session_draft_list(num, acronym):
-    try:
-        agendas = Document.objects.filter(type="agenda",
-                                         session__meeting__number=num,
-                                         session__group__acronym=acronym,
-                                         states=State.objects.get(type="agenda", slug="active")).distinct()
-    except Document.DoesNotExist:
-        raise Http404
-
-    drafts = set()
-    for agenda in agendas:
-        content, _ = read_agenda_file(num, agenda)
-        if content:
-            drafts.update(re.findall('(draft-[-a-z0-9]*)', content))
-
-    result = []
-    for draft in drafts:
-        try:
-            if re.search('-[0-9]{2}$', draft):
-                doc_name = draft
-            else:
-                doc = Document.objects.get(name=draft)
-                doc_name = draft + "-" + doc.rev
-
-            if doc_name not in result:
-                result.append(doc_name)
-        except Document.DoesNotExist:
-            pass
-
-    for sp in SessionPresentation.objects.filter(session__meeting__number=num, session__group__acronym=acronym, document__type='draft'):
-        doc_name = sp.document.name + "-" + sp.document.rev
-        if doc_name not in result:
-            result.append(doc_name)
-
-    return sorted(result)
-
 def session_draft_tarfile(request, num, acronym):
-    drafts = session_draft_list(num, acronym);
-
-    response = HttpResponse(content_type='application/octet-stream')
+    path = session_draft_bundle(num, acronym, "tgz")
+    with open(path, "rb") as f:
+        response = HttpResponse(f.read(), content_type='application/octet-stream')
     response['Content-Disposition'] = 'attachment; filename=%s-drafts.tgz'%(acronym)
-    tarstream = tarfile.open('','w:gz',response)
-    mfh, mfn = mkstemp()
-    os.close(mfh)
-    manifest = open(mfn, "w")
-
-    for doc_name in drafts:
-        pdf_path = os.path.join(settings.INTERNET_DRAFT_PDF_PATH, doc_name + ".pdf")
-
-        if not os.path.exists(pdf_path):
-            convert_draft_to_pdf(doc_name)
-
-        if os.path.exists(pdf_path):
-            try:
-                tarstream.add(pdf_path, str(doc_name + ".pdf"))
-                manifest.write("Included:  "+pdf_path+"\n")
-            except Exception, e:
-                manifest.write(("Failed (%s): "%e)+pdf_path+"\n")
-        else:
-            manifest.write("Not found: "+pdf_path+"\n")
-
-    manifest.close()
-    tarstream.add(mfn, "manifest.txt")
-    tarstream.close()
-    os.unlink(mfn)
     return response
 
 def session_draft_pdf(request, num, acronym):
-    drafts = session_draft_list(num, acronym);
-    curr_page = 1
-    pmh, pmn = mkstemp()
-    os.close(pmh)
-    pdfmarks = open(pmn, "w")
-    pdf_list = ""
-
-    for draft in drafts:
-        pdf_path = os.path.join(settings.INTERNET_DRAFT_PDF_PATH, draft + ".pdf")
-        if not os.path.exists(pdf_path):
-            convert_draft_to_pdf(draft)
-
-        if os.path.exists(pdf_path):
-            pages = pdf_pages(pdf_path)
-            pdfmarks.write("[/Page "+str(curr_page)+" /View [/XYZ 0 792 1.0] /Title (" + draft + ") /OUT pdfmark\n")
-            pdf_list = pdf_list + " " + pdf_path
-            curr_page = curr_page + pages
-
-    pdfmarks.close()
-    pdfh, pdfn = mkstemp()
-    os.close(pdfh)
-    pipe("gs -dBATCH -dNOPAUSE -q -sDEVICE=pdfwrite -sOutputFile=" + pdfn + " " + pdf_list + " " + pmn)
-
-    pdf = open(pdfn,"r")
-    pdf_contents = pdf.read()
-    pdf.close()
-
-    os.unlink(pmn)
-    os.unlink(pdfn)
-    return HttpResponse(pdf_contents, content_type="application/pdf")
+    path = session_draft_bundle(num, acronym, "pdf")
+    with open(path, "rb") as f:
+        return HttpResponse(f.read(), content_type="application/pdf")
 
 def week_view(request, num=None, name=None, owner=None):
     meeting = get_meeting(num)
@@ -744,6 +684,14 @@ def week_view(request, num=None, name=None, owner=None):
     if not schedule:
         raise Http404
 
+    render_cache_key = agenda_render_cache_key(schedule, "week-view")
+    content = cache.get(render_cache_key)
+    if content is None:
+        content = render_week_view(request, meeting, schedule)
+        cache.set(render_cache_key, content, settings.MEETING_AGENDA_RENDER_CACHE_TIME)
+    return HttpResponse(content)
+
+def render_week_view(request, meeting, schedule):
     filtered_assignments = schedule.assignments.exclude(timeslot__type__in=['lead','offagenda'])
     filtered_assignments = preprocess_assignments_for_agenda(filtered_assignments, meeting)
     
@@ -792,9 +740,9 @@ def week_view(request, num=None, name=None, owner=None):
 
         items.append(item)
 
-    return render(request, "meeting/week-view.html", {
+    return render_to_string("meeting/week-view.html", {
         "items": json.dumps(items),
-    })
+    }, request=request)
 
 @role_required('Area Director','Secretariat','IAB')
 def room_view(request, num=None, name=None, owner=None):
@@ -810,10 +758,18 @@ def room_view(request, num=None, name=None, owner=None):
         person   = get_person_by_email(owner)
         schedule = get_schedule_by_name(meeting, person, name)
 
+    render_cache_key = agenda_render_cache_key(schedule, "room-view")
+    content = cache.get(render_cache_key)
+    if content is None:
+        content = render_room_view(request, meeting, schedule, rooms)
+        cache.set(render_cache_key, content, settings.MEETING_AGENDA_RENDER_CACHE_TIME)
+    return HttpResponse(content)
+
+def render_room_view(request, meeting, schedule, rooms):
     assignments = schedule.assignments.all()
     unavailable = meeting.timeslot_set.filter(type__slug='unavail')
     if not (assignments.exists() or unavailable.exists()):
-        return HttpResponse("No sessions/timeslots available yet")
+        return "No sessions/timeslots available yet"
 
     earliest = None
     latest = None
@@ -853,7 +809,7 @@ def room_view(request, num=None, name=None, owner=None):
         ss.day = (ss.timeslot.time-base_day).days
 
     template = "meeting/room-view.html"
-    return render(request, template,{"meeting":meeting,"schedule":schedule,"unavailable":unavailable,"assignments":assignments,"rooms":rooms,"days":days})
+    return render_to_string(template,{"meeting":meeting,"schedule":schedule,"unavailable":unavailable,"assignments":assignments,"rooms":rooms,"days":days}, request=request)
 
 def ical_agenda(request, num=None, name=None, acronym=None, session_id=None):
     meeting = get_meeting(num, type_in=None)
@@ -907,8 +863,9 @@ def ical_agenda(request, num=None, name=None, acronym=None, session_id=None):
         "updated": updated
     }, content_type="text/calendar")
 
-@cache_page(15 * 60)
-def json_agenda(request, num=None ):
+def build_json_agenda(num):
+    """Build the agenda.json snapshot for a meeting: the JSON text, and
+    the ETag and Last-Modified timestamp to serve it with."""
     meeting = get_meeting(num)
 
     sessions = []
@@ -918,6 +875,17 @@ def json_agenda(request, num=None ):
     # Update the assignments with historic information, i.e., valid at the
     # time of the meeting
     assignments = preprocess_assignments_for_agenda(assignments, meeting)
+
+    # fetch the presentations and the latest revision times of all the
+    # materials up front, instead of once per session
+    presentations_by_session = defaultdict(list)
+    for pres in SessionPresentation.objects.filter(session__in=[a.session_id for a in assignments]).select_related("document"):
+        presentations_by_session[pres.session_id].append(pres)
+    latest_revisions = dict(NewRevisionDocEvent.objects.filter(
+        type="new_revision",
+        doc__in=set(p.document_id for l in presentations_by_session.values() for p in l),
+    ).values_list("doc").annotate(Max("time")))
+
     for asgn in assignments:
         sessdict = dict()
         sessdict['objtype'] = 'session'
@@ -958,8 +926,9 @@ def json_agenda(request, num=None ):
                 sessdict['slides'].append('/api/v1/doc/document/%s/'%slides.name)
             # New alternative
             sessdict['presentations'] = []
-            presentations = SessionPresentation.objects.filter(session=asgn.session, document__type__slug='slides')
-            for pres in presentations:
+            for pres in presentations_by_session[asgn.session_id]:
+                if pres.document.type_id != 'slides':
+                    continue
                 sessdict['presentations'].append(
                     {
                         'name':     pres.document.name,
@@ -971,9 +940,8 @@ def json_agenda(request, num=None ):
         sessdict['session_res_uri'] = '/api/v1/meeting/session/%s/'%asgn.session.id
         sessdict['session_id'] = asgn.session.id
         modified = asgn.session.modified
-        for doc in asgn.session.materials.all():
-            rev_docevent = doc.latest_event(NewRevisionDocEvent,'new_revision')
-            modified = max(modified, (rev_docevent and rev_docevent.time) or modified)
+        for pres in presentations_by_session[asgn.session_id]:
+            modified = max(modified, latest_revisions.get(pres.document_id) or modified)
         sessdict['modified'] = modified
         sessdict['status'] = asgn.session.status_id
         sessions.append(sessdict)
@@ -1020,11 +988,34 @@ def json_agenda(request, num=None ):
 
     data = {"%s"%num: meetinfo}
 
-    response = HttpResponse(json.dumps(data, indent=2, sort_keys=True), content_type='application/json;charset=%s'%settings.DEFAULT_CHARSET)
+    content = json.dumps(data, indent=2, sort_keys=True)
     if last_modified:
-        last_modified = tz.localize(last_modified).astimezone(pytz.utc)
-        response['Last-Modified'] = format_date_time(timegm(last_modified.timetuple()))
-    return response
+        last_modified = timegm(tz.localize(last_modified).astimezone(pytz.utc).timetuple())
+    else:
+        last_modified = None
+
+    return {
+        "content": content,
+        "etag": '"%s"' % hashlib.sha1(content).hexdigest(),
+        "last_modified": last_modified,
+    }
+
+def json_agenda(request, num=None ):
+    # The snapshot is looked up by the meeting number in the url, so that
+    # conditional requests from polling clients are answered without
+    # touching the database.  It's thrown away when the sessions,
+    # assignments, rooms or materials of the meeting change.
+    cache_key = json_agenda_cache_key(num)
+    snapshot = cache.get(cache_key)
+    if snapshot is None:
+        snapshot = build_json_agenda(num)
+        cache.set(cache_key, snapshot, settings.MEETING_AGENDA_JSON_CACHE_TIME)
+
+    response = HttpResponse(snapshot["content"], content_type='application/json;charset=%s'%settings.DEFAULT_CHARSET)
+    response['ETag'] = snapshot["etag"]
+    if snapshot["last_modified"]:
+        response['Last-Modified'] = format_date_time(snapshot["last_modified"])
+    return get_conditional_response(request, etag=snapshot["etag"], last_modified=snapshot["last_modified"], response=response)
 
 def meeting_requests(request, num=None):
     meeting = get_meeting(num)
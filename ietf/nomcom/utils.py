@@ -20,7 +20,7 @@ from ietf.dbtemplate.models import DBTemplate
 from ietf.person.models import Email, Person
 from ietf.mailtrigger.utils import gather_address_lists
 from ietf.utils.pipe import pipe
-from ietf.utils.mail import send_mail_text, send_mail
+from ietf.utils.mail import send_mail_text, send_mail, reused_smtp_connection
 from ietf.utils.log import log
 from ietf.person.name import unidecode_name
 
@@ -272,16 +272,17 @@ def send_questionnaire_reminder_to_nominee(nominee_position):
 
 def send_reminder_to_nominees(nominees,type):
     addrs = []
-    if type=='accept':
-        for nominee in nominees:
-            for nominee_position in nominee.nomineeposition_set.pending():
-                send_accept_reminder_to_nominee(nominee_position)
-                addrs.append(nominee_position.nominee.email.address)
-    elif type=='questionnaire':
-        for nominee in nominees:
-            for nominee_position in nominee.nomineeposition_set.accepted().without_questionnaire_response():
-                send_questionnaire_reminder_to_nominee(nominee_position)
-                addrs.append(nominee_position.nominee.email.address)
+    with reused_smtp_connection():
+        if type=='accept':
+            for nominee in nominees:
+                for nominee_position in nominee.nomineeposition_set.pending():
+                    send_accept_reminder_to_nominee(nominee_position)
+                    addrs.append(nominee_position.nominee.email.address)
+        elif type=='questionnaire':
+            for nominee in nominees:
+                for nominee_position in nominee.nomineeposition_set.accepted().without_questionnaire_response():
+                    send_questionnaire_reminder_to_nominee(nominee_position)
+                    addrs.append(nominee_position.nominee.email.address)
     return addrs
 
 
@@ -11,7 +11,6 @@ import warnings
 
 warnings.simplefilter("always", DeprecationWarning)
 warnings.filterwarnings("ignore", message="Report.file_reporters will no longer be available in Coverage.py 4.2", module="coverage.report")
-warnings.filterwarnings("ignore", message="The popen2 module is deprecated.  Use the subprocess module.", module="ietf.utils.pipe")
 warnings.filterwarnings("ignore", message="Usage of field.rel has been deprecated. Use field.remote_field instead.", module="tastypie.resources")
 warnings.filterwarnings("ignore", message="Importing from django.core.urlresolvers is deprecated in favor of django.urls.", module="tastypie.resources")
 warnings.filterwarnings("ignore", message="on_delete will be a required arg for OneToOneField in Django 2.0.", module="tastypie")
@@ -573,6 +572,7 @@ URL_REGEXPS = {
 DOCUMENT_PATH_PATTERN = '/a/www/ietf-ftp/{doc.type_id}/'
 INTERNET_DRAFT_PATH = '/a/www/ietf-ftp/internet-drafts/'
 INTERNET_DRAFT_PDF_PATH = '/a/www/ietf-datatracker/pdf/'
+INTERNET_DRAFT_INDEX_DOWNLOAD_PATH = '/a/www/www6s/download/'
 RFC_PATH = '/a/www/ietf-ftp/rfc/'
 CHARTER_PATH = '/a/www/ietf-ftp/charter/'
 CONFLICT_REVIEW_PATH = '/a/www/ietf-ftp/conflict-reviews'
@@ -664,6 +664,45 @@ CACHES = {
 HTMLIZER_VERSION = 1
 HTMLIZER_URL_PREFIX = "/doc/html"
 HTMLIZER_CACHE_TIME = 60*60*24*14       # 14 days
+# Htmlized drafts and RFCs, generated by the pregenerate_htmlized command as
+# documents are published; the htmlized cache is only used if the store
+# can't be written to
+HTMLIZED_STORE_PATH = '/a/www/ietf-datatracker/htmlized/'
+
+# Queue community list notifications and send them in digests with the
+# send_community_notifications command, instead of sending them right away
+COMMUNITY_LIST_NOTIFICATION_QUEUE = False
+
+# Queued notifications claimed by a run of send_community_notifications
+# longer ago than this are taken to be left over from a run that died
+COMMUNITY_LIST_NOTIFICATION_CLAIM_TIMEOUT = 60*60   # 1 hour
+
+# Index over all community list search rules, replaced when the rules change
+COMMUNITY_SEARCH_RULE_INDEX_CACHE_TIME = 60*60*24  # 1 day
+
+# The attribute values filled in for the rows of the document search table
+DOC_TABLE_ROW_CACHE_TIME = 60*30        # 30 minutes, entries are also keyed on document changes
+
+# The in-memory graph of document relations in each process is updated from a
+# log of relation changes in the cache, and rebuilt from the database this often
+DOC_RELATION_GRAPH_REBUILD_TIME = 60*60 # 1 hour
+
+# Per-draft entries of the incremental draft index files (all_id.txt etc.)
+IDINDEX_ENTRY_CACHE_TIME = 60*60*24     # 1 day, entries are also invalidated on change
+IDINDEX_CHUNK_SIZE = 1000               # drafts loaded at a time when generating the index files
+
+# Snapshot of the agenda.json data for a meeting, also invalidated when
+# sessions, assignments, rooms or materials change
+MEETING_AGENDA_JSON_CACHE_TIME = 60*60  # 1 hour
+
+# Rendered agenda pages (html, txt, csv, week and room views), keyed on
+# the schedule and the modification times of its data
+MEETING_AGENDA_RENDER_CACHE_TIME = 60*60    # 1 hour
+
+# Combined PDFs and tarballs of the drafts of each session, see the
+# pregenerate_session_drafts command
+MEETING_SESSION_DRAFT_BUNDLE_PATH = '/a/www/ietf-datatracker/pdf/sessions/'
+MEETING_DRAFT_PDF_COMMAND_TIMEOUT = 5*60  # seconds, for each enscript, ps2pdf and gs run
 
 # Email settings
 IPR_EMAIL_FROM = 'ietf-ipr@ietf.org'
@@ -734,6 +773,14 @@ IDSUBMIT_CHECKER_CLASSES = (
     "ietf.submit.checkers.DraftYangChecker",
 )
 
+# Run the checkers on manually uploaded submissions with the
+# run_submission_checkers command instead of inside the upload request;
+# the submission status page shows the progress until they're done
+IDSUBMIT_CHECKERS_IN_BACKGROUND = False
+IDSUBMIT_CHECKER_PROCESSES = 4          # checkers run concurrently by run_submission_checkers
+IDSUBMIT_CHECKER_TIMEOUT = 5*60         # seconds, a checker running longer is stopped and fails
+IDSUBMIT_CHECKER_CACHE_TIME = 60*60*24  # results for unchanged files and yang modules, 1 day
+
 
 IDSUBMIT_MANUAL_STAGING_DIR = '/tmp/'
 
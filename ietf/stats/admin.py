@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from ietf.stats.models import AffiliationAlias, AffiliationIgnoredEnding, CountryAlias, MeetingRegistration
+from ietf.stats.models import AffiliationAlias, AffiliationIgnoredEnding, CountryAlias, MeetingRegistration, StatisticsAggregate
 
 
 class AffiliationAliasAdmin(admin.ModelAdmin):
@@ -25,3 +25,9 @@ class MeetingRegistrationAdmin(admin.ModelAdmin):
     list_display = ['meeting', 'first_name', 'last_name', 'affiliation', 'country_code', 'person', 'email', ]
     search_fields = ['meeting', 'first_name', 'last_name', 'affiliation', 'country_code', 'email', ]
 admin.site.register(MeetingRegistration, MeetingRegistrationAdmin)
+
+class StatisticsAggregateAdmin(admin.ModelAdmin):
+    list_filter = ['stale', ]
+    list_display = ['key', 'time', 'stale', ]
+    search_fields = ['key', ]
+admin.site.register(StatisticsAggregate, StatisticsAggregateAdmin)
@@ -0,0 +1,30 @@
+# Copyright The IETF Trust 2018, All Rights Reserved
+
+from django.core.management.base import BaseCommand
+
+import debug                            # pyflakes:ignore
+
+from ietf.stats.aggregates import update_stats_aggregates
+from ietf.utils.log import log
+
+class Command(BaseCommand):
+    help = (u"Recompute the stored statistics shown on the document and meeting statistics "
+            u"pages.  Statistics are marked as stale when new revisions are published or "
+            u"meeting registrations are added; use --stale to only recompute those.  Run "
+            u"this after a release which changes how the statistics are computed.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--stale", action="store_true", default=False,
+            help="only recompute statistics marked as stale")
+        parser.add_argument("--processes", type=int, default=1,
+            help="number of worker processes to compute the statistics in (default: %(default)s)")
+
+    def handle(self, *args, **options):
+        updated = update_stats_aggregates(stale_only=options["stale"], processes=options["processes"])
+        for key, seconds in updated:
+            msg = "Computed statistics for '%s' in %.1fs" % (key, seconds)
+            log(msg)
+            if options["verbosity"] > 1:
+                self.stdout.write(msg + "\n")
+        if options["verbosity"] > 1:
+            self.stdout.write("Updated %s statistics in %.1fs of processing time\n" % (len(updated), sum(s for k, s in updated)))
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.15 on 2018-10-20 11:05
+from __future__ import unicode_literals
+
+import datetime
+from django.db import migrations, models
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatisticsAggregate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('data', jsonfield.fields.JSONField(default=dict)),
+                ('time', models.DateTimeField(default=datetime.datetime.now)),
+                ('stale', models.BooleanField(default=False, help_text=b'Set when the underlying data has changed since the statistics were computed.')),
+            ],
+        ),
+    ]
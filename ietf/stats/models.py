@@ -1,9 +1,14 @@
 # Copyright The IETF Trust 2017, All Rights Reserved
 
+import datetime
+import jsonfield
+
 from django.db import models
+from django.db.models import Q, signals
 
 import debug                            # pyflakes:ignore
 
+from ietf.doc.models import DocEvent, NewRevisionDocEvent
 from ietf.meeting.models import Meeting
 from ietf.name.models import CountryName
 from ietf.person.models import Person
@@ -60,3 +65,43 @@ class MeetingRegistration(models.Model):
     
     def __unicode__(self):
         return u"{} {}".format(self.first_name, self.last_name)
+
+class StatisticsAggregate(models.Model):
+    """Precomputed statistics for one page of the document or meeting
+    statistics, keyed on the statistics type and filter choices."""
+    key = models.CharField(max_length=255, unique=True)
+    data = jsonfield.JSONField(default=dict)
+    time = models.DateTimeField(default=datetime.datetime.now)
+    stale = models.BooleanField(default=False, help_text="Set when the underlying data has changed since the statistics were computed.")
+
+    def __unicode__(self):
+        return self.key
+
+
+def mark_document_stats_stale(sender, instance, raw=False, **kwargs):
+    if raw or instance.type not in ("new_revision", "published_rfc"):
+        return
+    doc = instance.doc
+    if doc.type_id != "draft":
+        return
+    # only the statistics over the kind of documents the event changes;
+    # publishing an RFC moves the document from the drafts to the RFCs
+    if instance.type == "published_rfc":
+        document_types = ["", "draft", "rfc"]
+    elif doc.get_state_slug() == "rfc":
+        document_types = ["", "rfc"]
+    else:
+        document_types = ["", "draft"]
+    from ietf.stats.aggregates import document_stats_keys
+    StatisticsAggregate.objects.filter(key__in=document_stats_keys(document_types), stale=False).update(stale=True)
+
+def mark_meeting_stats_stale(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    StatisticsAggregate.objects.filter(Q(key__startswith=u"meeting:{}:".format(instance.meeting.number)) | Q(key__startswith="meeting::"), stale=False).update(stale=True)
+
+# DocEvent subclasses send post_save with their own class as sender;
+# new revisions are NewRevisionDocEvents, published RFCs plain DocEvents
+signals.post_save.connect(mark_document_stats_stale, sender=DocEvent)
+signals.post_save.connect(mark_document_stats_stale, sender=NewRevisionDocEvent)
+signals.post_save.connect(mark_meeting_stats_stale, sender=MeetingRegistration)
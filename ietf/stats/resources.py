@@ -7,7 +7,7 @@ from tastypie.cache import SimpleCache
 from ietf import api
 from ietf.api import ToOneField                         # pyflakes:ignore
 
-from ietf.stats.models import CountryAlias, AffiliationIgnoredEnding, AffiliationAlias, MeetingRegistration
+from ietf.stats.models import CountryAlias, AffiliationIgnoredEnding, AffiliationAlias, MeetingRegistration, StatisticsAggregate
 
 
 from ietf.name.resources import CountryNameResource
@@ -68,3 +68,16 @@ class MeetingRegistrationResource(ModelResource):
         }
 api.stats.register(MeetingRegistrationResource())
 
+class StatisticsAggregateResource(ModelResource):
+    class Meta:
+        queryset = StatisticsAggregate.objects.all()
+        serializer = api.Serializer()
+        cache = SimpleCache()
+        #resource_name = 'statisticsaggregate'
+        filtering = { 
+            "id": ALL,
+            "key": ALL,
+            "time": ALL,
+            "stale": ALL,
+        }
+api.stats.register(StatisticsAggregateResource())
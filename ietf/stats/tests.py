@@ -1,9 +1,11 @@
 import datetime
+from StringIO import StringIO
 
 from mock import patch
 from pyquery import PyQuery
 from requests import Response
 
+from django.core.management import call_command
 from django.urls import reverse as urlreverse
 from django.contrib.auth.models import User
 
@@ -11,18 +13,34 @@ from ietf.utils.test_utils import login_testing_unauthorized, TestCase, uniconte
 import ietf.stats.views
 
 from ietf.submit.models import Submission
-from ietf.doc.factories import WgDraftFactory, WgRfcFactory
-from ietf.doc.models import Document, DocAlias, State, RelatedDocument, NewRevisionDocEvent, DocumentAuthor
+from ietf.doc.factories import WgDraftFactory, WgRfcFactory, CharterFactory
+from ietf.doc.models import Document, DocAlias, State, RelatedDocument, DocEvent, NewRevisionDocEvent, DocumentAuthor
 from ietf.group.factories import RoleFactory
 from ietf.meeting.factories import MeetingFactory
 from ietf.person.factories import PersonFactory
 from ietf.person.models import Person, Email
 from ietf.name.models import FormalLanguageName, DocRelationshipName, CountryName
 from ietf.review.factories import ReviewRequestFactory, ReviewerSettingsFactory
-from ietf.stats.models import MeetingRegistration, CountryAlias
+from ietf.stats.models import MeetingRegistration, CountryAlias, StatisticsAggregate
 from ietf.stats.utils import get_meeting_registration_data
 
 
+class InProcessPool(object):
+    """Stands in for multiprocessing.Pool, as forked workers wouldn't see
+    the data of the test transaction.  Hands the results back in reverse
+    order, as the workers may finish in any order."""
+    def __init__(self, processes):
+        self.processes = processes
+
+    def imap_unordered(self, func, iterable):
+        return reversed([ func(i) for i in iterable ])
+
+    def close(self):
+        pass
+
+    def join(self):
+        pass
+
 class StatisticsTests(TestCase):
     def test_stats_index(self):
         url = urlreverse(ietf.stats.views.stats_index)
@@ -147,6 +165,97 @@ class StatisticsTests(TestCase):
             self.assertTrue(q('#chart'))
             self.assertTrue(q('table.stats-data'))
                 
+    def test_stats_aggregates(self):
+        draft = WgDraftFactory()
+
+        url = urlreverse(ietf.stats.views.document_stats, kwargs={ "stats_type": "authors" })
+        r = self.client.get(url, { "type": "draft" })
+        self.assertEqual(r.status_code, 200)
+        aggregate = StatisticsAggregate.objects.get(key="document:authors:draft:")
+        self.assertFalse(aggregate.stale)
+        self.assertTrue(any(draft.name in names for _, _, _, names in aggregate.data["table_data"]))
+
+        # arbitrary time choices aren't stored
+        r = self.client.get(url, { "type": "draft", "time": "3y" })
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(StatisticsAggregate.objects.count(), 1)
+
+        # a new revision makes the stored statistics stale
+        NewRevisionDocEvent.objects.create(type="new_revision", by=Person.objects.get(name="(System)"),
+                                           doc=draft, rev="01", desc="New revision available")
+        self.assertTrue(StatisticsAggregate.objects.get(key="document:authors:draft:").stale)
+
+        # while stale, the stored statistics are still served
+        r = self.client.get(url, { "type": "draft" })
+        self.assertEqual(r.status_code, 200)
+
+        call_command("update_stats_aggregates", stale=True)
+        self.assertFalse(StatisticsAggregate.objects.get(key="document:authors:draft:").stale)
+        self.assertEqual(StatisticsAggregate.objects.count(), 1)
+
+        # only the statistics over the kind of documents changed are stale
+        r = self.client.get(url, { "type": "rfc" })
+        self.assertEqual(r.status_code, 200)
+        NewRevisionDocEvent.objects.create(type="new_revision", by=Person.objects.get(name="(System)"),
+                                           doc=draft, rev="02", desc="New revision available")
+        self.assertTrue(StatisticsAggregate.objects.get(key="document:authors:draft:").stale)
+        self.assertFalse(StatisticsAggregate.objects.get(key="document:authors:rfc:").stale)
+        call_command("update_stats_aggregates", stale=True)
+        charter = CharterFactory()
+        NewRevisionDocEvent.objects.create(type="new_revision", by=Person.objects.get(name="(System)"),
+                                           doc=charter, rev="01", desc="New revision available")
+        self.assertFalse(StatisticsAggregate.objects.filter(stale=True).exists())
+        DocEvent.objects.create(type="published_rfc", by=Person.objects.get(name="(System)"), doc=draft, rev=draft.rev, desc="RFC published")
+        self.assertTrue(StatisticsAggregate.objects.get(key="document:authors:rfc:").stale)
+        call_command("update_stats_aggregates", stale=True)
+
+        # meeting registrations make the meeting statistics stale
+        meeting = MeetingFactory(type_id='ietf', date=datetime.date.today(), number="96")
+        url = urlreverse(ietf.stats.views.meeting_stats, kwargs={ "stats_type": "country", "num": meeting.number })
+        r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        self.assertFalse(StatisticsAggregate.objects.get(key="meeting:96:country").stale)
+        MeetingRegistration.objects.create(first_name='John', last_name='Smith', country_code='US', email="john.smith@example.us", meeting=meeting)
+        self.assertTrue(StatisticsAggregate.objects.get(key="meeting:96:country").stale)
+        self.assertFalse(StatisticsAggregate.objects.get(key="document:authors:draft:").stale)
+
+    def test_update_stats_aggregates(self):
+        WgDraftFactory()
+        MeetingFactory(type_id='ietf', date=datetime.date.today(), number="96")
+
+        out = StringIO()
+        call_command("update_stats_aggregates", verbosity=2, stdout=out)
+        self.assertTrue("Computed statistics for 'document:author/hindex:rfc:5y'" in out.getvalue())
+        self.assertTrue("Computed statistics for 'meeting:96:continent'" in out.getvalue())
+        self.assertTrue(StatisticsAggregate.objects.filter(key="meeting::overview").exists())
+        self.assertEqual(StatisticsAggregate.objects.filter(stale=True).count(), 0)
+
+        # nothing is stale, so nothing to do
+        out = StringIO()
+        call_command("update_stats_aggregates", stale=True, verbosity=2, stdout=out)
+        self.assertTrue("Updated 0 statistics" in out.getvalue())
+
+    def test_update_stats_aggregates_in_several_processes(self):
+        WgDraftFactory()
+        MeetingFactory(type_id='ietf', date=datetime.date.today(), number="96")
+
+        def computed(out):
+            return sorted(l.rsplit(" in ", 1)[0] for l in out.getvalue().splitlines() if l.startswith("Computed"))
+
+        out = StringIO()
+        call_command("update_stats_aggregates", verbosity=2, stdout=out)
+        single = computed(out)
+        data = dict(StatisticsAggregate.objects.values_list("key", "data"))
+
+        StatisticsAggregate.objects.all().delete()
+        out = StringIO()
+        with patch("ietf.stats.aggregates.multiprocessing.Pool", side_effect=InProcessPool) as pool, \
+             patch("ietf.stats.aggregates.connections.close_all"):
+            call_command("update_stats_aggregates", processes=2, verbosity=2, stdout=out)
+        pool.assert_called_once_with(2)
+        self.assertEqual(computed(out), single)
+        self.assertEqual(dict(StatisticsAggregate.objects.values_list("key", "data")), data)
+
     def test_known_country_list(self):
         # check redirect
         url = urlreverse(ietf.stats.views.known_countries_list)
@@ -2,7 +2,7 @@ from django.urls import reverse as urlreverse
 from django.contrib import admin
 
 
-from ietf.submit.models import Preapproval, Submission, SubmissionEvent, SubmissionCheck, SubmissionEmailEvent
+from ietf.submit.models import Preapproval, Submission, SubmissionEvent, SubmissionCheck, SubmissionEmailEvent, QueuedSubmissionCheck
 
 class SubmissionAdmin(admin.ModelAdmin):
     list_display = ['id', 'rev', 'draft_link', 'status_link', 'submission_date',]
@@ -39,6 +39,12 @@ class SubmissionCheckAdmin(admin.ModelAdmin):
     search_fields = ['submission__name']
 admin.site.register(SubmissionCheck, SubmissionCheckAdmin)
 
+class QueuedSubmissionCheckAdmin(admin.ModelAdmin):
+    list_display = ['submission', 'time', 'checker', 'method', 'started']
+    raw_id_fields = ['submission']
+    search_fields = ['submission__name']
+admin.site.register(QueuedSubmissionCheck, QueuedSubmissionCheckAdmin)
+
 class PreapprovalAdmin(admin.ModelAdmin):
     pass
 admin.site.register(Preapproval, PreapprovalAdmin)
@@ -1,6 +1,8 @@
 # Copyright The IETF Trust 2016, All Rights Reserved
 from __future__ import unicode_literals, print_function
 
+import hashlib
+import json
 import os
 import re
 import sys
@@ -10,14 +12,55 @@ import tempfile
 import StringIO
 
 from django.conf import settings
+from django.core.cache import cache
 
 import debug                            # pyflakes:ignore
 
 from ietf.utils.log import log
 from ietf.utils.models import VersionInfo
-from ietf.utils.pipe import pipe
+from ietf.utils.pipe import run
 from ietf.utils.test_runner import set_coverage_checking
 
+def template_command(template):
+    "The command of a command line template from the settings"
+    return [ w for w in template.split() if not '=' in w ][0]
+
+def command_args(template, **kwargs):
+    """Split a command line template from the settings into words and fill
+    in the values, so the command can be run without a shell.  Returns the
+    environment, with any leading VAR=value words of the template set in
+    it, and the argument list."""
+    env = None
+    words = [ w.format(**kwargs) for w in template.split() ]
+    while words and re.match(r'^[A-Za-z_][A-Za-z0-9_]*=', words[0]):
+        if env is None:
+            env = dict(os.environ)
+        var, value = words.pop(0).split('=', 1)
+        env[var] = value
+    return env, words
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def command_version(command):
+    "The version of an external command recorded in VersionInfo, if any"
+    info = VersionInfo.objects.filter(command=command).first()
+    return info.version if info else ""
+
+def checker_cache_key(*parts):
+    """Cache key for the result of a checker, from the checker name, the
+    versions of the tools and settings it uses and the SHA-256 of its
+    input, so an unchanged file isn't checked again."""
+    return "ietf:submit:checker:%s" % hashlib.sha256("\0".join(unicode(p) for p in parts).encode("utf-8")).hexdigest()
+
+# Stands in for the temporary directory the yang modules are extracted to
+# in the cached results, as it differs from one run to the next
+WORKDIR_TOKEN = "\x00workdir\x00"
+
 class DraftSubmissionChecker():
     name = ""
 
@@ -59,9 +102,9 @@ class DraftIdnitsChecker(object):
 
     def __init__(self, options=["--submitcheck", "--nitcount", ]):
         assert isinstance(options, list)
-        if not "--nitcount" in options:
-            options.append("--nitcount")
-        self.options = ' '.join(options)
+        self.options = list(options)
+        if not "--nitcount" in self.options:
+            self.options.append("--nitcount")
 
     def check_file_txt(self, path):
         """
@@ -78,8 +121,19 @@ class DraftIdnitsChecker(object):
         warnstart = ['  == ', '  -- ']
         
 
-        cmd = "%s %s %s" % (settings.IDSUBMIT_IDNITS_BINARY, self.options, path)
-        code, out, err = pipe(cmd)
+        if os.path.exists(path) and os.path.exists(settings.IDSUBMIT_IDNITS_BINARY):
+            # idnits has no version switch, changes to it show in its modification time
+            cache_key = checker_cache_key(self.name, os.stat(settings.IDSUBMIT_IDNITS_BINARY).st_mtime,
+                                          self.options, os.path.basename(path), file_sha256(path))
+            cached = cache.get(cache_key)
+            if cached:
+                return cached
+        else:
+            cache_key = None
+
+        args = [settings.IDSUBMIT_IDNITS_BINARY] + self.options + [path]
+        cmd = " ".join(args)
+        code, out, err = run(args, timeout=settings.IDSUBMIT_CHECKER_TIMEOUT)
         if code != 0 or out == "":
             message = "idnits error: %s:\n  Error %s: %s" %( cmd, code, err)
             log(message)
@@ -112,6 +166,10 @@ class DraftIdnitsChecker(object):
                 pass
         info = {'checker': self.name, 'items': [], 'code': {}}
 
+        # a failure to run idnits is not a result to remember
+        if cache_key and code == 0 and out:
+            cache.set(cache_key, (passed, message, errors, warnings, info), settings.IDSUBMIT_CHECKER_CACHE_TIME)
+
         return passed, message, errors, warnings, info
 
 class DraftYangChecker(object):
@@ -182,6 +240,11 @@ class DraftYangChecker(object):
             "items": [],
         })
 
+        # the modules of the draft are validated together, as they may
+        # import each other, so the results of each depend on all of them
+        extracted = sorted("%s:%s" % (m, file_sha256(os.path.join(workdir, m)))
+            for m in model_list if os.path.exists(os.path.join(workdir, m)))
+
         for model in model_list:
             path = os.path.join(workdir, model)
             message = ""
@@ -195,15 +258,30 @@ class DraftYangChecker(object):
                                 settings.SUBMIT_YANG_DRAFT_MODEL_DIR,
                                 settings.SUBMIT_YANG_IANA_MODEL_DIR,
                             ])
+            cache_key = None
+            cached = None
+            cacheable = True
             if os.path.exists(path):
+                cache_key = checker_cache_key(self.name, model, file_sha256(path), " ".join(extracted),
+                    settings.SUBMIT_PYANG_COMMAND, command_version(template_command(settings.SUBMIT_PYANG_COMMAND)),
+                    settings.SUBMIT_YANGLINT_COMMAND or "",
+                    command_version(template_command(settings.SUBMIT_YANGLINT_COMMAND)) if settings.SUBMIT_YANGLINT_COMMAND else "")
+                cached = cache.get(cache_key)
+
+            if cached:
+                # the module is unchanged, and has been validated by the same tools before
+                result = json.loads(cached.replace(WORKDIR_TOKEN, workdir))
+                message, errors, warnings, items = result["message"], result["errors"], result["warnings"], result["items"]
+            elif os.path.exists(path):
                 with open(path) as file:
                     text = file.readlines()
                 # pyang
                 cmd_template = settings.SUBMIT_PYANG_COMMAND
                 command = [ w for w in cmd_template.split() if not '=' in w ][0]
                 cmd_version = VersionInfo.objects.get(command=command).version
-                cmd = cmd_template.format(libs=modpath, model=path)
-                code, out, err = pipe(cmd)
+                env, args = command_args(cmd_template, libs=modpath, model=path)
+                code, out, err = run(args, env=env, timeout=settings.IDSUBMIT_CHECKER_TIMEOUT)
+                cacheable = cacheable and code >= 0
                 if code > 0 or len(err.strip()) > 0 :
                     error_lines = err.splitlines()
                     for line in error_lines:
@@ -231,9 +309,10 @@ class DraftYangChecker(object):
                     cmd_template = settings.SUBMIT_YANGLINT_COMMAND
                     command = [ w for w in cmd_template.split() if not '=' in w ][0]
                     cmd_version = VersionInfo.objects.get(command=command).version
-                    cmd = cmd_template.format(model=path, rfclib=settings.SUBMIT_YANG_RFC_MODEL_DIR, tmplib=workdir,
+                    env, args = command_args(cmd_template, model=path, rfclib=settings.SUBMIT_YANG_RFC_MODEL_DIR, tmplib=workdir,
                         draftlib=settings.SUBMIT_YANG_DRAFT_MODEL_DIR, ianalib=settings.SUBMIT_YANG_IANA_MODEL_DIR, )
-                    code, out, err = pipe(cmd)
+                    code, out, err = run(args, env=env, timeout=settings.IDSUBMIT_CHECKER_TIMEOUT)
+                    cacheable = cacheable and code >= 0
                     if code > 0 or len(err.strip()) > 0:
                         error_lines = err.splitlines()
                         for line in error_lines:
@@ -248,6 +327,11 @@ class DraftYangChecker(object):
                     #passed = passed and code == 0 # For the submission tool.  Yang checks always pass
                     message += "%s: %s:\n%s\n" % (cmd_version, cmd_template, out+"No validation errors\n" if (code == 0 and len(err) == 0) else out+err)
                 set_coverage_checking(True)
+
+                # tools which timed out or were killed don't give a result to remember
+                if cacheable:
+                    cache.set(cache_key, json.dumps({ "message": message, "errors": errors, "warnings": warnings, "items": items }).replace(workdir, WORKDIR_TOKEN),
+                              settings.IDSUBMIT_CHECKER_CACHE_TIME)
             else:
                 errors += 1
                 message += "No such file: %s\nPossible mismatch between extracted xym file name and returned module name?\n" % (path)
@@ -0,0 +1,37 @@
+# Copyright The IETF Trust 2018, All Rights Reserved
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+import debug                            # pyflakes:ignore
+
+from ietf.submit.utils import run_queued_checkers
+
+class Command(BaseCommand):
+    help = (u"Run the queued submission checkers, several at a time and each with a "
+            u"time limit, saving the results as they finish.  Checkers are only "
+            u"queued when IDSUBMIT_CHECKERS_IN_BACKGROUND is set.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=settings.IDSUBMIT_CHECKER_PROCESSES,
+            help="number of checkers to run at the same time (default: %(default)s)")
+        parser.add_argument("--timeout", type=int, default=settings.IDSUBMIT_CHECKER_TIMEOUT,
+            help="seconds after which a checker is stopped and fails (default: %(default)s)")
+        parser.add_argument("--loop", type=float, default=None, metavar="SECONDS",
+            help="keep running, looking for queued checkers every SECONDS seconds")
+
+    def handle(self, *args, **options):
+        while True:
+            checks = run_queued_checkers(processes=options["processes"], timeout=options["timeout"])
+            if options["verbosity"] > 1:
+                for check in checks:
+                    self.stdout.write("%s for %s-%s: %s\n" % (check.checker, check.submission.name, check.submission.rev,
+                                                              "passed" if check.passed != False else "failed"))
+            if not options["loop"]:
+                break
+            if not checks:
+                time.sleep(options["loop"])
+            close_old_connections()
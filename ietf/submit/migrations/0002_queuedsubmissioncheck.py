@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.15 on 2018-10-24 09:12
+from __future__ import unicode_literals
+
+import datetime
+from django.db import migrations, models
+import django.db.models.deletion
+import ietf.utils.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submit', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedSubmissionCheck',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('checker', models.CharField(help_text=b'Dotted path of the checker class', max_length=256)),
+                ('method', models.CharField(max_length=32)),
+                ('path', models.CharField(max_length=255)),
+                ('time', models.DateTimeField(default=datetime.datetime.now)),
+                ('started', models.DateTimeField(blank=True, null=True)),
+                ('submission', ietf.utils.models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='queued_checks', to='submit.Submission')),
+            ],
+        ),
+    ]
@@ -88,6 +88,19 @@ class SubmissionCheck(models.Model):
     def has_errors(self):
         return self.errors != '[]'
 
+class QueuedSubmissionCheck(models.Model):
+    """A checker still to be run on a file of a submission, see
+    run_queued_checkers()."""
+    submission = ForeignKey(Submission, related_name='queued_checks')
+    checker = models.CharField(max_length=256, help_text="Dotted path of the checker class")
+    method = models.CharField(max_length=32)
+    path = models.CharField(max_length=255)
+    time = models.DateTimeField(default=datetime.datetime.now)
+    started = models.DateTimeField(null=True, blank=True)
+
+    def __unicode__(self):
+        return u"%s queued for %s at %s" % (self.checker, self.submission.name, self.time)
+
 class SubmissionEvent(models.Model):
     submission = ForeignKey(Submission)
     time = models.DateTimeField(default=datetime.datetime.now)
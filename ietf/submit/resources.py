@@ -6,7 +6,7 @@ from tastypie.cache import SimpleCache
 
 from ietf import api
 from ietf.submit.models import ( Preapproval, SubmissionCheck, Submission,
-    SubmissionEmailEvent, SubmissionEvent )
+    SubmissionEmailEvent, SubmissionEvent, QueuedSubmissionCheck )
 from ietf.person.resources import PersonResource
 
 
@@ -129,3 +129,21 @@ class SubmissionEmailEventResource(ModelResource):
         }
 api.submit.register(SubmissionEmailEventResource())
 
+
+class QueuedSubmissionCheckResource(ModelResource):
+    submission       = ToOneField(SubmissionResource, 'submission')
+    class Meta:
+        cache = SimpleCache()
+        queryset = QueuedSubmissionCheck.objects.all()
+        serializer = api.Serializer()
+        #resource_name = 'queuedsubmissioncheck'
+        filtering = { 
+            "id": ALL,
+            "checker": ALL,
+            "method": ALL,
+            "path": ALL,
+            "time": ALL,
+            "started": ALL,
+            "submission": ALL_WITH_RELATIONS,
+        }
+api.submit.register(QueuedSubmissionCheckResource())
@@ -4,20 +4,27 @@ from __future__ import unicode_literals, print_function
 
 import datetime
 import email
+import json
 import os
 import re
 import shutil
 import sys
+import time
 
 
 from StringIO import StringIO
+from mock import patch
 from pyquery import PyQuery
 
 from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test.utils import override_settings
 from django.urls import reverse as urlreverse
 
 import debug                            # pyflakes:ignore
 
+from ietf.submit.checkers import DraftIdnitsChecker, DraftYangChecker
 from ietf.submit.utils import expirable_submissions, expire_submission, ensure_person_email_info_exists
 from ietf.doc.factories import DocumentFactory, WgDraftFactory, IndividualDraftFactory
 from ietf.doc.models import Document, DocAlias, DocEvent, State, BallotPositionDocEvent, DocumentAuthor
@@ -71,6 +78,27 @@ def submission_file(name, rev, group, format, templatename, author=None, email=N
     file.name = "%s-%s.%s" % (name, rev, format)
     return file, author
 
+class PassingTestChecker(object):
+    name = "passing test check"
+    symbol = ""
+
+    def check_file_txt(self, path):
+        return True, "Passed", 0, 0, {}
+
+class OtherPassingTestChecker(PassingTestChecker):
+    name = "other passing test check"
+
+class ThirdPassingTestChecker(PassingTestChecker):
+    name = "third passing test check"
+
+class SleepingTestChecker(object):
+    name = "sleeping test check"
+    symbol = ""
+
+    def check_file_txt(self, path):
+        time.sleep(30)
+        return True, "Passed", 0, 0, {}
+
 class SubmitTests(TestCase):
     def setUp(self):
         self.saved_idsubmit_staging_path = settings.IDSUBMIT_STAGING_PATH
@@ -1048,6 +1076,106 @@ class SubmitTests(TestCase):
         if settings.SUBMIT_YANGLINT_COMMAND:
             self.assertIn("No validation errors", m)
 
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_checker_results_cached(self):
+        cache.clear()
+        file, __ = submission_file("draft-yang-testing-cached", "00", None, "txt", "test_submission_invalid_yang.txt")
+        path = os.path.join(self.staging_dir, "draft-yang-testing-cached-00.txt")
+        with open(path, "w") as f:
+            f.write(file.getvalue())
+
+        idnits_result = DraftIdnitsChecker().check_file_txt(path)
+        yang_result = DraftYangChecker().check_file_txt(path)
+        self.assertEqual(yang_result[2], 1)
+
+        # checking the unchanged file again doesn't run the external tools
+        with patch("ietf.submit.checkers.run", side_effect=AssertionError("external tool run")):
+            self.assertEqual(DraftIdnitsChecker().check_file_txt(path), idnits_result)
+            result = DraftYangChecker().check_file_txt(path)
+            self.assertEqual(result[0], yang_result[0])
+            self.assertEqual(result[2:4], yang_result[2:4])
+            self.assertEqual(json.dumps(result[4]["code"]), json.dumps(yang_result[4]["code"]))
+
+        # a changed file is checked again
+        with open(path, "a") as f:
+            f.write("\n")
+        with patch("ietf.submit.checkers.run", return_value=(0, "", "")) as run:
+            DraftIdnitsChecker().check_file_txt(path)
+            self.assertTrue(run.called)
+
+        # and so is a module when another module of the draft changes
+        with open(path, "a") as f:
+            f.write('   <CODE BEGINS> file "example-imported@2018-10-01.yang"\n\n'
+                    '   module example-imported {\n'
+                    '     namespace "urn:example:imported";\n'
+                    '     prefix "ei";\n'
+                    '   }\n\n'
+                    '   <CODE ENDS>\n')
+        with patch("ietf.submit.checkers.run", return_value=(0, "", "")) as run:
+            DraftYangChecker().check_file_txt(path)
+            self.assertTrue(any("ietf-yang-metadata@2016-08-05.yang" in str(c) for c in run.call_args_list))
+
+    @override_settings(IDSUBMIT_CHECKERS_IN_BACKGROUND=True)
+    def test_submit_with_checkers_in_background(self):
+        name = "draft-authorname-testing-background"
+        status_url, author = self.do_submission(name, "00")
+
+        # the checkers are queued instead of run in the upload request
+        submission = Submission.objects.get(name=name)
+        self.assertEqual(submission.checks.count(), 0)
+        self.assertEqual(submission.queued_checks.count(), len(settings.IDSUBMIT_CHECKER_CLASSES))
+
+        r = self.client.get(status_url)
+        self.assertContains(r, "submission checks are still running: 0 of %s" % len(settings.IDSUBMIT_CHECKER_CLASSES))
+        q = PyQuery(r.content)
+        self.assertEqual(len(q('[type=submit]:contains("Post")')), 0)
+
+        call_command("run_submission_checkers", processes=1)
+        self.assertEqual(submission.queued_checks.count(), 0)
+        self.assertEqual(submission.checks.count(), len(settings.IDSUBMIT_CHECKER_CLASSES))
+        self.assertTrue(submission.checks.filter(checker="idnits check").exists())
+
+        r = self.client.get(status_url)
+        self.assertNotContains(r, "still running")
+        q = PyQuery(r.content)
+        self.assertEqual(len(q('[type=submit]:contains("Post")')), 1)
+
+    @override_settings(IDSUBMIT_CHECKERS_IN_BACKGROUND=True,
+                       IDSUBMIT_CHECKER_CLASSES=["ietf.submit.tests.PassingTestChecker", "ietf.submit.tests.SleepingTestChecker"])
+    def test_queued_checkers_timeout(self):
+        name = "draft-authorname-testing-timeout"
+        self.do_submission(name, "00")
+        submission = Submission.objects.get(name=name)
+        self.assertEqual(submission.queued_checks.count(), 2)
+
+        # the workers don't use the database, and closing the connection
+        # would end the test transaction
+        with patch("ietf.submit.utils.connections.close_all"):
+            call_command("run_submission_checkers", processes=2, timeout=1)
+        self.assertEqual(submission.queued_checks.count(), 0)
+        self.assertTrue(submission.checks.get(checker="passing test check").passed)
+        check = submission.checks.get(checker="sleeping test check")
+        self.assertFalse(check.passed)
+        self.assertIn("more than 1 seconds", check.message)
+
+    @override_settings(IDSUBMIT_CHECKERS_IN_BACKGROUND=True,
+                       IDSUBMIT_CHECKER_CLASSES=["ietf.submit.tests.PassingTestChecker",
+                                                 "ietf.submit.tests.OtherPassingTestChecker",
+                                                 "ietf.submit.tests.ThirdPassingTestChecker"])
+    def test_queued_checkers_in_several_processes(self):
+        name = "draft-authorname-testing-processes"
+        self.do_submission(name, "00")
+        submission = Submission.objects.get(name=name)
+        self.assertEqual(submission.queued_checks.count(), 3)
+
+        with patch("ietf.submit.utils.connections.close_all"):
+            call_command("run_submission_checkers", processes=2, timeout=10)
+        self.assertEqual(submission.queued_checks.count(), 0)
+        # each queued checker is run, and saved, exactly once
+        self.assertEqual(sorted(submission.checks.values_list("checker", flat=True)),
+                         ["other passing test check", "passing test check", "third passing test check"])
+        self.assertTrue(all(c.passed for c in submission.checks.all()))
+
 
 class ApprovalsTestCase(TestCase):
     def test_approvals(self):
@@ -2,11 +2,15 @@
 
 import os
 import datetime
+import multiprocessing
+import time
 import six                              # pyflakes:ignore
 import xml2rfc
 
 from django.conf import settings
 from django.core.validators import validate_email, ValidationError
+from django.db import connections, transaction
+from django.db.models import Q
 from django.utils.module_loading import import_string
 
 import debug                            # pyflakes:ignore
@@ -25,7 +29,8 @@ from ietf.person.models import Person, Email
 from ietf.community.utils import update_name_contains_indexes_with_new_doc
 from ietf.submit.mail import ( announce_to_lists, announce_new_version, announce_to_authors,
     send_approval_request_to_group, send_submission_confirmation )
-from ietf.submit.models import Submission, SubmissionEvent, Preapproval, DraftSubmissionStateName, SubmissionCheck
+from ietf.submit.models import ( Submission, SubmissionEvent, Preapproval, DraftSubmissionStateName,
+    SubmissionCheck, QueuedSubmissionCheck )
 from ietf.utils import log
 from ietf.utils.accesstoken import generate_random_key
 from ietf.utils.draft import Draft
@@ -698,25 +703,157 @@ def fill_in_submission(form, submission, authors, abstract, file_size):
 
     submission.formal_languages.set(FormalLanguageName.objects.filter(slug__in=form.parsed_draft.get_formal_languages()))
 
-def apply_checkers(submission, file_name):
-    # run submission checkers
-    def apply_check(submission, checker, method, fn):
-        func = getattr(checker, method)
-        passed, message, errors, warnings, info = func(fn)
-        check = SubmissionCheck(submission=submission, checker=checker.name, passed=passed,
-                                message=message, errors=errors, warnings=warnings, items=info,
-                                symbol=checker.symbol)
-        check.save()
-
+def submission_checker_runs(file_name):
+    """Return (checker path, method, file path) for each of the checkers to
+    run on the files of a submission."""
+    runs = []
     for checker_path in settings.IDSUBMIT_CHECKER_CLASSES:
         checker_class = import_string(checker_path)
-        checker = checker_class()
         # ordered list of methods to try
         for method in ("check_fragment_xml", "check_file_xml", "check_fragment_txt", "check_file_txt", ):
             ext = method[-3:]
-            if hasattr(checker, method) and ext in file_name:
-                apply_check(submission, checker, method, file_name[ext])
+            if hasattr(checker_class, method) and ext in file_name:
+                runs.append((checker_path, method, file_name[ext]))
+                break
+    return runs
+
+def run_checker(checker_path, method, path):
+    checker = import_string(checker_path)()
+    passed, message, errors, warnings, info = getattr(checker, method)(path)
+    return checker.name, checker.symbol, passed, message, errors, warnings, info
+
+def save_check(submission, result):
+    name, symbol, passed, message, errors, warnings, info = result
+    return SubmissionCheck.objects.create(submission=submission, checker=name, passed=passed,
+                                          message=message, errors=errors, warnings=warnings, items=info,
+                                          symbol=symbol)
+
+def apply_checkers(submission, file_name, background=False):
+    """Run the submission checkers on the files of the submission, or with
+    background set, queue them for run_queued_checkers()."""
+    for checker_path, method, path in submission_checker_runs(file_name):
+        if background:
+            QueuedSubmissionCheck.objects.create(submission=submission, checker=checker_path, method=method, path=path)
+        else:
+            save_check(submission, run_checker(checker_path, method, path))
+
+def _run_checker_in_process(conn, checker_path, method, path):
+    try:
+        result = run_checker(checker_path, method, path)
+    except Exception as e:
+        log.log("Exception when running %s on %s: %s" % (checker_path, path, e))
+        result = e
+    conn.send(result)
+    conn.close()
+
+def failed_check_result(queued, message):
+    checker_class = import_string(queued.checker)
+    return checker_class.name, checker_class.symbol, False, message, 1, 0, {'checker': checker_class.name, 'items': [], 'code': {}}
+
+def claim_queued_checks(limit=None):
+    """Mark queued checks as started, so concurrent runs don't pick them up
+    too.  Checks started more than twice the checker timeout ago are taken
+    to be left over from a run that died, and are claimed again."""
+    now = datetime.datetime.now()
+    stale = now - datetime.timedelta(seconds=2 * settings.IDSUBMIT_CHECKER_TIMEOUT)
+    with transaction.atomic():
+        queued = QueuedSubmissionCheck.objects.select_for_update().filter(Q(started=None) | Q(started__lt=stale)).order_by("time", "pk")
+        if limit:
+            queued = queued[:limit]
+        pks = list(queued.values_list("pk", flat=True))
+        QueuedSubmissionCheck.objects.filter(pk__in=pks).update(started=now)
+    return list(QueuedSubmissionCheck.objects.filter(pk__in=pks).select_related("submission").order_by("time", "pk"))
+
+def finish_queued_check(queued, result):
+    with transaction.atomic():
+        check = save_check(queued.submission, result)
+        queued.delete()
+    return check
+
+def run_queued_checkers(processes=None, timeout=None, limit=None):
+    """Run the queued submission checkers, each in its own worker process
+    with up to the given number of them running at the same time.  A
+    checker which runs for longer than timeout seconds is stopped and
+    recorded as failed.  The result of each checker is saved as soon as
+    it's done, so the submission status page can show the progress.
+    With processes set to 1 the checkers are run one by one in this
+    process, without a timeout.  Returns the list of saved checks."""
+    if processes is None:
+        processes = settings.IDSUBMIT_CHECKER_PROCESSES
+    if timeout is None:
+        timeout = settings.IDSUBMIT_CHECKER_TIMEOUT
+
+    def claim(n):
+        # checks are claimed only as they're about to be run, so their
+        # started time says when they were actually begun
+        if limit is not None:
+            n = min(n, limit - claimed[0])
+        if n <= 0:
+            return []
+        queued = claim_queued_checks(n)
+        claimed[0] += len(queued)
+        return queued
+    claimed = [0]
+
+    checks = []
+
+    if processes <= 1:
+        while True:
+            queued = claim(1)
+            if not queued:
                 break
+            q = queued[0]
+            try:
+                result = run_checker(q.checker, q.method, q.path)
+            except Exception as e:
+                log.log("Exception when running %s on %s: %s" % (q.checker, q.path, e))
+                result = failed_check_result(q, "The check failed: %s" % e)
+            checks.append(finish_queued_check(q, result))
+        return checks
+
+    running = []                        # (queued, process, connection, deadline)
+    while True:
+        for q in claim(processes - len(running)):
+            # the forked workers open their own database connections,
+            # they mustn't share the one inherited from this process
+            connections.close_all()
+            parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+            p = multiprocessing.Process(target=_run_checker_in_process, args=(child_conn, q.checker, q.method, q.path))
+            p.start()
+            child_conn.close()
+            running.append((q, p, parent_conn, time.time() + timeout))
+
+        if not running:
+            break
+
+        done = False
+        for entry in list(running):
+            q, p, conn, deadline = entry
+            if conn.poll():
+                try:
+                    result = conn.recv()
+                except EOFError:
+                    result = Exception("the checker process exited unexpectedly")
+                if isinstance(result, Exception):
+                    result = failed_check_result(q, "The check failed: %s" % result)
+                p.join()
+            elif not p.is_alive():
+                result = failed_check_result(q, "The check failed: the checker process exited with code %s" % p.exitcode)
+            elif time.time() > deadline:
+                p.terminate()
+                p.join()
+                result = failed_check_result(q, "The check was stopped after running for more than %s seconds." % timeout)
+            else:
+                continue
+            conn.close()
+            running.remove(entry)
+            checks.append(finish_queued_check(q, result))
+            done = True
+
+        if not done:
+            time.sleep(0.1)
+
+    return checks
 
 def send_confirmation_emails(request, submission, requires_group_approval, requires_prev_authors_approval):
     docevent_from_submission(request, submission, desc="Uploaded new revision")
@@ -51,7 +51,7 @@ def upload_submission(request):
                     log("Exception: %s\n" % e)
                     raise
 
-                apply_checkers(submission, file_name)
+                apply_checkers(submission, file_name, background=settings.IDSUBMIT_CHECKERS_IN_BACKGROUND)
 
                 create_submission_event(request, submission, desc="Uploaded submission")
                 # Don't add an "Uploaded new revision doevent yet, in case of cancellation
@@ -191,6 +191,7 @@ def submission_status(request, submission_id, access_token=None):
 
     errors = validate_submission(submission)
     passes_checks = all([ c.passed!=False for c in submission.checks.all() ])
+    pending_checks = submission.queued_checks.count()
 
     is_secretariat = has_role(request.user, "Secretariat")
     is_chair = submission.group and submission.group.has_role(request.user, "chair")
@@ -238,6 +239,9 @@ def submission_status(request, submission_id, access_token=None):
         if action == "autopost" and submission.state_id == "uploaded":
             if not can_edit:
                 return HttpResponseForbidden("You do not have permission to perform this action")
+            if pending_checks:
+                # the page showed the checks as still running, let the user wait for them
+                return HttpResponseRedirect("")
 
             submitter_form = SubmitterForm(request.POST, prefix="submitter")
             replaces_form = ReplacesForm(request.POST, name=submission.name)
@@ -336,6 +340,8 @@ def submission_status(request, submission_id, access_token=None):
         'submission': submission,
         'errors': errors,
         'passes_checks': passes_checks,
+        'pending_checks': pending_checks,
+        'finished_checks': submission.checks.count(),
         'submitter_form': submitter_form,
         'replaces_form': replaces_form,
         'message': message,
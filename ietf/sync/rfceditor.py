@@ -14,6 +14,7 @@ from ietf.doc.models import ( Document, DocAlias, State, StateType, DocEvent, Do
     DocTagName, DocTypeName, RelatedDocument )
 from ietf.doc.expire import move_draft_files_to_archive
 from ietf.doc.utils import add_state_change_event, prettify_std_name
+from ietf.doc.utils_relations import update_reference_index
 from ietf.group.models import Group
 from ietf.name.models import StdLevelName, StreamName
 from ietf.person.models import Person
@@ -501,6 +502,10 @@ def update_docs_from_rfc_index(data, skip_older_than_date=None):
 
             doc.save_with_history(events)
 
+            # the name, title, state and level shown for references from
+            # and to the document may have changed
+            update_reference_index(sources=[doc], targets=[doc])
+
         if changes:
             yield changes, doc, rfc_published
 
@@ -12,6 +12,11 @@ Mailing list alias dumping utilities
 
 """
 
+import mmap
+import os
+import re
+from tempfile import mkstemp
+
 from django.conf import settings
 
 import debug                            # pyflakes:ignore
@@ -75,3 +80,137 @@ def dump_sublist(afile, vfile, alias, adomains, vdomain, emails):
         return []
     return emails
 
+
+# Sorted index of the expand- entries of a postfix virtual file, written
+# beside it by write_virtual_index(), with lines of the form
+# "<name>\t<suffix>\t<expansion>", ordered by name.  The first line holds
+# the number of entries and of lines in the virtual file, and its
+# modification time and size, to tell whether the index is up to date.
+# Looking up the aliases of a name is a binary search in the mmapped index.
+
+VIRTUAL_EXPAND_RE = re.compile(r'^expand-(.*?)(\..*?)?@.*? +(.*)$')
+
+def virtual_index_path(virtual_path):
+    return virtual_path + ".index"
+
+def _virtual_file_signature(virtual_path):
+    st = os.stat(virtual_path)
+    return "%r %d" % (st.st_mtime, st.st_size)
+
+def _read_virtual_file(virtual_path, name=None):
+    """Return the (name, suffix, expansion) entries of the virtual file at
+    virtual_path, or those of the given name, and the number of lines."""
+    entries = []
+    line_count = 0
+    with open(virtual_path, "r") as virtual_file:
+        for line in virtual_file:
+            line_count += 1
+            m = VIRTUAL_EXPAND_RE.match(line)
+            if m and (not name or m.group(1) == name):
+                entries.append((m.group(1), m.group(2) or "", m.group(3)))
+    return entries, line_count
+
+def write_virtual_index(virtual_path):
+    """Write the index of the virtual file at virtual_path.  Returns the
+    number of entries.  Raises OSError if the index can't be written."""
+    # create the temporary file first, so a read-only index directory
+    # fails before the virtual file has been parsed for nothing
+    index_path = virtual_index_path(virtual_path)
+    t, tempname = mkstemp(dir=os.path.dirname(os.path.abspath(index_path)), prefix=".%s." % os.path.basename(index_path))
+    try:
+        with os.fdopen(t, "w") as index_file:
+            signature = _virtual_file_signature(virtual_path)
+            entries, line_count = _read_virtual_file(virtual_path)
+            # stable, so the aliases of a name stay in file order
+            entries.sort(key=lambda e: e[0])
+            index_file.write("# %d %d %s\n" % (len(entries), line_count, signature))
+            for entry in entries:
+                index_file.write("%s\t%s\t%s\n" % entry)
+        os.chmod(tempname, 0644)
+        os.rename(tempname, index_path)
+    except:
+        os.unlink(tempname)
+        raise
+    return len(entries)
+
+def _virtual_index_header(index_path):
+    try:
+        with open(index_path, "r") as index_file:
+            return index_file.readline().split(None, 3)
+    except IOError:
+        return None
+
+def ensure_virtual_index(virtual_path):
+    """Return the path of the index of the virtual file at virtual_path,
+    rewriting the index first if it's out of date, or None if the index
+    can't be written."""
+    index_path = virtual_index_path(virtual_path)
+    header = _virtual_index_header(index_path)
+    try:
+        signature = _virtual_file_signature(virtual_path)
+    except OSError as e:
+        raise IOError(e.errno, e.strerror, virtual_path)
+    if not header or len(header) < 4 or header[3].strip() != signature:
+        try:
+            write_virtual_index(virtual_path)
+        except OSError:
+            return None
+    return index_path
+
+def _line_start(mm, pos):
+    """Return the offset of the first line starting at or after pos."""
+    if pos == 0:
+        return 0
+    i = mm.find("\n", pos - 1)
+    return len(mm) if i < 0 else i + 1
+
+def _line_end(mm, start):
+    i = mm.find("\n", start)
+    return len(mm) if i < 0 else i
+
+def _lookup_virtual_index(index_path, name=None):
+    with open(index_path, "rb") as index_file:
+        mm = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            # skip the header
+            start = _line_start(mm, 1)
+            if name:
+                lo, hi = start, len(mm)
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    pos = _line_start(mm, mid)
+                    if pos < len(mm) and mm[pos:_line_end(mm, pos)].split("\t", 1)[0] < name:
+                        lo = mid + 1
+                    else:
+                        hi = mid
+                start = _line_start(mm, lo)
+            entries = []
+            while start < len(mm):
+                end = _line_end(mm, start)
+                entry = tuple(mm[start:end].split("\t", 2))
+                if name and entry[0] != name:
+                    break
+                entries.append(entry)
+                start = end + 1
+            return entries
+        finally:
+            mm.close()
+
+def get_virtual_aliases(virtual_path, name=None):
+    """Return the (name, suffix, expansion) entries for the given name in
+    the virtual file at virtual_path, or all entries if no name is given,
+    looked up in the index of the file."""
+    index_path = ensure_virtual_index(virtual_path)
+    if not index_path:
+        return _read_virtual_file(virtual_path, name)[0]
+    return _lookup_virtual_index(index_path, name)
+
+def virtual_alias_counts(virtual_path):
+    """Return the number of entries in the virtual file at virtual_path,
+    and the number of lines in it."""
+    index_path = ensure_virtual_index(virtual_path)
+    if not index_path:
+        entries, line_count = _read_virtual_file(virtual_path)
+        return len(entries), line_count
+    header = _virtual_index_header(index_path)
+    return int(header[1]), int(header[2])
@@ -82,6 +82,77 @@ month_names = [ 'january', 'february', 'march', 'april', 'may', 'june', 'july',
 month_names_abbrev3 = [ n[:3] for n in month_names ]
 month_names_abbrev4 = [ n[:4] for n in month_names ]
 
+# Patterns used for every line of a draft are compiled once, here, rather
+# than looked up in the re module's small pattern cache for each line.  The
+# page header and footer patterns are only tried on lines which contain the
+# literal text they require, see Draft._stripheaders().
+
+backspace_re = re.compile(".\x08")
+page_footer_re = re.compile("\[?page [0-9ivx]+\]?[ \t\f]*$", re.I)
+internet_draft_header_re = re.compile("^ *Internet.Draft.+  .+[12][0-9][0-9][0-9] *$", re.I)
+draft_header_re = re.compile("^ *Draft.+[12][0-9][0-9][0-9] *$", re.I)
+rfc_header_re = re.compile("^RFC[ -]?[0-9]+.*(  +)[12][0-9][0-9][0-9]$", re.I)
+draftname_footer_re = re.compile("^draft-[-a-z0-9_.]+.*[0-9][0-9][0-9][0-9]$", re.I)
+date_header_re = re.compile(".{58,}(Jan|Feb|Mar|March|Apr|April|May|Jun|June|Jul|July|Aug|Sep|Oct|Nov|Dec) (19[89][0-9]|20[0-9][0-9]) *$", re.I)
+draftname_header_re = re.compile("^ *draft-[-a-z0-9_.]+ *$", re.I)
+page_label_re = re.compile("\[page [0-9ixldv]+\]", re.I)
+
+# Author extraction patterns
+
+author_aux = {
+    "honor" : r"(?:[A-Z]\.|Dr\.?|Dr\.-Ing\.|Prof(?:\.?|essor)|Sir|Lady|Dame|Sri)",
+    "prefix": r"([Dd]e|Hadi|van|van de|van der|Ver|von|[Ee]l)",
+    "suffix": r"(jr.?|Jr.?|II|2nd|III|3rd|IV|4th)",
+    "first" : r"([A-Z][-A-Za-z'`~]*)(( ?\([A-Z][-A-Za-z'`~]*\))?(\.?[- ]{1,2}[A-Za-z'`~]+)*)",
+    "last"  : r"([-A-Za-z'`~]{2,})",
+    "months": r"(January|February|March|April|May|June|July|August|September|October|November|December)",
+    "mabbr" : r"(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\.?",
+    }
+author_company_formats = [ re.compile(f % author_aux) for f in [
+    r" {6}(?P<author>(%(first)s[ \.]{1,3})+((%(prefix)s )?%(last)s)( %(suffix)s)?), (?P<company>[^.]+\.?)$",
+    r" {6}(?P<author>(%(first)s[ \.]{1,3})+((%(prefix)s )?%(last)s)( %(suffix)s)?) *\((?P<company>[^.]+\.?)\)$",
+] ]
+author_formats = [ re.compile(f % author_aux) for f in [
+    r" {6}((%(first)s[ \.]{1,3})+((%(prefix)s )?%(last)s)( %(suffix)s)?)(, ([^.]+\.?|\([^.]+\.?|\)))?,?$",
+    r" {6}(((%(prefix)s )?%(last)s)( %(suffix)s)?, %(first)s)?$",
+    r" {6}(%(last)s)$",
+] ]
+multi_author_formats = [ (re.compile(l % author_aux), re.compile(a % author_aux)) for l, a in [
+    (
+        r" {6}(%(first)s[ \.]{1,3}((%(prefix)s )?%(last)s)( %(suffix)s)?)(, ?%(first)s[ \.]{1,3}((%(prefix)s )?%(last)s)( %(suffix)s)?)+$",
+        r"(%(first)s[ \.]{1,3}((%(prefix)s )?%(last)s)( %(suffix)s)?)"
+    ),
+] ]
+editor_formats = [ re.compile(f) for f in [
+    r"(?:, | )([Ee]d\.?|\([Ee]d\.?\)|[Ee]ditor)$",
+] ]
+company_formats = [ re.compile(f) for f in [
+    r" {6}(([A-Za-z'][-A-Za-z0-9.& ']+)(,? ?(Inc|Ltd|AB|S\.A)\.?))$",
+    r" {6}(([A-Za-z'][-A-Za-z0-9.& ']+)(/([A-Za-z'][-A-Za-z0-9.& ']+))+)$",
+    r" {6}([a-z0-9.-]+)$",
+    r" {6}(([A-Za-z'][-A-Za-z0-9.&']+)( [A-Za-z'][-A-Za-z0-9.&']+)*)$",
+    r" {6}(([A-Za-z'][-A-Za-z0-9.']+)( & [A-Za-z'][-A-Za-z0-9.']+)*)$",
+    r" {6}\((.+)\)$",
+    r" {6}(\w+\s?\(.+\))$",
+] ]
+author_date_re = re.compile(r"(((%(months)s|%(mabbr)s) \d+, |\d+ (%(months)s|%(mabbr)s),? |\d+/\d+/)\d\d\d\d|\d\d\d\d-\d\d-\d\d)$" % author_aux)
+author_suffix_re = re.compile(" %(suffix)s$" % author_aux)
+author_prefix_re = re.compile(" %(prefix)s$" % author_aux)
+address_section_re = re.compile(r"^ *([0-9]+\.)? *(Author|Editor)('s|s'|s|\(s\)) (Address|Addresses|Information)")
+
+# Usually, the contact info lines will look like this: "Email:
+# someone@example.com" or "Tel: +1 (412)-2390 23123", but sometimes the : is
+# left out. That's okay for things we can't misinterpret, but "tel" may match
+# "Tel Aviv 69710, Israel" so match
+# - misc contact info
+# - tel/fax [number]
+# - [phone number]
+# - [email]
+other_contact_info_re = re.compile(r'^(((contact )?e|\(e|e-|m|electronic )?mail|email_id|mailto|e-main|(tele)?phone|voice|mobile|work|uri|url|tel:)\b|^((ph|tel\.?|telefax|fax) *[:.]? *\(?( ?\+ ?)?[0-9]+)|^(\++[0-9]+|\(\+*[0-9]+\)|\(dsn\)|[0-9]+)([ -.]*\b|\b[ -.]*)(([0-9]{2,}|\([0-9]{2,}\)|(\([0-9]\)|[0-9])[ -][0-9]{2,}|\([0-9]\)[0-9]+)([ -.]+([0-9]+|\([0-9]+\)))+|([0-9]{7,}|\([0-9]{7,}\)))|^(<?[-a-z0-9._+]+|{([-a-z0-9._+]+, ?)+[-a-z0-9._+]+})@[-a-z0-9._]+>?|^https?://|^www\.')
+email_re = re.compile("[-A-Za-z0-9_.+]+@[-A-Za-z0-9_.]+")
+obfuscated_at_re = re.compile(" *(?:\(at\)| <at> | at ) *")
+obfuscated_dot_re = re.compile(" *(?:\(dot\)| <dot> | dot ) *")
+
 # ----------------------------------------------------------------------
 # Functions
 # ----------------------------------------------------------------------
@@ -131,7 +202,8 @@ class Draft():
         self.rawtext = text
         self.name_from_source = name_from_source
 
-        text = re.sub(".\x08", "", text)    # Get rid of inkribbon backspace-emphasis
+        if "\x08" in text:
+            text = backspace_re.sub("", text)   # Get rid of inkribbon backspace-emphasis
         text = text.replace("\r\n", "\n")   # Convert DOS to unix
         text = text.replace("\r", "\n")     # Convert MAC to unix
         text = text.strip()
@@ -160,6 +232,7 @@ class Draft():
         self._status = None
         self._creation_date = None
         self._title = None
+        self._refs = None
 
     # ------------------------------------------------------------------
     def _parse_draftname(self):
@@ -237,42 +310,47 @@ class Draft():
             if line:
                 page += [ line ]
             return pages, page, newpage
+        # Each line is classified in a single pass.  The header and footer
+        # patterns are only tried on lines containing the text they require,
+        # which rules out all but a few lines of each page; the remaining
+        # tests are plain string operations.
         for line in self.rawlines:
             linecount += 1
             line = line.rstrip()
-            if re.search("\[?page [0-9ivx]+\]?[ \t\f]*$", line, re.I):
+            lower = line.lower()
+            if "page" in lower and page_footer_re.search(line):
                 pages, page, newpage = endpage(pages, page, newpage, line)
                 continue
-            if re.search("\f", line, re.I):
+            if "\f" in line:
                 pages, page, newpage = begpage(pages, page, newpage)
                 continue
-            if re.search("^ *Internet.Draft.+  .+[12][0-9][0-9][0-9] *$", line, re.I):
-                pages, page, newpage = begpage(pages, page, newpage, line)
-                continue
-    #        if re.search("^ *Internet.Draft  +", line, re.I):
-    #            newpage = True
-    #            continue
-            if re.search("^ *Draft.+[12][0-9][0-9][0-9] *$", line, re.I):
-                pages, page, newpage = begpage(pages, page, newpage, line)
-                continue
-            if re.search("^RFC[ -]?[0-9]+.*(  +)[12][0-9][0-9][0-9]$", line, re.I):
+            if "draft" in lower:
+                if "internet" in lower and internet_draft_header_re.search(line):
+                    pages, page, newpage = begpage(pages, page, newpage, line)
+                    continue
+                if draft_header_re.search(line):
+                    pages, page, newpage = begpage(pages, page, newpage, line)
+                    continue
+            if lower.startswith("rfc") and rfc_header_re.search(line):
                 pages, page, newpage = begpage(pages, page, newpage, line)
                 continue
-            if re.search("^draft-[-a-z0-9_.]+.*[0-9][0-9][0-9][0-9]$", line, re.I):
+            if lower.startswith("draft-") and draftname_footer_re.search(line):
                 pages, page, newpage = endpage(pages, page, newpage, line)
                 continue
-            if linecount > 15 and re.search(".{58,}(Jan|Feb|Mar|March|Apr|April|May|Jun|June|Jul|July|Aug|Sep|Oct|Nov|Dec) (19[89][0-9]|20[0-9][0-9]) *$", line, re.I):
+            # 58 characters, a month and a year
+            if linecount > 15 and len(line) >= 66 and date_header_re.search(line):
                 pages, page, newpage = begpage(pages, page, newpage, line)
                 continue
-            if newpage and re.search("^ *draft-[-a-z0-9_.]+ *$", line, re.I):
+            if newpage and "draft-" in lower and draftname_header_re.search(line):
                 pages, page, newpage = begpage(pages, page, newpage, line)
                 continue
-            if re.search("^[^ \t]+", line):
+            if line and line[0] not in " \t":
                 sentence = True
-            if re.search("[^ \t]", line):
+            text = line.strip(" \t")
+            if text:
+                # 36 is a somewhat arbitrary count for a 'short' line
+                shortthis = len(line.strip()) < 36
                 if newpage:
-                    # 36 is a somewhat arbitrary count for a 'short' line
-                    shortthis = len(line.strip()) < 36 # 36 is a somewhat arbitrary count for a 'short' line
                     if sentence or (shortprev and not shortthis):
                         stripped += [""]
                 else:
@@ -281,10 +359,10 @@ class Draft():
                 blankcount = 0
                 sentence = False
                 newpage = False
-                shortprev = len(line.strip()) < 36 # 36 is a somewhat arbitrary count for a 'short' line
-            if re.search("[.:]$", line):
+                shortprev = shortthis
+            if line.endswith((".", ":")):
                 sentence = True
-            if re.search("^[ \t]*$", line):
+            if not text:
                 blankcount += 1
                 page += [ line ]
                 continue
@@ -297,7 +375,7 @@ class Draft():
     # ----------------------------------------------------------------------
     def get_pagecount(self):
         if self._pagecount == None:
-            label_pages = len(re.findall("\[page [0-9ixldv]+\]", self.text, re.I))
+            label_pages = len(page_label_re.findall(self.text))
             count_pages = len(self.pages)
             if label_pages > count_pages/2:
                 self._pagecount = label_pages
@@ -411,7 +489,7 @@ class Draft():
 
     # ------------------------------------------------------------------
     def get_abstract(self):
-        if self._abstract:
+        if self._abstract is not None:
             return self._abstract
         abstract_re = re.compile('^(\s*)abstract', re.I)
         header_re = re.compile("^(\s*)([0-9]+\.? |Appendix|Status of|Table of|Full Copyright|Copyright|Intellectual Property|Acknowled|Author|Index|Disclaimer).*", re.I)
@@ -505,47 +583,6 @@ class Draft():
         """Extract author information from draft text.
 
         """
-        aux = {
-            "honor" : r"(?:[A-Z]\.|Dr\.?|Dr\.-Ing\.|Prof(?:\.?|essor)|Sir|Lady|Dame|Sri)",
-            "prefix": r"([Dd]e|Hadi|van|van de|van der|Ver|von|[Ee]l)",
-            "suffix": r"(jr.?|Jr.?|II|2nd|III|3rd|IV|4th)",
-            "first" : r"([A-Z][-A-Za-z'`~]*)(( ?\([A-Z][-A-Za-z'`~]*\))?(\.?[- ]{1,2}[A-Za-z'`~]+)*)",
-            "last"  : r"([-A-Za-z'`~]{2,})",
-            "months": r"(January|February|March|April|May|June|July|August|September|October|November|December)",
-            "mabbr" : r"(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\.?",
-            }
-        authcompanyformats = [
-            r" {6}(?P<author>(%(first)s[ \.]{1,3})+((%(prefix)s )?%(last)s)( %(suffix)s)?), (?P<company>[^.]+\.?)$" % aux,
-            r" {6}(?P<author>(%(first)s[ \.]{1,3})+((%(prefix)s )?%(last)s)( %(suffix)s)?) *\((?P<company>[^.]+\.?)\)$" % aux,
-        ]
-        authformats = [
-            r" {6}((%(first)s[ \.]{1,3})+((%(prefix)s )?%(last)s)( %(suffix)s)?)(, ([^.]+\.?|\([^.]+\.?|\)))?,?$" % aux,
-            r" {6}(((%(prefix)s )?%(last)s)( %(suffix)s)?, %(first)s)?$" % aux,
-            r" {6}(%(last)s)$" % aux,
-        ]
-        multiauthformats = [
-            (
-                r" {6}(%(first)s[ \.]{1,3}((%(prefix)s )?%(last)s)( %(suffix)s)?)(, ?%(first)s[ \.]{1,3}((%(prefix)s )?%(last)s)( %(suffix)s)?)+$" % aux,
-                r"(%(first)s[ \.]{1,3}((%(prefix)s )?%(last)s)( %(suffix)s)?)" % aux
-            ),
-        ]
-        editorformats = [
-            r"(?:, | )([Ee]d\.?|\([Ee]d\.?\)|[Ee]ditor)$",
-        ]
-        companyformats = [
-            r" {6}(([A-Za-z'][-A-Za-z0-9.& ']+)(,? ?(Inc|Ltd|AB|S\.A)\.?))$",
-            r" {6}(([A-Za-z'][-A-Za-z0-9.& ']+)(/([A-Za-z'][-A-Za-z0-9.& ']+))+)$",
-            r" {6}([a-z0-9.-]+)$",
-            r" {6}(([A-Za-z'][-A-Za-z0-9.&']+)( [A-Za-z'][-A-Za-z0-9.&']+)*)$",
-            r" {6}(([A-Za-z'][-A-Za-z0-9.']+)( & [A-Za-z'][-A-Za-z0-9.']+)*)$",
-            r" {6}\((.+)\)$",
-            r" {6}(\w+\s?\(.+\))$",
-        ]
-
-        dateformat = r"(((%(months)s|%(mabbr)s) \d+, |\d+ (%(months)s|%(mabbr)s),? |\d+/\d+/)\d\d\d\d|\d\d\d\d-\d\d-\d\d)$" % aux
-
-        address_section = r"^ *([0-9]+\.)? *(Author|Editor)('s|s'|s|\(s\)) (Address|Addresses|Information)"
-
         ignore = [
             "Standards Track", "Current Practice", "Internet Draft", "Working Group",
             "Expiration Date", 
@@ -592,7 +629,7 @@ class Draft():
             author_on_line = False
 
             _debug( " ** " + line)
-            leading_space = len(re.findall("^ *", line)[0])
+            leading_space = len(line) - len(line.lstrip(" "))
             line_len = len(line.rstrip())
             trailing_space = line_len <= 72 and 72 - line_len or 0
             # Truncate long lines at the first space past column 80:
@@ -604,18 +641,18 @@ class Draft():
                 if (leading_space > 5 and abs(leading_space - trailing_space) < 5):
                     _debug("Breaking for centered line")
                     break
-                if re.search(dateformat, line):
+                if author_date_re.search(line):
                     if authors:
                         _debug("Breaking for dateformat after author name")
-                for editorformat in editorformats:
-                    if re.search(editorformat, line):
-                        line = re.sub(editorformat, "", line)
+                for editorformat in editor_formats:
+                    if editorformat.search(line):
+                        line = editorformat.sub("", line)
                         break
-                for lineformat, authformat in multiauthformats:
-                    match = re.search(lineformat, line)
+                for lineformat, authformat in multi_author_formats:
+                    match = lineformat.search(line)
                     if match:
-                        _debug("a. Multiauth format: '%s'" % lineformat)
-                        author_list = re.findall(authformat, line)
+                        _debug("a. Multiauth format: '%s'" % lineformat.pattern)
+                        author_list = authformat.findall(line)
                         authors += [ a[0] for a in author_list ]
                         companies += [ None for a in author_list ]
                         author_on_line = True
@@ -625,10 +662,10 @@ class Draft():
                             _debug("Author: '%s'" % author[0])
                         break
                 if not author_on_line:
-                    for lineformat in authcompanyformats:
-                        match = re.search(lineformat, line)
+                    for lineformat in author_company_formats:
+                        match = lineformat.search(line)
                         if match:
-                            _debug("b. Line format: '%s'" % lineformat)
+                            _debug("b. Line format: '%s'" % lineformat.pattern)
                             maybe_company = match.group("company").strip(" ,.")
                             # is the putative company name just a partial name, i.e., a part
                             # that commonly occurs after a comma as part of a company name,
@@ -646,10 +683,10 @@ class Draft():
                                 author_on_line = True
                                 break
                 if not author_on_line:
-                    for authformat in authformats:
-                        match = re.search(authformat, line)
+                    for authformat in author_formats:
+                        match = authformat.search(line)
                         if match:
-                            _debug("c. Auth format: '%s'" % authformat)
+                            _debug("c. Auth format: '%s'" % authformat.pattern)
                             author = match.group(1)
                             authors += [ author ]
                             companies += [ None ]
@@ -659,10 +696,10 @@ class Draft():
                             author_on_line = True
                             break
                 if not author_on_line:
-                    for authformat in companyformats:
-                        match = re.search(authformat, line)
+                    for authformat in company_formats:
+                        match = authformat.search(line)
                         if match:
-                            _debug("d. Company format: '%s'" % authformat)
+                            _debug("d. Company format: '%s'" % authformat.pattern)
                             company = match.group(1)
                             authors += [ "" ]
                             companies += [ company ]
@@ -707,10 +744,26 @@ class Draft():
         address_section_pos = last_line/2
         for i in range(last_line/2,last_line):
             line = self.lines[i]
-            if re.search(address_section, line):
+            if address_section_re.search(line):
                 address_section_pos = i
                 break
 
+        # The lines searched for each author name, last line first, with
+        # short forms of given names expanded.  Up to 8 name patterns are
+        # tried per author, so the forms are computed once, up front, and the
+        # patterns are compiled once each.
+        address_lines = []
+        for j in range(last_line, address_section_pos, -1):
+            line = self.lines[j]
+            forms = [ line ] + [ line.replace(short, longform[short]) for short in longform if short in line ]
+            address_lines.append((j, [ (form, form.strip()) for form in forms ]))
+        authpat_res = {}
+        other_author_res = {}
+        def other_author_re(a):
+            if not a in other_author_res:
+                other_author_res[a] = re.compile(r"(?i)(^|\W)"+re.sub("[. ]+", ".*", a)+"(\W|$)")
+            return other_author_res[a]
+
         found_pos = []
         company_or_author = None
         for i in range(len(authors)):
@@ -723,7 +776,7 @@ class Draft():
                 company_or_author = None
             if author in [ None, '', ]:
                 continue
-            suffix_match = re.search(" %(suffix)s$" % aux, author)
+            suffix_match = author_suffix_re.search(author)
             if suffix_match:
                 suffix = suffix_match.group(1)
                 author = author[:-len(suffix)].strip()
@@ -749,7 +802,7 @@ class Draft():
                         first = first.replace(".", ". ").strip()
             first = first.strip()
             last = last.strip()
-            prefix_match = re.search(" %(prefix)s$" % aux, first)
+            prefix_match = author_prefix_re.search(first)
             if prefix_match:
                 prefix = prefix_match.group(1)
                 first = first[:-len(prefix)].strip()
@@ -762,24 +815,25 @@ class Draft():
                     _debug("Author: "+author)
 
                     # Pattern for full author information search, based on first page author name:
-                    authpat = make_authpat(aux['honor'], left, right, aux['suffix'])
+                    authpat = make_authpat(author_aux['honor'], left, right, author_aux['suffix'])
                     _debug("Authpat: " + authpat)
+                    if not authpat in authpat_res:
+                        authpat_res[authpat] = re.compile(authpat)
+                    authre = authpat_res[authpat]
                     start = 0
                     col = None
                     # Find start of author info for this author (if any).
                     # Scan towards the front from the end of the file, looking for a match to authpath
-                    for j in range(last_line, address_section_pos, -1):
-                        line = self.lines[j]
-                        _debug( "Line: " + line)
-                        forms = [ line ] + [ line.replace(short, longform[short]) for short in longform if short in line ]
-                        for form in forms:
+                    for j, forms in address_lines:
+                        _debug( "Line: " + self.lines[j])
+                        for form, stripped_form in forms:
                             try:
-                                if re.search(authpat, form.strip()) and not j in found_pos:
+                                if authre.search(stripped_form) and not j in found_pos:
                                     _debug( "Match")
 
                                     start = j
                                     found_pos += [ start ]
-                                    _debug( " ==> start %s, normalized '%s'" % (start, form.strip()))
+                                    _debug( " ==> start %s, normalized '%s'" % (start, stripped_form))
                                     # The author info could be formatted in multiple columns...
                                     columns = re.split("(    +|  and  )", form)
                                     # _debug( "Columns:" + str(columns))
@@ -802,7 +856,7 @@ class Draft():
                                                 end = beg + len("".join(columns[col:col+2]))
                                                 _debug( "End2:  %d '%s'" % (end, "".join(columns[col:col+2])))
                                             _debug( "Cut:   '%s'" % form[beg:end])
-                                            author_match = re.search(authpat, columns[col].strip()).group(1)
+                                            author_match = authre.search(columns[col].strip()).group(1)
                                             _debug( "AuthMatch: '%s'" % (author_match,))
                                             if re.search('\(.*\)$', author_match.strip()):
                                                 author_match = author_match.rsplit('(',1)[0].strip()
@@ -884,7 +938,8 @@ class Draft():
     #                 for a in authors:
     #                     if a and a not in companies_seen:
     #                         _debug("Search for: %s"%(r"(^|\W)"+re.sub("\.? ", ".* ", a)+"(\W|$)"))
-                    authmatch = [ a for a in authors[i+1:] if a and not a.lower() in companies_seen and (re.search((r"(?i)(^|\W)"+re.sub("[. ]+", ".*", a)+"(\W|$)"), line.strip()) or acronym_match(a, line.strip()) )]
+                    stripped_line = line.strip()
+                    authmatch = [ a for a in authors[i+1:] if a and not a.lower() in companies_seen and (other_author_re(a).search(stripped_line) or acronym_match(a, stripped_line) )]
 
                     if authmatch:
                         _debug("     ? Other author or company ?  : %s" % authmatch)
@@ -912,8 +967,8 @@ class Draft():
                             column = l.replace('\t', 8 * ' ')[max(0, beg - 1):end].strip()
                         except:
                             column = l
-                        column = re.sub(" *(?:\(at\)| <at> | at ) *", "@", column)
-                        column = re.sub(" *(?:\(dot\)| <dot> | dot ) *", ".", column)
+                        column = obfuscated_at_re.sub("@", column)
+                        column = obfuscated_dot_re.sub(".", column)
                         column = re.sub("&cisco.com", "@cisco.com", column)
                         column = column.replace("\xa0", " ")
                         return column
@@ -930,27 +985,16 @@ class Draft():
 
                     #_debug( "  Column text :: " + column)
                     if nonblank_count >= 2 and blanklines == 0:
-                        # Usually, the contact info lines will look
-                        # like this: "Email: someone@example.com" or
-                        # "Tel: +1 (412)-2390 23123", but sometimes
-                        # the : is left out. That's okay for things we
-                        # can't misinterpret, but "tel" may match "Tel
-                        # Aviv 69710, Israel" so match
-                        # - misc contact info
-                        # - tel/fax [number]
-                        # - [phone number]
-                        # - [email]
-
-                        other_contact_info_regex = re.compile(r'^(((contact )?e|\(e|e-|m|electronic )?mail|email_id|mailto|e-main|(tele)?phone|voice|mobile|work|uri|url|tel:)\b|^((ph|tel\.?|telefax|fax) *[:.]? *\(?( ?\+ ?)?[0-9]+)|^(\++[0-9]+|\(\+*[0-9]+\)|\(dsn\)|[0-9]+)([ -.]*\b|\b[ -.]*)(([0-9]{2,}|\([0-9]{2,}\)|(\([0-9]\)|[0-9])[ -][0-9]{2,}|\([0-9]\)[0-9]+)([ -.]+([0-9]+|\([0-9]+\)))+|([0-9]{7,}|\([0-9]{7,}\)))|^(<?[-a-z0-9._+]+|{([-a-z0-9._+]+, ?)+[-a-z0-9._+]+})@[-a-z0-9._]+>?|^https?://|^www\.')
+                        # Look for the country, see other_contact_info_re
                         next_line_index = start + 1 + line_offset + 1
 
                         if (not country
-                            and not other_contact_info_regex.search(column.lower())
+                            and not other_contact_info_re.search(column.lower())
                             and next_line_index < len(self.lines)):
 
                             next_line_lower = columnify(self.lines[next_line_index]).lower().strip()
 
-                            if not next_line_lower or other_contact_info_regex.search(next_line_lower):
+                            if not next_line_lower or other_contact_info_re.search(next_line_lower):
                                 # country should be here, as the last
                                 # part of the address, right before an
                                 # empty line or other contact info
@@ -959,7 +1003,7 @@ class Draft():
 
                     _debug("3: authors[%s]: %s" % (i, authors[i]))
 
-                    emailmatch = re.search("[-A-Za-z0-9_.+]+@[-A-Za-z0-9_.]+", column)
+                    emailmatch = email_re.search(column)
                     if emailmatch and not "@" in author:
                         email = emailmatch.group(0).lower()
                         break
@@ -1019,6 +1063,8 @@ class Draft():
 
     # ------------------------------------------------------------------
     def get_refs(self):
+        if self._refs is not None:
+            return self._refs
         # Bill's horrible "references section" regexps, built up over lots of years
         # of fine tuning for different formats.
         # Examples:
@@ -1115,7 +1161,8 @@ class Draft():
         if self.filename in refs:
             del refs[self.filename]
 
-        return refs
+        self._refs = refs
+        return self._refs
 
     def old_get_refs( self ):
         refs = []
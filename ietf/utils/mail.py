@@ -2,12 +2,17 @@
 
 import copy
 import datetime
+import os
 import smtplib
+import socket
 import sys
 import textwrap
+import threading
 import time
 import traceback
 
+from contextlib import contextmanager
+
 from email.utils import make_msgid, formatdate, formataddr as simple_formataddr, parseaddr, getaddresses
 from email.mime.text import MIMEText
 from email.mime.message import MIMEMessage
@@ -72,6 +77,83 @@ class SMTPSomeRefusedRecipients(smtplib.SMTPException):
     def summary_refusals(self):
         return ", ".join(["%s (%s)"%(x,self.refusals[x][0]) for x in self.refusals])
 
+def smtp_connect():
+    """Open an SMTP connection based on the django email server settings."""
+    server = smtplib.SMTP()
+    #log("SMTP server: %s" % repr(server))
+    #if settings.DEBUG:
+    #    server.set_debuglevel(1)
+    conn_code, conn_msg = server.connect(SMTP_ADDR['ip4'], SMTP_ADDR['port'])
+    #log("SMTP connect: code: %s; msg: %s" % (conn_code, conn_msg))
+    if settings.EMAIL_HOST_USER and settings.EMAIL_HOST_PASSWORD:
+        server.ehlo()
+        if 'starttls' not in server.esmtp_features:
+            raise ImproperlyConfigured('password configured but starttls not supported')
+        (retval, retmsg) = server.starttls()
+        if retval != 220:
+            raise ImproperlyConfigured('password configured but tls failed: %d %s' % ( retval, retmsg ))
+        # Send a new EHLO, since without TLS the server might not
+        # advertise the AUTH capability.
+        server.ehlo()
+        server.login(settings.EMAIL_HOST_USER, settings.EMAIL_HOST_PASSWORD)
+    return server
+
+def smtp_quit(server):
+    try:
+        server.quit()
+    except (smtplib.SMTPServerDisconnected, socket.error):
+        server.close()
+
+# Within a reused_smtp_connection() block each thread keeps its SMTP
+# connection open between messages, until the end of the outermost block.
+# The pid is kept to avoid using a connection inherited by a forked worker
+# process.
+_smtp_pool = threading.local()
+
+def pooled_smtp_connection():
+    """Return an SMTP connection to send a message over, and whether it
+    has just been opened."""
+    server = getattr(_smtp_pool, "server", None)
+    if server:
+        _smtp_pool.server = None
+        if _smtp_pool.pid == os.getpid():
+            # make sure the server hasn't closed the kept connection
+            # before sending anything over it
+            try:
+                if server.noop()[0] == 250:
+                    return server, False
+            except (smtplib.SMTPServerDisconnected, socket.error):
+                pass
+            server.close()
+    return smtp_connect(), True
+
+def release_smtp_connection(server):
+    """Keep the connection a message was just sent over for the next
+    message in a reused_smtp_connection() block, or else close it."""
+    if getattr(_smtp_pool, "batch", False):
+        _smtp_pool.server = server
+        _smtp_pool.pid = os.getpid()
+    else:
+        smtp_quit(server)
+
+@contextmanager
+def reused_smtp_connection():
+    """Within the block, send_smtp() sends all messages over one SMTP
+    connection, reconnecting only if it fails, and the connection is
+    closed at the end of the block, for sending many messages in one go."""
+    if getattr(_smtp_pool, "batch", False):
+        yield
+        return
+    _smtp_pool.batch = True
+    try:
+        yield
+    finally:
+        _smtp_pool.batch = False
+        server = getattr(_smtp_pool, "server", None)
+        _smtp_pool.server = None
+        if server and _smtp_pool.pid == os.getpid():
+            smtp_quit(server)
+
 def send_smtp(msg, bcc=None):
     '''
     Send a Message via SMTP, based on the django email server settings.
@@ -93,29 +175,31 @@ def send_smtp(msg, bcc=None):
     else:
         if test_mode:
             outbox.append(msg)
+        start = time.time()
         server = None
         try:
-            server = smtplib.SMTP()
-            #log("SMTP server: %s" % repr(server))
-            #if settings.DEBUG:
-            #    server.set_debuglevel(1)
-            conn_code, conn_msg = server.connect(SMTP_ADDR['ip4'], SMTP_ADDR['port'])
-            #log("SMTP connect: code: %s; msg: %s" % (conn_code, conn_msg))
-            if settings.EMAIL_HOST_USER and settings.EMAIL_HOST_PASSWORD:
-                server.ehlo()
-                if 'starttls' not in server.esmtp_features:
-                    raise ImproperlyConfigured('password configured but starttls not supported')
-                (retval, retmsg) = server.starttls()
-                if retval != 220:
-                    raise ImproperlyConfigured('password configured but tls failed: %d %s' % ( retval, retmsg ))
-                # Send a new EHLO, since without TLS the server might not
-                # advertise the AUTH capability.
-                server.ehlo()
-                server.login(settings.EMAIL_HOST_USER, settings.EMAIL_HOST_PASSWORD)
-            unhandled = server.sendmail(frm, to, msg.as_string())
+            server, connected = pooled_smtp_connection()
+            try:
+                unhandled = server.sendmail(frm, to, msg.as_string())
+            except smtplib.SMTPSenderRefused as e:
+                if connected or e.smtp_code != 421:
+                    raise
+                # the server has timed out the kept connection; it says so
+                # in reply to MAIL, before anything of the message has been
+                # sent, so try once more over a new connection.  Failures
+                # after that aren't retried, the message may have gone out.
+                server.close()
+                server = smtp_connect()
+                connected = True
+                unhandled = server.sendmail(frm, to, msg.as_string())
+            release_smtp_connection(server)
+            server = None
             if unhandled != {}:
                 raise SMTPSomeRefusedRecipients(message="%d addresses were refused"%len(unhandled),original_msg=msg,refusals=unhandled)
         except Exception as e:
+            # don't keep a connection which may be in a bad state
+            if server:
+                server.close()
             # need to improve log message
             log("Exception while trying to send email from '%s' to %s subject '%s'" % (frm, to, msg.get('Subject', '[no subject]')))
             if isinstance(e, smtplib.SMTPException):
@@ -123,12 +207,25 @@ def send_smtp(msg, bcc=None):
                 raise 
             else:
                 raise smtplib.SMTPException({'really': sys.exc_info()[0], 'value': sys.exc_info()[1], 'tb': traceback.format_tb(sys.exc_info()[2])})
-        finally:
+        log("sent email from '%s' to %s id %s subject '%s' in %.3fs%s" % (frm, to, msg.get('Message-ID', ''), msg.get('Subject', '[no subject]'),
+            time.time() - start, " (new connection)" if connected else ""))
+
+def send_smtp_batch(messages):
+    """Send the given messages, or (message, bcc) pairs, over one SMTP
+    connection.  A message which can't be sent doesn't stop the rest;
+    returns a list of (message, exception) pairs for those."""
+    messages = list(messages)
+    failures = []
+    start = time.time()
+    with reused_smtp_connection():
+        for msg in messages:
+            msg, bcc = msg if isinstance(msg, tuple) else (msg, None)
             try:
-                server.quit()
-            except smtplib.SMTPServerDisconnected:
-                pass
-        log("sent email from '%s' to %s id %s subject '%s'" % (frm, to, msg.get('Message-ID', ''), msg.get('Subject', '[no subject]')))
+                send_smtp(msg, bcc)
+            except smtplib.SMTPException as e:
+                failures.append((msg, e))
+    log("sent batch of %d emails, %d failed, in %.3fs" % (len(messages), len(failures), time.time() - start))
+    return failures
     
 def copy_email(msg, to, toUser=False, originalBcc=None):
     '''
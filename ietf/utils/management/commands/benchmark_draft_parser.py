@@ -0,0 +1,88 @@
+# Copyright The IETF Trust 2018, All Rights Reserved
+from __future__ import print_function, unicode_literals
+
+import io
+import os
+import time
+
+from collections import OrderedDict
+from textwrap import dedent
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+import debug                            # pyflakes:ignore
+
+from ietf.utils.draft import Draft
+
+class Command(BaseCommand):
+    """
+    Measure the throughput of the draft text parser in ietf.utils.draft.
+
+    Parses the given draft text files, or the .txt files in the given
+    directories, and extracts the views the datatracker uses (pages,
+    authors, abstract, title, references), reporting the time spent in each
+    and the overall number of drafts and megabytes parsed per second.  With
+    no paths given, the drafts archive in INTERNET_ALL_DRAFTS_ARCHIVE_DIR is
+    used.
+
+    """
+
+    help = dedent(__doc__).strip()
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs="*", help="draft text files or directories of them")
+        parser.add_argument('--count', type=int, default=1000, help="Maximum number of drafts to parse (default %(default)s)")
+
+    def draft_files(self, paths, count):
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                names = sorted(n for n in os.listdir(path) if n.startswith(("draft-", "rfc")) and n.endswith(".txt"))
+                files += [ os.path.join(path, n) for n in names ]
+            elif os.path.exists(path):
+                files.append(path)
+            else:
+                raise CommandError("No such file or directory: %s" % path)
+            if len(files) >= count:
+                break
+        return files[:count]
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or [ settings.INTERNET_ALL_DRAFTS_ARCHIVE_DIR ]
+        files = self.draft_files(paths, options["count"])
+        if not files:
+            raise CommandError("No draft text files found in %s" % ", ".join(paths))
+
+        texts = []
+        for filename in files:
+            with io.open(filename, "rb") as f:
+                raw = f.read()
+            try:
+                texts.append((filename, raw.decode("utf8")))
+            except UnicodeDecodeError:
+                texts.append((filename, raw.decode("latin1")))
+
+        views = OrderedDict([
+            ("authors", Draft.get_author_list),
+            ("abstract", Draft.get_abstract),
+            ("title", Draft.get_title),
+            ("references", Draft.get_refs),
+        ])
+        seconds = OrderedDict([ ("pages", 0.0) ] + [ (name, 0.0) for name in views ])
+        size = 0
+        for filename, text in texts:
+            size += len(text)
+            start = time.time()
+            draft = Draft(text, filename)
+            seconds["pages"] += time.time() - start
+            for name, view in views.items():
+                start = time.time()
+                view(draft)
+                seconds[name] += time.time() - start
+
+        total = sum(seconds.values()) or 1e-9
+        for name, s in seconds.items():
+            self.stdout.write("%-12s %8.3fs %5.1f%%" % (name, s, 100 * s / total))
+        self.stdout.write("%d drafts, %.1f MB in %.3fs: %.1f drafts/s, %.2f MB/s" % (
+            len(texts), size / 1e6, total, len(texts) / total, size / 1e6 / total))
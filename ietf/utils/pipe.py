@@ -1,30 +1,159 @@
-# Simplified interface to os.popen3()
-
-def pipe(cmd, str=None):
-    from popen2 import Popen3 as Popen
-    bufsize = 4096
-    MAX = 65536*16
-
-    if str and len(str) > 4096:                 # XXX: Hardcoded Linux 2.4, 2.6 pipe buffer size
-        bufsize = len(str)
-
-    pipe = Popen(cmd, True, bufsize)
-    if not str is None:
-        pipe.tochild.write(str)
-        pipe.tochild.close()
-
-    out = ""
-    err = ""
-    while True:
-        str = pipe.fromchild.read()
-        if str:
-            out += str
-        code = pipe.poll()
-        if code > -1:
-            err = pipe.childerr.read()
+# Copyright The IETF Trust 2007-2018, All Rights Reserved
+#
+# Running external commands and collecting their output
+
+import errno
+import fcntl
+import os
+import resource
+import select
+import signal
+import subprocess
+import time
+
+from collections import defaultdict
+
+CHUNK_SIZE = 65536
+
+# Per-command count, total and maximum duration in seconds, and number of
+# timeouts, for the commands run by this process; see command_stats()
+_command_stats = defaultdict(lambda: { "count": 0, "seconds": 0.0, "max_seconds": 0.0, "timeouts": 0 })
+
+def command_stats():
+    """Return a dictionary from command name to the number of times it has
+    been run by this process, the total and maximum duration in seconds,
+    and the number of times it was stopped by a timeout."""
+    return dict((name, dict(stats)) for name, stats in _command_stats.items())
+
+def _set_nonblocking(fd):
+    fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+def _limit_cpu_time(seconds):
+    def limit():
+        resource.setrlimit(resource.RLIMIT_CPU, (seconds, seconds + 1))
+    return limit
+
+def run(args, input=None, timeout=None, cpu_timeout=None, max_output=None, cwd=None, env=None, name=None):
+    """Run the command given as an argument list, without a shell, feeding
+    it input if given.  Returns a tuple of the exit code, the output and
+    the error output.
+
+    The output streams are read as they become available, so a command
+    writing a lot to stderr can't block.  A command running for more than
+    timeout seconds of wall-clock time, using more than cpu_timeout
+    seconds of CPU time, or writing more than max_output bytes, is
+    stopped; the exit code is then negative and the reason is appended to
+    the error output.  The duration of each run is recorded, see
+    command_stats()."""
+    if name is None:
+        name = os.path.basename(args[0])
+    start = time.time()
+    deadline = start + timeout if timeout else None
+
+    try:
+        proc = subprocess.Popen(args, stdin=subprocess.PIPE if input is not None else None,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, close_fds=True,
+                                cwd=cwd, env=env,
+                                preexec_fn=_limit_cpu_time(cpu_timeout) if cpu_timeout else None)
+    except OSError as e:
+        # like a shell would report a missing command
+        return (127, "", "%s: %s" % (args[0], e.strerror))
+
+    out_fd, err_fd = proc.stdout.fileno(), proc.stderr.fileno()
+    outputs = { out_fd: [], err_fd: [] }
+    poller = select.poll()
+    for fd in outputs:
+        _set_nonblocking(fd)
+        poller.register(fd, select.POLLIN | select.POLLPRI)
+    open_fds = set(outputs.keys())
+    in_fd = None
+    if input:
+        in_fd = proc.stdin.fileno()
+        _set_nonblocking(in_fd)
+        poller.register(in_fd, select.POLLOUT)
+        open_fds.add(in_fd)
+    elif input is not None:
+        proc.stdin.close()
+    input_offset = 0
+
+    size = 0
+    stopped = None
+    while open_fds:
+        wait = None
+        if deadline:
+            wait = max(0, deadline - time.time()) * 1000
+        try:
+            events = poller.poll(wait)
+        except select.error as e:
+            if e.args[0] == errno.EINTR:
+                continue
+            raise
+        if not events and deadline and time.time() >= deadline:
+            stopped = "Command timed out after %s seconds" % timeout
             break
-        if len(out) >= MAX:
-            err = "Output exceeds %s bytes and has been truncated" % MAX
+        for fd, event in events:
+            if fd == in_fd:
+                try:
+                    input_offset += os.write(fd, input[input_offset:input_offset + CHUNK_SIZE])
+                except OSError as e:
+                    if e.errno != errno.EPIPE:
+                        raise
+                    input_offset = len(input)
+                if input_offset >= len(input):
+                    poller.unregister(fd)
+                    open_fds.discard(fd)
+                    proc.stdin.close()
+                continue
+            data = os.read(fd, CHUNK_SIZE)
+            if data:
+                outputs[fd].append(data)
+                size += len(data)
+            else:
+                poller.unregister(fd)
+                open_fds.discard(fd)
+        if max_output and size > max_output:
+            stopped = "Output exceeds %s bytes and has been truncated" % max_output
             break
 
+    if stopped:
+        proc.kill()
+        proc.wait()
+    else:
+        # the output has been closed, but the command may still be running
+        delay = 0.001
+        while proc.poll() is None:
+            if deadline and time.time() >= deadline:
+                stopped = "Command timed out after %s seconds" % timeout
+                proc.kill()
+                proc.wait()
+                break
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+
+    for f in (proc.stdin, proc.stdout, proc.stderr):
+        if f and not f.closed:
+            f.close()
+
+    code = proc.returncode
+    out = "".join(outputs[out_fd])
+    err = "".join(outputs[err_fd])
+    if cpu_timeout and code == -signal.SIGXCPU:
+        stopped = "Command exceeded the CPU time limit of %s seconds" % cpu_timeout
+    if stopped:
+        err += ("\n" if err and not err.endswith("\n") else "") + stopped
+
+    duration = time.time() - start
+    stats = _command_stats[name]
+    stats["count"] += 1
+    stats["seconds"] += duration
+    stats["max_seconds"] = max(stats["max_seconds"], duration)
+    if stopped and not stopped.startswith("Output"):
+        stats["timeouts"] += 1
+
     return (code, out, err)
+
+def pipe(cmd, str=None, timeout=None):
+    """Run the command given as a shell command line, see run().  New code
+    should use run() with an argument list instead."""
+    words = cmd.split()
+    return run(["/bin/sh", "-c", cmd], input=str, timeout=timeout, name=os.path.basename(words[0]) if words else "sh")
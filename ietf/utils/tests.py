@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import os.path
+import smtplib
 import types
 import shutil
 
@@ -8,7 +9,8 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from fnmatch import fnmatch
 from importlib import import_module
-from pipe import pipe
+from mock import patch
+from pipe import pipe, run, command_stats
 from StringIO import StringIO
 from textwrap import dedent
 from unittest import skipIf
@@ -30,7 +32,9 @@ from ietf.group.factories import GroupFactory
 from ietf.group.models import Group
 from ietf.submit.tests import submission_file
 from ietf.utils.draft import Draft, getmeta
-from ietf.utils.mail import send_mail_preformatted, send_mail_text, send_mail_mime, outbox 
+import ietf.utils.mail
+from ietf.utils.mail import ( send_mail_preformatted, send_mail_text, send_mail_mime, outbox,
+    send_smtp, send_smtp_batch, reused_smtp_connection )
 from ietf.utils.management.commands import pyflakes
 from ietf.utils.test_runner import get_template_paths, set_coverage_checking
 from ietf.utils.test_utils import TestCase
@@ -153,6 +157,44 @@ class TestSMTPServer(TestCase):
         send_complex_mail('good@example.com,poison@example.com')
         self.assertEqual(len(outbox),len_before+2)
 
+    def test_batch_and_reconnect(self):
+
+        def make_mail(to):
+            msg = MIMEText(u"dummy body")
+            msg['From'] = settings.DEFAULT_FROM_EMAIL
+            msg['To'] = to
+            msg['Subject'] = "Test for batch sending"
+            return msg
+
+        len_before = len(outbox)
+        failures = send_smtp_batch([ make_mail('good@example.com'), make_mail('poison@example.com'),
+                                     (make_mail('other@example.com'), 'bcc@example.com') ])
+        self.assertEqual(len(outbox),len_before+3)
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(failures[0][0]['To'], 'poison@example.com')
+
+        # a kept connection which has gone away is replaced
+        len_before = len(outbox)
+        with reused_smtp_connection():
+            send_smtp(make_mail('good@example.com'))
+            ietf.utils.mail._smtp_pool.server.close()
+            send_smtp(make_mail('good@example.com'))
+        self.assertEqual(len(outbox),len_before+2)
+        # and closed at the end of the block
+        self.assertEqual(ietf.utils.mail._smtp_pool.server, None)
+
+        # outside of a block, connections aren't kept
+        send_smtp(make_mail('good@example.com'))
+        self.assertEqual(ietf.utils.mail._smtp_pool.server, None)
+
+        # a message which may have been sent already isn't sent again
+        with reused_smtp_connection():
+            send_smtp(make_mail('good@example.com'))
+            with patch.object(ietf.utils.mail._smtp_pool.server, "data", side_effect=smtplib.SMTPServerDisconnected("connection lost")) as data:
+                with self.assertRaises(smtplib.SMTPException):
+                    send_smtp(make_mail('good@example.com'))
+            self.assertEqual(data.call_count, 1)
+
 
 def get_callbacks(urllist):
     callbacks = set()
@@ -400,6 +442,32 @@ class AdminTestCase(TestCase):
 #                 self.assertEqual(r.status_code, 200)
 
 
+class PipeTests(TestCase):
+    def test_run(self):
+        self.assertEqual(run(["cat"], input="x"*300000), (0, "x"*300000, ""))
+        # a command filling up stderr doesn't block
+        code, out, err = run(["sh", "-c", "head -c 1000000 /dev/zero >&2; echo done"])
+        self.assertEqual((code, out, len(err)), (0, "done\n", 1000000))
+        # the arguments aren't interpreted by a shell
+        self.assertEqual(run(["echo", "$HOME;", "*"])[1], "$HOME; *\n")
+        self.assertEqual(run(["/nonexistent/command"])[0], 127)
+        self.assertEqual(pipe("echo foo | tr a-z A-Z"), (0, "FOO\n", ""))
+
+    def test_run_limits(self):
+        before = command_stats().get("sleep", {}).get("timeouts", 0)
+        code, out, err = run(["sleep", "10"], timeout=0.2)
+        self.assertTrue(code < 0)
+        self.assertIn("timed out", err)
+        self.assertEqual(command_stats()["sleep"]["timeouts"], before + 1)
+
+        code, out, err = run(["sh", "-c", "while :; do :; done"], cpu_timeout=1, timeout=10)
+        self.assertTrue(code < 0)
+        self.assertIn("CPU time limit", err)
+
+        code, out, err = run(["yes"], max_output=100000)
+        self.assertTrue(code < 0)
+        self.assertIn("truncated", err)
+
 class DraftTests(TestCase):
 
     def setUp(self):
@@ -425,3 +493,19 @@ class DraftTests(TestCase):
             file.write(self.draft.text)
         self.assertEqual(getmeta(filename)['docdeststatus'],'Informational')
         shutil.rmtree(tempdir)
+
+    def test_pages_and_cached_views(self):
+        self.assertEqual(len(self.draft.pages), 2)
+        self.assertEqual(self.draft.get_pagecount(), 2)
+        self.assertFalse(any(u'[Page ' in line for line in self.draft.lines))
+        self.assertEqual(self.draft.get_abstract().strip(), u'This document describes how to test tests.')
+        self.assertIs(self.draft.get_refs(), self.draft.get_refs())
+
+    def test_benchmark_draft_parser(self):
+        tempdir = mkdtemp()
+        with open(os.path.join(tempdir, self.draft.source), 'w') as file:
+            file.write(self.draft.rawtext)
+        out = StringIO()
+        call_command('benchmark_draft_parser', tempdir, stdout=out)
+        self.assertIn('1 drafts', out.getvalue())
+        shutil.rmtree(tempdir)